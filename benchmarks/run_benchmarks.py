@@ -0,0 +1,307 @@
+'''
+Times the analysis and deployment hot paths of the scripts on a
+synthetic Cyclus output file, written by synthetic_db.py, and records
+the results as JSON so that regressions between commits are visible.
+
+Each benchmark is set up once and run repeat times. The minimum, median
+and mean wall times are recorded, together with the commit, the Python
+version and the size of the database. Benchmarks whose dependencies
+(e.g. cyclus or cymetric) are not installed are recorded as skipped.
+
+Usage:
+    python run_benchmarks.py --scale small
+    python run_benchmarks.py --compare results/old.json results/new.json
+'''
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import synthetic_db as sdb
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARK_DIR), 'scripts'))
+
+SCALES = {
+    'small': {'agents': 50, 'timesteps': 1500, 'transactions': 5000,
+              'nuclides': 20, 'compositions': 10},
+    'medium': {'agents': 200, 'timesteps': 1500, 'transactions': 50000,
+               'nuclides': 100, 'compositions': 20},
+    'large': {'agents': 1000, 'timesteps': 1500, 'transactions': 500000,
+              'nuclides': 400, 'compositions': 50}}
+
+AR_PROTOTYPES = ['Xe-100', 'MMR', 'VOYGR']
+
+
+class Results(dict):
+    '''
+    Stands in for the results object Dakota passes to get_all_results
+    '''
+    class Response():
+        function = None
+
+    def __missing__(self, name):
+        self[name] = self.Response()
+        return self[name]
+
+    def write(self):
+        pass
+
+
+def bench_analysis(db_file):
+    '''
+    Sets up the benchmarks of the flux, capacity and deployment helpers
+    of analysis.py, on the indexed database
+    '''
+    import analysis as an
+    cur = an.cursor(db_file)
+    an.create_indexes(cur)
+    reactors = an.agent_ids(cur, 'Reactor')
+    return {
+        'analysis.facility_commodity_flux': lambda: (
+            an.facility_commodity_flux(cur, reactors, ['fresh_uox'], False)),
+        'analysis.facility_commodity_flux_isotopics': lambda: (
+            an.facility_commodity_flux_isotopics(cur, reactors,
+                                                 ['fresh_uox'], False)),
+        'analysis.commodity_origin': lambda: (
+            an.commodity_origin(cur, 'fresh_uox', ['enrichment'])),
+        'analysis.mass_timeseries': lambda: (
+            an.mass_timeseries(cur, 'Xe-100', 'in')),
+        'analysis.power_capacity': lambda: an.power_capacity(cur),
+        'analysis.deployments': lambda: an.deployments(cur),
+        'analysis.swu_timeseries': lambda: an.swu_timeseries(cur)}
+
+
+def bench_output_metrics(db_file):
+    '''
+    Sets up the benchmark of the Dakota responses of output_metrics.py
+    '''
+    import output_metrics as oup
+    import table_cache as tc
+
+    def get_all_results():
+        # each run reads the tables from the database again
+        tc.invalidate(db_file, remove_files=True)
+        return oup.get_all_results(Results(), db_file)
+    return {'output_metrics.get_all_results': get_all_results}
+
+
+def bench_transition_metrics(db_file):
+    '''
+    Sets up the benchmark of the deployed prototypes of
+    transition_metrics.py
+    '''
+    import transition_metrics as tm
+    return {'transition_metrics.get_prototype_totals': lambda: (
+        tm.get_prototype_totals(db_file, AR_PROTOTYPES, AR_PROTOTYPES))}
+
+
+def bench_deployment(db_file, timesteps):
+    '''
+    Sets up the benchmarks of the deployment algorithms of
+    create_AR_DeployInst.py and reactor_deployment.py, on a power gap
+    and a capacity demand as long as the simulation
+    '''
+    import create_AR_DeployInst as cdi
+    import reactor_deployment as dep
+    rng = np.random.default_rng(0)
+    power_gap = np.cumsum(rng.random(timesteps) * 100)
+    reactor_prototypes = {'Xe-100': (75, 720), 'MMR': (5, 240),
+                          'VOYGR': (73, 720)}
+    years = timesteps // 12
+    capacity = pd.DataFrame({
+        'Year': np.arange(2000, 2000 + years),
+        'cap': np.cumsum(rng.random(years) * 1000)})
+    ar_dict = {'Xe-100': [80, 1, 60, 'no_dist'],
+               'MMR': [5, 1, 20, 'no_dist'],
+               'VOYGR': [77, 1, 60, 'no_dist']}
+    return {
+        'create_AR_DeployInst.determine_deployment_schedule': lambda: (
+            cdi.determine_deployment_schedule(power_gap.copy(),
+                                              reactor_prototypes)),
+        'reactor_deployment.greedy_deployment': lambda: (
+            dep.greedy_deployment(capacity.copy(), 'cap', ar_dict, 2000)),
+        'reactor_deployment.pre_det_deployment': lambda: (
+            dep.pre_det_deployment(capacity.copy(), 'cap', ar_dict, 2000)),
+        'reactor_deployment.rand_deployment': lambda: (
+            dep.rand_deployment(capacity.copy(), 'cap', ar_dict, 2000,
+                                set_seed=True))}
+
+
+def time_benchmark(function, repeat):
+    '''
+    Runs a benchmark repeat times
+
+    Parameters
+    ----------
+    function: callable
+        benchmark, without arguments
+    repeat: int
+        number of runs
+
+    Returns
+    -------
+    result: dict
+        minimum, median and mean wall time of the runs, in seconds
+    '''
+    times = []
+    for run in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'min': min(times), 'median': statistics.median(times),
+            'mean': statistics.mean(times), 'repeat': repeat}
+
+
+def git_commit():
+    '''
+    Gets the commit of the repository, None if it cannot be found
+    '''
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'],
+                              cwd=BENCHMARK_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(db_file, scale, repeat=3, select=None):
+    '''
+    Runs the benchmarks on a database
+
+    Parameters
+    ----------
+    db_file: str
+        name of the synthetic Cyclus output file
+    scale: dict
+        parameters the database was written with
+    repeat: int
+        number of runs of each benchmark
+    select: str, optional
+        only the benchmarks whose name contains this string are run
+
+    Returns
+    -------
+    report: dict
+        commit, date, Python version, database parameters, and the result
+        of each benchmark
+    '''
+    groups = [('analysis', bench_analysis, (db_file,)),
+              ('output_metrics', bench_output_metrics, (db_file,)),
+              ('transition_metrics', bench_transition_metrics, (db_file,)),
+              ('deployment', bench_deployment,
+               (db_file, scale['timesteps']))]
+    results = {}
+    for group, setup, args in groups:
+        try:
+            benchmarks = setup(*args)
+        except ImportError as error:
+            results[group] = {'skipped': str(error)}
+            continue
+        for name, function in benchmarks.items():
+            if select is not None and select not in name:
+                continue
+            print(name, end=' ', flush=True)
+            results[name] = time_benchmark(function, repeat)
+            print('%.4f s' % results[name]['min'])
+    return {'commit': git_commit(),
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': scale,
+            'benchmarks': results}
+
+
+def compare(old_file, new_file, threshold=1.2):
+    '''
+    Prints the ratio of the minimum times of two reports, flagging the
+    benchmarks slower than threshold times the old time
+
+    Parameters
+    ----------
+    old_file: str
+        JSON report of the reference commit
+    new_file: str
+        JSON report to compare to the reference
+    threshold: float
+        ratio above which a benchmark is a regression
+
+    Returns
+    -------
+    regressions: list of str
+        names of the benchmarks that got slower
+    '''
+    with open(old_file) as f:
+        old = json.load(f)
+    with open(new_file) as f:
+        new = json.load(f)
+    if old['database'] != new['database']:
+        print('The reports were run on databases of different sizes:',
+              old['database'], new['database'])
+    old, new = old['benchmarks'], new['benchmarks']
+    regressions = []
+    for name in sorted(set(old) & set(new)):
+        if 'min' not in old[name] or 'min' not in new[name]:
+            continue
+        ratio = new[name]['min'] / old[name]['min']
+        flag = ''
+        if ratio > threshold:
+            flag = 'REGRESSION'
+            regressions.append(name)
+        print('%-55s %10.4f %10.4f %6.2f %s' % (
+            name, old[name]['min'], new[name]['min'], ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Times the hot paths of the scripts')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small',
+                        help='size of the synthetic database')
+    for name in SCALES['small']:
+        parser.add_argument('--' + name, type=int,
+                            help='overrides the ' + name + ' of the scale')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs of each benchmark')
+    parser.add_argument('--select',
+                        help='only runs the benchmarks containing this')
+    parser.add_argument('--output', help='name of the JSON report, in '
+                        'results/ named after the commit by default')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compares two JSON reports instead')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return 1 if compare(*args.compare) else 0
+
+    scale = dict(SCALES[args.scale])
+    for name in scale:
+        if getattr(args, name) is not None:
+            scale[name] = getattr(args, name)
+    with tempfile.TemporaryDirectory() as directory:
+        db_file = sdb.write_database(
+            os.path.join(directory, 'synthetic.sqlite'), **scale)
+        report = run_benchmarks(db_file, scale, args.repeat, args.select)
+
+    output = args.output
+    if output is None:
+        output = os.path.join(BENCHMARK_DIR, 'results', '%s-%s.json' % (
+            (report['commit'] or 'unknown')[:10], args.scale))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results written to', output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,240 @@
+'''
+Writes synthetic Cyclus output files for the benchmarks. The tables read
+by the scripts have the same names and columns as in a Cyclus output
+file. The fuel cycle is a mine sending natl_u to an enrichment plant.
+The plant sends fresh_uox to reactors of the prototypes in
+REACTOR_PROTOTYPES and tailings to a sink, and each reactor sends its
+spent fuel to the sink. The number of reactors, timesteps, transactions,
+compositions, and nuclides per composition can be set, so that the
+hot paths can be timed at the scale of a real transition scenario.
+
+Usage:
+    python synthetic_db.py out.sqlite --agents 500 --timesteps 1500
+'''
+import argparse
+import sqlite3
+import uuid
+
+import numpy as np
+
+# prototype: (power (MWe), lifetime (months), spent fuel commodity)
+REACTOR_PROTOTYPES = {
+    'LWR': (1000, 720, 'spent_uox'),
+    'Xe-100': (75, 720, 'spent_xe100_haleu'),
+    'MMR': (5, 240, 'spent_MMR_haleu'),
+    'VOYGR': (73, 720, 'spent_smr_fuel')}
+
+# the tables of a Cyclus output file read by the scripts
+SCHEMA = {
+    'Info': 'SimId BLOB, Handle TEXT, InitialYear INTEGER, '
+            'InitialMonth INTEGER, Duration INTEGER, ParentSimId BLOB, '
+            'ParentType TEXT, BranchTime INTEGER, CyclusVersion TEXT, '
+            'CyclusVersionDescribe TEXT, SqliteVersion TEXT, '
+            'Hdf5Version TEXT, BoostVersion TEXT, LibXML2Version TEXT, '
+            'CoinCBCVersion TEXT',
+    'TimeStepDur': 'SimId BLOB, DurationSecs INTEGER',
+    'Finish': 'SimId BLOB, EarlyTerm INTEGER, EndTime INTEGER',
+    'AgentEntry': 'SimId BLOB, AgentId INTEGER, Kind TEXT, Spec TEXT, '
+                  'Prototype TEXT, ParentId INTEGER, Lifetime INTEGER, '
+                  'EnterTime INTEGER',
+    'AgentExit': 'SimId BLOB, AgentId INTEGER, ExitTime INTEGER',
+    'DecomSchedule': 'SimId BLOB, AgentId INTEGER, SchedTime INTEGER, '
+                     'DecomTime INTEGER',
+    'Compositions': 'SimId BLOB, QualId INTEGER, NucId INTEGER, '
+                    'MassFrac REAL',
+    'Resources': 'SimId BLOB, ResourceId INTEGER, ObjId INTEGER, '
+                 'Type TEXT, TimeCreated INTEGER, Quantity REAL, '
+                 'Units TEXT, QualId INTEGER, Parent1 INTEGER, '
+                 'Parent2 INTEGER',
+    'Transactions': 'SimId BLOB, TransactionId INTEGER, SenderId INTEGER, '
+                    'ReceiverId INTEGER, ResourceId INTEGER, '
+                    'Commodity TEXT, Time INTEGER',
+    'TimeSeriesPower': 'SimId BLOB, AgentId INTEGER, Time INTEGER, '
+                       'Value REAL, Units TEXT',
+    'TimeSeriesEnrichmentSWU': 'SimId BLOB, AgentId INTEGER, '
+                               'Time INTEGER, Value REAL, Units TEXT',
+    'TimeSeriesEnrichmentFeed': 'SimId BLOB, AgentId INTEGER, '
+                                'Time INTEGER, Value REAL, Units TEXT'}
+
+
+def nuclide_ids(number):
+    '''
+    Gets the ids of number distinct nuclides, in the ZZZAAAMMMM form
+    used in the Compositions table
+
+    Parameters
+    ----------
+    number: int
+        number of nuclides
+
+    Returns
+    -------
+    nucids: list of ints
+        ids of the nuclides
+    '''
+    nucids = []
+    for z in range(1, 100):
+        for a in range(2 * z, 2 * z + 60):
+            nucids.append(z * 10000000 + a * 10000)
+    if number > len(nucids):
+        raise ValueError('At most ' + str(len(nucids)) +
+                         ' nuclides can be generated')
+    return nucids[-number:]
+
+
+def write_database(db_file, agents=100, timesteps=1500, transactions=10000,
+                   nuclides=20, compositions=10, seed=0):
+    '''
+    Writes a synthetic Cyclus output file, replacing any existing file
+
+    Parameters
+    ----------
+    db_file: str
+        name of the SQLite file to write
+    agents: int
+        number of reactors
+    timesteps: int
+        duration of the simulation, in months
+    transactions: int
+        number of transactions
+    nuclides: int
+        number of nuclides in each composition
+    compositions: int
+        number of distinct compositions of the resources
+    seed: int
+        seed of the random number generator
+
+    Returns
+    -------
+    db_file: str
+        name of the SQLite file written
+    '''
+    rng = np.random.default_rng(seed)
+    sim_id = uuid.UUID(int=int(rng.integers(2 ** 63))).bytes
+    connect = sqlite3.connect(db_file)
+    try:
+        for table, columns in SCHEMA.items():
+            connect.execute('DROP TABLE IF EXISTS ' + table)
+            connect.execute('CREATE TABLE ' + table + ' (' + columns + ')')
+
+        connect.execute('INSERT INTO Info (SimId, Handle, InitialYear, '
+                        'InitialMonth, Duration) VALUES (?, ?, ?, ?, ?)',
+                        (sim_id, 'synthetic', 2000, 1, timesteps))
+        connect.execute('INSERT INTO TimeStepDur VALUES (?, ?)',
+                        (sim_id, 2629846))
+        connect.execute('INSERT INTO Finish VALUES (?, ?, ?)',
+                        (sim_id, 0, timesteps - 1))
+
+        # region, institution, and the fuel cycle facilities
+        entries = [(0, 'Region', ':agents:NullRegion', 'USA', -1, -1, 0),
+                   (1, 'Inst', ':cycamore:DeployInst', 'reactor_inst', 0,
+                    -1, 0),
+                   (2, 'Facility', ':cycamore:Source', 'mine', 1, -1, 0),
+                   (3, 'Facility', ':cycamore:Enrichment', 'enrichment', 1,
+                    -1, 0),
+                   (4, 'Facility', ':cycamore:Sink', 'sink', 1, -1, 0)]
+        names = list(REACTOR_PROTOTYPES)
+        prototypes = rng.integers(len(names), size=agents)
+        enter = rng.integers(timesteps, size=agents)
+        lifetime = np.array([REACTOR_PROTOTYPES[names[p]][1]
+                             for p in prototypes])
+        reactor_ids = np.arange(5, 5 + agents)
+        for agent, prototype, time, life in zip(reactor_ids, prototypes,
+                                                enter, lifetime):
+            entries.append((int(agent), 'Facility', ':cycamore:Reactor',
+                            names[prototype], 1, int(life), int(time)))
+        connect.executemany('INSERT INTO AgentEntry VALUES '
+                            '(?, ?, ?, ?, ?, ?, ?, ?)',
+                            [(sim_id,) + entry for entry in entries])
+        exit_time = enter + lifetime
+        retired = exit_time < timesteps
+        connect.executemany('INSERT INTO AgentExit VALUES (?, ?, ?)',
+                            [(sim_id, int(agent), int(time)) for agent, time
+                             in zip(reactor_ids[retired],
+                                    exit_time[retired])])
+
+        power = []
+        for agent, prototype, start, stop in zip(
+                reactor_ids, prototypes, enter,
+                np.minimum(exit_time, timesteps)):
+            value = REACTOR_PROTOTYPES[names[prototype]][0]
+            power.extend((sim_id, int(agent), time, value, 'MWe')
+                         for time in range(start, stop))
+        connect.executemany('INSERT INTO TimeSeriesPower VALUES '
+                            '(?, ?, ?, ?, ?)', power)
+        for table in ['TimeSeriesEnrichmentSWU', 'TimeSeriesEnrichmentFeed']:
+            connect.executemany('INSERT INTO ' + table + ' VALUES '
+                                '(?, ?, ?, ?, ?)',
+                                [(sim_id, 3, time, float(value), 'kg')
+                                 for time, value in
+                                 enumerate(rng.random(timesteps) * 1e5)])
+
+        nucids = nuclide_ids(nuclides)
+        fractions = rng.random((compositions, nuclides))
+        fractions /= fractions.sum(axis=1, keepdims=True)
+        connect.executemany('INSERT INTO Compositions VALUES (?, ?, ?, ?)',
+                            [(sim_id, qualid, nucid, float(fraction))
+                             for qualid in range(compositions)
+                             for nucid, fraction in zip(nucids,
+                                                        fractions[qualid])])
+
+        times = np.sort(rng.integers(timesteps, size=transactions))
+        kinds = rng.integers(4, size=transactions)
+        reactors = rng.integers(agents, size=transactions) if agents else \
+            np.full(transactions, -1)
+        quals = rng.integers(compositions, size=transactions)
+        quantities = rng.random(transactions) * 1e4
+        rows, resources = [], []
+        for transaction in range(transactions):
+            kind, reactor = kinds[transaction], reactors[transaction]
+            if kind == 0 or reactor < 0:
+                sender, receiver, commodity = 2, 3, 'natl_u'
+            elif kind == 1:
+                sender, receiver, commodity = 3, 4, 'tailings'
+            elif kind == 2:
+                sender, receiver = 3, int(reactor_ids[reactor])
+                commodity = 'fresh_uox'
+            else:
+                sender, receiver = int(reactor_ids[reactor]), 4
+                commodity = REACTOR_PROTOTYPES[names[
+                    prototypes[reactor]]][2]
+            time = int(times[transaction])
+            rows.append((sim_id, transaction, sender, receiver, transaction,
+                         commodity, time))
+            resources.append((sim_id, transaction, transaction, 'Material',
+                              time, float(quantities[transaction]), 'kg',
+                              int(quals[transaction]), 0, 0))
+        connect.executemany('INSERT INTO Transactions VALUES '
+                            '(?, ?, ?, ?, ?, ?, ?)', rows)
+        connect.executemany('INSERT INTO Resources VALUES '
+                            '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', resources)
+        connect.commit()
+    finally:
+        connect.close()
+    return db_file
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Writes a synthetic Cyclus output file')
+    parser.add_argument('db_file', help='name of the SQLite file to write')
+    parser.add_argument('--agents', type=int, default=100,
+                        help='number of reactors')
+    parser.add_argument('--timesteps', type=int, default=1500,
+                        help='duration of the simulation, in months')
+    parser.add_argument('--transactions', type=int, default=10000,
+                        help='number of transactions')
+    parser.add_argument('--nuclides', type=int, default=20,
+                        help='number of nuclides in each composition')
+    parser.add_argument('--compositions', type=int, default=10,
+                        help='number of distinct compositions')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random number generator')
+    args = parser.parse_args(argv)
+    write_database(args.db_file, args.agents, args.timesteps,
+                   args.transactions, args.nuclides, args.compositions,
+                   args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,7 +10,6 @@ starts. The transition starts at after 960 time steps (80 years).
 
 import json
 import re
-import subprocess
 import os
 import sqlite3 as lite
 import copy
@@ -22,6 +21,8 @@ import pandas as pd
 import d3ploy.tester as tester
 import d3ploy.plotter as plotter
 import collections
+sys.path.insert(0, '../../scripts')
+import cyclus_runner as cr
 
 direc = os.listdir('./')
 
@@ -1187,6 +1188,7 @@ for calc_method in calc_methods:
     </region>
     """ % (calc_method, demand_eq, steps, buff_size, calc_method, steps)
 
+jobs = []
 for calc_method in calc_methods:
 
     input_file = 'eg01-eg23-flatpower-d3ploy-buffer' + buff_size + '-S' \
@@ -1201,5 +1203,10 @@ for calc_method in calc_methods:
         f.write(recipes)
         f.write('</simulation>')
 
-    s = subprocess.check_output(['cyclus', '-o', output_file, input_file],
-                                universal_newlines=True, env=ENV)
+    jobs.append((input_file, output_file))
+
+# runs the simulations in parallel, skipping the ones that already finished
+results = cr.run_jobs(jobs, env=ENV)
+failed = [x['input'] for x in results if x['status'] == 'failed']
+if failed:
+    raise Exception('Cyclus failed for ' + ', '.join(failed))
@@ -9,7 +9,6 @@ starts. The transition starts at after 960 time steps (80 years).
 
 import json
 import re
-import subprocess
 import os
 import sqlite3 as lite
 import copy
@@ -21,6 +20,8 @@ import pandas as pd
 import d3ploy.tester as tester
 import d3ploy.plotter as plotter
 import collections
+sys.path.insert(0, '../../scripts')
+import cyclus_runner as cr
 
 direc = os.listdir('./')
 
@@ -1194,6 +1195,7 @@ for calc_method in calc_methods:
     </region>
     """ % (calc_method, demand_eq, buff_size, calc_method)
 
+jobs = []
 for calc_method in calc_methods:
 
     input_file = 'eg01-eg24-linpower-d3ploy-buffer' + buff_size + '-' \
@@ -1208,5 +1210,10 @@ for calc_method in calc_methods:
         f.write(recipes)
         f.write('</simulation>')
 
-    s = subprocess.check_output(['cyclus', '-o', output_file, input_file],
-                                universal_newlines=True, env=ENV)
+    jobs.append((input_file, output_file))
+
+# runs the simulations in parallel, skipping the ones that already finished
+results = cr.run_jobs(jobs, env=ENV)
+failed = [x['input'] for x in results if x['status'] == 'failed']
+if failed:
+    raise Exception('Cyclus failed for ' + ', '.join(failed))
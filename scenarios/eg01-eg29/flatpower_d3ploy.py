@@ -10,7 +10,6 @@ starts. The transition starts at after 960 time steps (80 years).
 
 import json
 import re
-import subprocess
 import os
 import sqlite3 as lite
 import copy
@@ -22,6 +21,8 @@ import pandas as pd
 import d3ploy.tester as tester
 import d3ploy.plotter as plotter
 import collections
+sys.path.insert(0, '../../scripts')
+import cyclus_runner as cr
 
 direc = os.listdir('./')
 
@@ -1281,6 +1282,7 @@ for calc_method in calc_methods:
 name = 'eg01-eg29-flatpower-d3ploy'
 name += '-buffer' + buff_size + '-S'
 
+jobs = []
 for calc_method in calc_methods:
 
     input_file = name + steps + '-' + calc_method + '.xml'
@@ -1293,5 +1295,10 @@ for calc_method in calc_methods:
         f.write(recipes)
         f.write('</simulation>')
 
-    s = subprocess.check_output(['cyclus', '-o', output_file, input_file],
-                                universal_newlines=True, env=ENV)
+    jobs.append((input_file, output_file))
+
+# runs the simulations in parallel, skipping the ones that already finished
+results = cr.run_jobs(jobs, env=ENV)
+failed = [x['input'] for x in results if x['status'] == 'failed']
+if failed:
+    raise Exception('Cyclus failed for ' + ', '.join(failed))
@@ -0,0 +1,91 @@
+import numpy as np
+import dakota.interfacing as di
+import sys
+import os
+sys.path.append('../../../../scripts')
+import create_AR_DeployInst as cdi
+import dakota_batch as dkb
+import dakota_input as inp
+
+# Batch version of min_haleu_driver.py, min_waste_driver.py, and
+# moga_driver.py: Dakota passes every point of a batch in one parameters
+# file, the template, LWR DeployInst and LWR powers are read once, and the
+# Cyclus runs are spread over a pool of workers. The responses written back
+# are the ones listed in the responses block of the Dakota input. The number of
+# simulations run at the same time is max_workers if it is given, else the
+# evaluation_concurrency of the Dakota input, else one per CPU.
+# Usage: analysis_drivers = 'python batch_driver.py <dakota input>
+#                            [max_workers]'
+
+variables = ['lwr', 'mmr_share', 'xe100_share', 'voygr_share',
+             'mmr_burnup', 'xe100_burnup']
+cyclus_template = inp.load_template('oncethrough_input.xml.in')
+lwr_path = "../../inputs/united_states/reactors/"
+lwr_powers = cdi.get_powers(lwr_path)
+lwr_deployinst = cdi.read_lwr_deployinst(
+    "../../inputs/united_states/buildtimes/" +
+    "UNITED_STATES_OF_AMERICA/deployinst.xml",
+    "../../../../database/lwr_power_order.txt")
+
+duration = 1500
+mmr_lifetimes = {41: 120, 62: 180, 74: 218, 78: 231, 82: 240, 86: 255,
+                 90: 267}
+demand_equation = np.zeros(duration)
+demand_equation[721:] = 87198.156
+
+
+def prepare(params):
+    # Edit Cyclus input file
+    scenario_name = dkb.scenario_name(params, variables)
+    variable_dict = dkb.variable_dict(params, variables)
+    variable_dict['handle'] = scenario_name
+    output_xml = './cyclus-files/' + scenario_name + '.xml'
+    output_sqlite = './cyclus-files/' + scenario_name + '.sqlite'
+    with open(output_xml, 'w') as f:
+        f.write(cyclus_template.render(variable_dict))
+
+    # Create DeployInst for LWRs
+    lwr_DI = cdi.lwr_deployinst(params['lwr'], *lwr_deployinst)
+    cdi.write_deployinst(lwr_DI, './cyclus-files/' +
+                         scenario_name +
+                         '_deployinst.xml')
+
+    # Create DeployInst for advanced reactors
+    reactor_prototypes = {'Xe-100': (76, 720),
+                          'MMR': (5, mmr_lifetimes[int(params['mmr_burnup'])]),
+                          'VOYGR': (73, 720)}
+    deploy_schedule = cdi.write_AR_deployinst(
+        lwr_DI,
+        lwr_path,
+        duration,
+        reactor_prototypes,
+        demand_equation,
+        {'MMR': int(params['mmr_share']),
+         'Xe-100': int(params['xe100_share']),
+         'VOYGR': int(params['voygr_share'])},
+        lwr_powers)
+    cdi.write_deployinst(deploy_schedule, "./cyclus-files/AR_DeployInst_" +
+                         scenario_name +
+                         ".xml")
+    return output_xml, output_sqlite
+
+
+# ----------------------------
+# Parse Dakota parameters file
+# ----------------------------
+# Dakota appends the names of the parameters and results files to the
+# arguments given in analysis_drivers
+dakota_input = sys.argv[1]
+batch_params, batch_results = di.read_parameters_file(
+    sys.argv[-2], sys.argv[-1], batch=True)
+
+# -------------------------------------------------------
+# Run Cyclus for every point and return results to Dakota
+# -------------------------------------------------------
+if len(sys.argv) > 4:
+    max_workers = int(sys.argv[2])
+else:
+    max_workers = dkb.evaluation_concurrency(dakota_input)
+os.makedirs('./cyclus-files', exist_ok=True)
+dkb.run_batch(batch_params, batch_results, prepare, max_workers,
+              remove_outputs=True)
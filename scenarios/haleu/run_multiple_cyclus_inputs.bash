@@ -1,7 +1,10 @@
+# Runs the HALEU scenarios in parallel with cyclus_runner.py, one simulation
+# per CPU, writing the output databases in outputs/
+inputs=()
 for scenario in mmr xe100 xe100_mmr mmr_voygr xe100_voygr xe100_mmr_voygr limited_TRISO limited_noTRISO continuous
 do 
   for growth in nogrowth 1percent
-  do rm "outputs/${scenario}_${growth}.sqlite"
-     cyclus -i "inputs/${scenario}_${growth}.xml" -o "outputs/${scenario}_${growth}.sqlite"
+  do inputs+=("inputs/${scenario}_${growth}.xml")
   done
 done
+python ../../scripts/cyclus_runner.py --output-dir outputs --overwrite "$(nproc)" "${inputs[@]}"
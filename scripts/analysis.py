@@ -1,4 +1,6 @@
 import collections
+import functools
+import hashlib
 import numpy as np
 import matplotlib.pyplot as plt
 import sqlite3 as lite
@@ -6,11 +8,25 @@ import sys
 from itertools import cycle
 from matplotlib import cm
 from cyclus import nucname
-from collections import Counter
+import instrumentation as ins
 
 if len(sys.argv) < 2:
     print('Usage: python analysis.py [cylus_output_file]')
 
+# longer lists of values are joined through a temporary table
+MAX_BOUND_PARAMETERS = 500
+
+INDEXES = collections.OrderedDict([
+    ('analysis_transactions_senderid',
+     'transactions (senderid, commodity, time, resourceid)'),
+    ('analysis_transactions_receiverid',
+     'transactions (receiverid, commodity, time, resourceid)'),
+    ('analysis_transactions_time', 'transactions (time)'),
+    ('analysis_resources_resourceid',
+     'resources (resourceid, qualid, quantity)'),
+    ('analysis_compositions_qualid',
+     'compositions (qualid, nucid, massfrac)')])
+
 
 def cursor(file_name):
     """Connects and returns a cursor to an sqlite output file
@@ -48,9 +64,9 @@ def agent_ids(cur, archetype):
     agentids: list
         list of all agentId strings
     """
-    agents = cur.execute("SELECT agentid FROM agententry WHERE spec "
-                         "LIKE '%" + archetype + "%' COLLATE NOCASE"
-                         ).fetchall()
+    agents = cur.execute('SELECT agentid FROM agententry WHERE spec '
+                         'LIKE ? COLLATE NOCASE',
+                         ('%' + archetype + '%',)).fetchall()
 
     return list(str(agent['agentid']) for agent in agents)
 
@@ -71,8 +87,8 @@ def prototype_id(cur, prototype):
         list of prototype agentids as strings
     """
     ids = cur.execute('SELECT agentid FROM agententry '
-                      'WHERE prototype = "' +
-                      str(prototype) + '" COLLATE NOCASE').fetchall()
+                      'WHERE prototype = ? COLLATE NOCASE',
+                      (str(prototype),)).fetchall()
 
     return list(str(agent['agentid']) for agent in ids)
 
@@ -152,6 +168,106 @@ def exec_string(specific_search, search, request_colmn):
     return query
 
 
+def in_clause(cur, column, items):
+    """Generates a parameterized sqlite condition restricting column
+        to the values in items. Short lists are bound as parameters,
+        long lists (e.g. thousands of agentids) are loaded into a
+        temporary table on the cursor's connection.
+
+    Parameters
+    ----------
+    cur: sqlite cursor
+        sqlite cursor
+    column: str
+        column the condition is applied to
+    items: list
+        values the column can take
+
+    Returns
+    -------
+    condition: str
+        sqlite condition to insert after the WHERE keyword
+    params: list
+        parameters to bind to the condition
+    """
+    items = list(items)
+    if len(items) == 0:
+        raise Exception('Cannot create an in_clause with an empty list')
+    if len(items) <= MAX_BOUND_PARAMETERS:
+        return (column + ' IN (' + ', '.join('?' * len(items)) + ')',
+                items)
+    key = hashlib.sha1(repr(items).encode()).hexdigest()[:16]
+    table = 'temp.in_clause_' + key
+    cur.execute('CREATE TABLE IF NOT EXISTS ' + table +
+                ' (value PRIMARY KEY)')
+    cur.executemany('INSERT OR IGNORE INTO ' + table + ' VALUES (?)',
+                    [(item,) for item in items])
+    return column + ' IN (SELECT value FROM ' + table + ')', []
+
+
+def resource_query(cur, specific_search, search, request_colmn,
+                   table='transactions'):
+    """Generates a parameterized sqlite query to select things and
+        inner join resources and a table with a resourceid column.
+
+    Parameters
+    ----------
+    cur: sqlite cursor
+        sqlite cursor
+    specific_search: list
+        list of items to specify search
+    search: str
+        column the specific_search items are matched against
+    request_colmn: str
+        column (set of values) that the sqlite query should return
+    table: str
+        table joined with resources, transactions by default
+
+    Returns
+    -------
+    query: str
+        sqlite query command
+    params: list
+        parameters to bind to the query
+    """
+    condition, params = in_clause(cur, search, specific_search)
+    query = ('SELECT ' + request_colmn +
+             ' FROM resources INNER JOIN ' + table +
+             ' ON ' + table + '.resourceid = resources.resourceid'
+             ' WHERE ' + condition)
+    return query, params
+
+
+def create_indexes(cur):
+    """Creates the indexes used by the analysis queries, if they
+        do not exist yet. This writes to the output file, so it is
+        only called explicitly, on finished simulations whose output
+        file can be modified. Tables missing from the output file are
+        skipped.
+
+    Parameters
+    ----------
+    cur: sqlite cursor
+        sqlite cursor
+
+    Returns
+    -------
+    created: list
+        names of the indexes available in the file
+    """
+    created = []
+    for name, columns in INDEXES.items():
+        try:
+            cur.execute('CREATE INDEX IF NOT EXISTS ' + name +
+                        ' ON ' + columns)
+            created.append(name)
+        except lite.OperationalError as error:
+            if not str(error).startswith('no such table'):
+                raise
+    cur.connection.commit()
+    return created
+
+
 def simulation_timesteps(cur):
     """Returns simulation start year, month,
     duration and timesteps (in numpy linspace).
@@ -183,8 +299,9 @@ def simulation_timesteps(cur):
     return init_year, init_month, duration, timestep
 
 
-def timeseries(specific_search, duration, kg_to_tons):
-    """returns a timeseries list from specific_search data.
+def bin_timeseries(specific_search, duration, kg_to_tons):
+    """Bins (time, value) pairs into monthly and cumulative timeseries
+    in a single pass, instead of scanning the data once per timestep.
 
     Parameters
     ----------
@@ -195,28 +312,55 @@ def timeseries(specific_search, duration, kg_to_tons):
     duration: int
         duration of the simulation
     kg_to_tons: bool
-        if True, list returned has units of tons
-        if False, list returned as units of kilograms
+        if True, arrays returned have units of tons
+        if False, arrays returned have units of kilograms
 
     Returns
     -------
-    timeseries list of commodities stored in specific_search
+    monthly: numpy array
+        sum of the values at each timestep
+    cumulative: numpy array
+        running sum of the values up to each timestep
     """
-    value = 0
-    value_timeseries = []
-    array = np.array(specific_search)
+    monthly = np.zeros(duration)
     if len(specific_search) > 0:
-        for i in range(0, duration):
-            value = sum(array[array[:, 0] == i][:, 1])
-            if kg_to_tons:
-                value_timeseries.append(value * 0.001)
-            else:
-                value_timeseries.append(value)
-    return value_timeseries
+        array = np.asarray(specific_search)
+        times = array[:, 0].astype(float)
+        values = array[:, 1].astype(float)
+        # only whole timesteps inside the simulation are counted
+        mask = (times >= 0) & (times < duration) & (times == np.floor(times))
+        monthly = np.bincount(times[mask].astype(int),
+                              weights=values[mask],
+                              minlength=duration)
+    if kg_to_tons:
+        monthly = monthly * 0.001
+    return monthly, np.cumsum(monthly)
+
+
+def timeseries(specific_search, duration, kg_to_tons):
+    """returns a timeseries array from specific_search data.
+
+    Parameters
+    ----------
+    specific_search: list
+        list of data to be created into timeseries
+        list[0] = time
+        list[1] = value, quantity
+    duration: int
+        duration of the simulation
+    kg_to_tons: bool
+        if True, array returned has units of tons
+        if False, array returned as units of kilograms
+
+    Returns
+    -------
+    timeseries array of commodities stored in specific_search
+    """
+    return bin_timeseries(specific_search, duration, kg_to_tons)[0]
 
 
 def timeseries_cum(specific_search, duration, kg_to_tons):
-    """returns a timeseries list from specific_search data.
+    """returns a cumulative timeseries array from specific_search data.
 
     Parameters
     ----------
@@ -224,28 +368,83 @@ def timeseries_cum(specific_search, duration, kg_to_tons):
         list of data to be created into timeseries
         list[0] = time
         list[1] = value, quantity
-    multiplyby: int
-        integer to multiply the value in the list by for
-        unit conversion from kilograms
+    duration: int
+        duration of the simulation
     kg_to_tons: bool
-        if True, list returned has units of tons
-        if False, list returned as units of kilograms
+        if True, array returned has units of tons
+        if False, array returned as units of kilograms
 
     Returns
     -------
-    timeseries of commodities in kg or tons
+    timeseries array of commodities in kg or tons
     """
-    value = 0
-    value_timeseries = []
-    array = np.array(specific_search)
-    if len(specific_search) > 0:
-        for i in range(0, duration):
-            value += sum(array[array[:, 0] == i][:, 1])
-            if kg_to_tons:
-                value_timeseries.append(value * 0.001)
-            else:
-                value_timeseries.append(value)
-    return value_timeseries
+    return bin_timeseries(specific_search, duration, kg_to_tons)[1]
+
+
+@functools.lru_cache(maxsize=None)
+def nuclide_name(nucid):
+    """Returns the name of a nuclide, such as U235, from its nucid.
+        Names are memoized, since the same few nuclides appear in
+        every row of an isotopic query.
+
+    Parameters
+    ----------
+    nucid: int
+        nuclide id
+
+    Returns
+    -------
+    name: str
+        name of the nuclide
+    """
+    return nucname.name(nucid)
+
+
+def isotope_matrix(rows, duration, kg_to_tons):
+    """Bins (time, mass, nucid) rows into a dense matrix with one
+        row per nuclide and one column per timestep, in a single pass.
+
+    Parameters
+    ----------
+    rows: list
+        list of (time, mass, nucid) data, ordered so that each nuclide
+        first appears where it should be listed
+    duration: int
+        duration of the simulation
+    kg_to_tons: bool
+        if True, the matrix has units of tons
+        if False, the matrix has units of kilograms
+
+    Returns
+    -------
+    nuclides: list
+        names of the nuclides, in order of first appearance
+    monthly: numpy array
+        mass of each nuclide at each timestep, cumulative values are
+        given by np.cumsum(monthly, axis=1)
+    """
+    nuclides = []
+    row_of = {}
+    index = np.empty(len(rows), dtype=int)
+    times = np.empty(len(rows))
+    amounts = np.empty(len(rows))
+    for i, (time, amount, nucid) in enumerate(rows):
+        name = nuclide_name(nucid)
+        if name not in row_of:
+            row_of[name] = len(nuclides)
+            nuclides.append(name)
+        index[i] = row_of[name]
+        times[i] = time
+        amounts[i] = amount
+    # only whole timesteps inside the simulation are counted
+    mask = (times >= 0) & (times < duration) & (times == np.floor(times))
+    monthly = np.bincount(index[mask] * duration + times[mask].astype(int),
+                          weights=amounts[mask],
+                          minlength=len(nuclides) * duration)
+    monthly = monthly.reshape(len(nuclides), duration)
+    if kg_to_tons:
+        monthly = monthly * 0.001
+    return nuclides, monthly
 
 
 def isotope_transactions(resources, compositions):
@@ -303,16 +502,13 @@ def facility_commodity_flux(cur, agentids,
     """
     init_year, init_month, duration, timestep = simulation_timesteps(cur)
     commodity_region = collections.OrderedDict()
+    # outflux searches senderid instead of receiverid
+    agent_colmn = 'senderid' if is_outflux else 'receiverid'
     for comm in facility_commodities:
-        query = (exec_string(agentids, 'receiverid',
-                             'time, sum(quantity), qualid') +
-                 ' and (commodity = "' + str(comm) +
-                 '") GROUP BY time')
-        # outflux changes receiverid to senderid
-        if is_outflux:
-            query = query.replace('receiverid', 'senderid')
-
-        res = cur.execute(query).fetchall()
+        query, params = resource_query(cur, agentids, agent_colmn,
+                                       'time, sum(quantity), qualid')
+        query += ' AND commodity = ? GROUP BY time'
+        res = cur.execute(query, params + [str(comm)]).fetchall()
         if is_cum:
             commodity_region[comm] = timeseries_cum(res, duration, True)
         else:
@@ -349,28 +545,31 @@ def commodity_flux_region(cur, agentids, commodities,
     """
     init_year, init_month, duration, timestep = simulation_timesteps(cur)
     commodity_region = collections.OrderedDict()
-    commodities = ['"' + x + '"' for x in commodities]
+    # region is taken from the trading partner of agentids
+    if is_outflux:
+        agent_colmn, partner_colmn = 'senderid', 'receiverid'
+    else:
+        agent_colmn, partner_colmn = 'receiverid', 'senderid'
+    comm_condition, comm_params = in_clause(cur, 'commodity', commodities)
+    agent_condition, agent_params = in_clause(
+        cur, 'transactions.' + agent_colmn, agentids)
     query = ('SELECT time, sum(quantity), parentid '
              'FROM transactions '
              'INNER JOIN resources '
              'ON resources.resourceid = '
              'transactions.resourceid '
              'INNER JOIN agententry '
-             'ON agententry.agentid = transactions.SENDERID '
-             'WHERE (commodity = ' +
-             ' OR commodity = '.join(commodities) + ') AND ('
-             'receiverid = ' +
-             ' OR receiverid = '.join(agentids) + ') GROUP BY '
-             'time, parentid')
-    if is_outflux:
-        query = query.replace('receiverid', 'senderid')
-        query = query.replace('SENDERID', 'RECEIVERID')
-    resources = cur.execute(query).fetchall()
+             'ON agententry.agentid = transactions.' + partner_colmn +
+             ' WHERE ' + comm_condition + ' AND ' + agent_condition +
+             ' GROUP BY time, parentid')
+    resources = cur.execute(query, comm_params + agent_params).fetchall()
     govs = cur.execute('SELECT agentid, prototype FROM agententry '
                        'WHERE kind = "Inst"').fetchall()
+    by_parent = collections.defaultdict(list)
+    for x in resources:
+        by_parent[x['parentid']].append((x['time'], x['sum(quantity)']))
     for gov in govs:
-        from_gov = [(x['time'], x['sum(quantity)'])
-                    for x in resources if x['parentid'] == gov['agentid']]
+        from_gov = by_parent.get(gov['agentid'], [])
         if is_cum:
             commodity_region[gov['prototype']] = timeseries_cum(
                 from_gov, duration, True)
@@ -380,6 +579,58 @@ def commodity_flux_region(cur, agentids, commodities,
     return commodity_region
 
 
+def isotope_flux_matrix(cur, agentids, facility_commodities, is_outflux):
+    """Returns the isotopics of commodity in/outflux from agents as
+        a nuclide by timestep matrix, with one query for all the
+        commodities
+
+    Parameters
+    ----------
+    cur: sqlite cursor
+        sqlite cursor
+    agentids: list
+        list of agentids
+    facility_commodities: list
+        list of commodities
+    is_outflux: bool
+        gets outflux if True, influx if False
+
+    Returns
+    -------
+    nuclides: list
+        names of the nuclides
+    monthly: numpy array
+        mass in tons of each nuclide at each timestep
+    """
+    init_year, init_month, duration, timestep = simulation_timesteps(cur)
+    commodities = [str(comm) for comm in facility_commodities]
+    if len(commodities) == 0:
+        return [], np.zeros((0, duration))
+    # outflux searches senderid instead of receiverid
+    agent_colmn = 'senderid' if is_outflux else 'receiverid'
+    agent_condition, agent_params = in_clause(cur, agent_colmn, agentids)
+    comm_condition, comm_params = in_clause(cur, 'commodity',
+                                            sorted(set(commodities)))
+    query = ('SELECT commodity, time, sum(quantity)*massfrac, nucid '
+             'FROM transactions INNER JOIN resources '
+             'ON resources.resourceid = transactions.resourceid '
+             'LEFT OUTER JOIN compositions '
+             'ON compositions.qualid = resources.qualid '
+             'WHERE ' + agent_condition + ' AND ' + comm_condition +
+             ' GROUP BY commodity, time, nucid')
+    by_commodity = collections.defaultdict(list)
+    for comm, time, amount, nucid in cur.execute(
+            query, agent_params + comm_params):
+        by_commodity[comm].append((time, amount, nucid))
+    # nuclides are listed in order of commodity, then time and nucid, and
+    # a commodity listed more than once is counted each time
+    rows = []
+    for comm in commodities:
+        rows += sorted(by_commodity[comm],
+                       key=lambda x: (x[0], -1 if x[2] is None else x[2]))
+    return isotope_matrix(rows, duration, True)
+
+
 def facility_commodity_flux_isotopics(
         cur,
         agentids,
@@ -408,32 +659,12 @@ def facility_commodity_flux_isotopics(
         dictionary with "key=isotope, and
         value=timeseries list of masses in kg"
     """
-    init_year, init_month, duration, timestep = simulation_timesteps(cur)
+    nuclides, monthly = isotope_flux_matrix(cur, agentids,
+                                            facility_commodities, is_outflux)
+    if is_cum:
+        monthly = np.cumsum(monthly, axis=1)
     isotope_timeseries = collections.defaultdict(list)
-    for comm in facility_commodities:
-        query = ('SELECT time, sum(quantity)*massfrac, nucid '
-                 'FROM transactions INNER JOIN resources '
-                 'ON resources.resourceid = transactions.resourceid '
-                 'LEFT OUTER JOIN compositions '
-                 'ON compositions.qualid = resources.qualid '
-                 'WHERE (receiverid = ' +
-                 ' OR receiverid = '.join(agentids) +
-                 ') AND (commodity = "' + str(comm) +
-                 '") GROUP BY time, nucid')
-        # outflux changes receiverid to senderid
-        if is_outflux:
-            query = query.replace('receiverid', 'senderid')
-
-        res = cur.execute(query).fetchall()
-        for time, amount, nucid in res:
-            isotope_timeseries[nucname.name(nucid)].append((time, amount))
-    for key in isotope_timeseries:
-        if is_cum:
-            isotope_timeseries[key] = timeseries_cum(
-                isotope_timeseries[key], duration, True)
-        else:
-            isotope_timeseries[key] = timeseries(
-                isotope_timeseries[key], duration, True)
+    isotope_timeseries.update(zip(nuclides, monthly))
     return isotope_timeseries
 
 
@@ -457,9 +688,10 @@ def stockpiles(cur, facility, is_cum=True):
     """
     pile = collections.OrderedDict()
     agentid = agent_ids(cur, facility)
-    query = exec_string(agentid, 'agentid', 'timecreated, quantity, qualid')
-    query = query.replace('transactions', 'agentstateinventories')
-    stockpile = cur.execute(query).fetchall()
+    query, params = resource_query(cur, agentid, 'agentid',
+                                   'timecreated, quantity, qualid',
+                                   table='agentstateinventories')
+    stockpile = cur.execute(query, params).fetchall()
     init_year, init_month, duration, timestep = simulation_timesteps(cur)
     if is_cum:
         stock_timeseries = timeseries_cum(stockpile, duration, True)
@@ -492,7 +724,7 @@ def swu_timeseries(cur, is_cum=True):
     for num in agentid:
         swu_data = cur.execute('SELECT time, value '
                                'FROM timeseriesenrichmentswu '
-                               'WHERE agentid = ' + str(num)).fetchall()
+                               'WHERE agentid = ?', (num,)).fetchall()
         if is_cum:
             swu_timeseries = timeseries_cum(swu_data, duration, False)
         else:
@@ -546,17 +778,25 @@ def power_capacity_of_region(cur, region_name):
         "dictionary with key=government and
         value=timeseries list of installed capacity"
     """
-    parentid = cur.exectue('SELECT agentid FROM agententry WHERE '
-                           'Prototype LIKE "%' + region_name + '%" '
-                           'AND Kind = "Inst"').fetchone()
-
+    init_year, init_month, duration, timestep = simulation_timesteps(cur)
+    insts = cur.execute('SELECT prototype, agentid FROM agententry '
+                        'WHERE prototype LIKE ? AND kind = "Inst"',
+                        ('%' + region_name + '%',)).fetchall()
+    if len(insts) == 0:
+        raise ValueError('No institution matches ' + str(region_name))
+
+    condition, params = in_clause(cur, 'parentid',
+                                  [inst['agentid'] for inst in insts])
     entry_exit = cur.execute('SELECT max(value), timeseriespower.agentid, '
-                             'parentid, entrytime, entertime + lifetime'
+                             'parentid, entertime, entertime + lifetime'
                              ' FROM agententry '
                              'INNER JOIN timeseriespower '
                              'ON agententry.agentid = timeseriespower.agentid '
-                             'GROUP BY timeseriespower.agentid '
-                             'WHERE parentid = %i' % parentid[0]).fetchall()
+                             'WHERE ' + condition +
+                             ' GROUP BY timeseriespower.agentid',
+                             params).fetchall()
+
+    return capacity_calc(insts, timestep, entry_exit)
 
 
 def deployments(cur):
@@ -616,10 +856,10 @@ def fuel_usage_timeseries(cur, fuels, is_cum=True):
     fuel_usage = collections.OrderedDict()
     init_year, init_month, duration, timestep = simulation_timesteps(cur)
     for fuel in fuels:
-        temporary_fuels = [fuel]
-        fuel_quantity = cur.execute(exec_string(temporary_fuels, 'commodity',
-                                                'time, sum(quantity)') +
-                                    ' GROUP BY time').fetchall()
+        query, params = resource_query(cur, [fuel], 'commodity',
+                                       'time, sum(quantity)')
+        fuel_quantity = cur.execute(query + ' GROUP BY time',
+                                    params).fetchall()
         quantity_timeseries = []
         try:
             if is_cum:
@@ -712,37 +952,30 @@ def trade_timeseries(cur, sender, receiver,
         sender_id = agent_ids(cur, sender)
         receiver_id = agent_ids(cur, receiver)
 
+    sender_condition, sender_params = in_clause(cur, 'senderid', sender_id)
+    receiver_condition, receiver_params = in_clause(cur, 'receiverid',
+                                                    receiver_id)
+    condition = sender_condition + ' AND ' + receiver_condition
+    params = sender_params + receiver_params
     if do_isotopic:
         trade = cur.execute('SELECT time, sum(quantity)*massfrac, nucid '
                             'FROM transactions INNER JOIN resources ON '
                             'resources.resourceid = transactions.resourceid '
                             'LEFT OUTER JOIN compositions '
                             'ON compositions.qualid = resources.qualid '
-                            'WHERE (senderid = ' +
-                            ' OR senderid = '.join(sender_id) +
-                            ') AND (receiverid = ' +
-                            ' OR receiverid = '.join(receiver_id) +
-                            ') GROUP BY time, nucid').fetchall()
+                            'WHERE ' + condition +
+                            ' GROUP BY time, nucid', params).fetchall()
     else:
         trade = cur.execute('SELECT time, sum(quantity), qualid '
                             'FROM transactions INNER JOIN resources ON '
                             'resources.resourceid = transactions.resourceid'
-                            ' WHERE (senderid = ' +
-                            ' OR senderid = '.join(sender_id) +
-                            ') AND (receiverid = ' +
-                            ' OR receiverid = '.join(receiver_id) +
-                            ') GROUP BY time').fetchall(
-        )
+                            ' WHERE ' + condition +
+                            ' GROUP BY time', params).fetchall()
     if do_isotopic:
-        for time, amount, nucid in trade:
-            isotope_timeseries[nucname.name(nucid)].append((time, amount))
-        for key in isotope_timeseries:
-            if is_cum:
-                isotope_timeseries[key] = timeseries_cum(
-                    isotope_timeseries[key], duration, True)
-            else:
-                isotope_timeseries[key] = timeseries(
-                    isotope_timeseries[key], duration, True)
+        nuclides, monthly = isotope_matrix(trade, duration, True)
+        if is_cum:
+            monthly = np.cumsum(monthly, axis=1)
+        isotope_timeseries.update(zip(nuclides, monthly))
         return isotope_timeseries
     else:
         key_name = str(sender)[:5] + ' to ' + str(receiver)[:5]
@@ -772,8 +1005,8 @@ def final_stockpile(cur, facility):
     mthm_stockpile = ''
     for agent in agentid:
         count = 1
-        name = cur.execute('SELECT prototype FROM agententry'
-                           'WHERE agentid = ' + str(agent)).fetchone()
+        name = cur.execute('SELECT prototype FROM agententry '
+                           'WHERE agentid = ?', (agent,)).fetchone()
 
         mthm_stockpile += 'The Stockpile in ' + str(name[0]) + ' : \n \n'
         stkpile = cur.execute('SELECT sum(quantity), inventoryname, qualid'
@@ -781,14 +1014,14 @@ def final_stockpile(cur, facility):
                               ' INNER JOIN resources'
                               ' ON resources.resourceid'
                               ' = agentstateinventories.resourceid'
-                              ' WHERE agentstateinventories.agentid'
-                              ' = """ + str(agent) + """ GROUP BY'
-                              ' inventoryname').fetchall()
+                              ' WHERE agentstateinventories.agentid = ?'
+                              ' GROUP BY inventoryname',
+                              (agent,)).fetchall()
         for stream in stkpile:
             masses = cur.execute('SELECT qualid, nucid, massfrac '
                                  'FROM compositions '
-                                 'WHERE qualid = ' +
-                                 str(stream['qualid'])).fetchall()
+                                 'WHERE qualid = ?',
+                                 (stream['qualid'],)).fetchall()
 
             mthm_stockpile += ('Stream ' + str(count) +
                                ' Total = ' + str(stream['sum(quantity)']) +
@@ -903,16 +1136,17 @@ def commodity_origin(cur, commodity, prototypes, is_cum=True):
         value=timeseries list of commodity sent from prototypes"
     """
     init_year, init_month, duration, timestep = simulation_timesteps(cur)
-    query = ('SELECT time, sum(quantity) FROM transactions '
-             'INNER JOIN resources ON resources.resourceid = '
-             'transactions.resourceid WHERE commodity = "' +
-             str(commodity) + '" AND senderid '
-             '= 9999 GROUP BY time')
     prototype_trades = collections.OrderedDict()
     for agent in prototypes:
         agent_id = prototype_id(cur, agent)
-        from_agent = cur.execute(query.replace(
-            '9999', ' OR senderid = '.join(agent_id))).fetchall()
+        condition, params = in_clause(cur, 'senderid', agent_id)
+        from_agent = cur.execute('SELECT time, sum(quantity) '
+                                 'FROM transactions INNER JOIN resources '
+                                 'ON resources.resourceid = '
+                                 'transactions.resourceid '
+                                 'WHERE commodity = ? AND ' + condition +
+                                 ' GROUP BY time',
+                                 [str(commodity)] + params).fetchall()
         if is_cum:
             prototype_trades[agent] = timeseries_cum(
                 from_agent, duration, True)
@@ -945,14 +1179,15 @@ def commodity_per_institution(cur, commodity, timestep=10000):
         inst_id = inst[1]
         inst_name = inst[0]
         facilities = cur.execute('SELECT agentid FROM agententry '
-                                 'WHERE parentid = ' + str(inst_id)).fetchall()
+                                 'WHERE parentid = ?', (inst_id,)).fetchall()
         facilities_collected = []
         for fac in facilities:
             facilities_collected.append(fac[0])
-        query = exec_string(facilities_collected, 'senderid', 'sum(quantity)')
-        query += ' AND commodity = "' + commodity + \
-            '" and time < ' + str(timestep)
-        institution_output[inst_name] = cur.execute(query).fetchone()[0]
+        query, params = resource_query(cur, facilities_collected,
+                                       'senderid', 'sum(quantity)')
+        query += ' AND commodity = ? AND time < ?'
+        institution_output[inst_name] = cur.execute(
+            query, params + [commodity, timestep]).fetchone()[0]
 
     return institution_output
 
@@ -1013,6 +1248,52 @@ def waste_timeseries(isotopes, mass_timeseries, duration):
     return waste_time
 
 
+def event_timeline(insts, timestep, events, dtype=float):
+    """Accumulates entry and exit events into a running total per
+    institution. The deltas of all events are scatter-added into an
+    (institution, timestep) array in one pass, which is then summed
+    cumulatively along time.
+
+    Parameters
+    ----------
+    insts: list
+        list of insts (countries) with prototype and agentid
+    timestep: np.linspace
+        list of timestep from 0 to simulation time
+    events: list
+        list of (parentid, time, delta) tuples. Events of other
+        institutions or at times not in timestep are ignored.
+    dtype: type
+        data type of the returned arrays
+
+    Returns
+    -------
+    timeline: dictionary
+        "dictionary with key=government, and
+        value=timeseries of the running total"
+    """
+    rows = collections.OrderedDict()
+    for inst in insts:
+        rows.setdefault(inst['agentid'], len(rows))
+    columns = {t: i for i, t in enumerate(timestep)}
+    index = [(rows[parentid], columns[time], delta)
+             for parentid, time, delta in events
+             if parentid in rows and time in columns]
+
+    deltas = np.zeros((len(rows), len(timestep)), dtype=dtype)
+    if len(index) > 0:
+        row, column, delta = zip(*index)
+        np.add.at(deltas, (np.array(row), np.array(column)),
+                  np.array(delta, dtype=dtype))
+    totals = np.cumsum(deltas, axis=1)
+
+    timeline = collections.OrderedDict()
+    for inst in insts:
+        timeline[inst['prototype']] = totals[rows[inst['agentid']]]
+
+    return timeline
+
+
 def capacity_calc(insts, timestep, entry_exit):
     """Adds and subtracts capacity over time for plotting
 
@@ -1032,22 +1313,14 @@ def capacity_calc(insts, timestep, entry_exit):
         "dictionary with key=government, and
         value=timeseries list capacity"
     """
-    power = collections.OrderedDict()
-    for inst in insts:
-        capacity = []
-        cap = 0
-        for t in timestep:
-            for agent in entry_exit:
-                if (agent['entertime'] == t and
-                        agent['parentid'] == inst['agentid']):
-                    cap += agent['max(value)'] * 0.001
-                if (agent['entertime + lifetime'] == t and
-                        agent['parentid'] == inst['agentid']):
-                    cap -= agent['max(value)'] * 0.001
-            capacity.append(cap)
-        power[inst['prototype']] = np.asarray(capacity)
+    events = []
+    for agent in entry_exit:
+        events.append((agent['parentid'], agent['entertime'],
+                       agent['max(value)'] * 0.001))
+        events.append((agent['parentid'], agent['entertime + lifetime'],
+                       -agent['max(value)'] * 0.001))
 
-    return power
+    return event_timeline(insts, timestep, events)
 
 
 def reactor_deployments(insts, timestep, entry, exit_step):
@@ -1074,23 +1347,12 @@ def reactor_deployments(insts, timestep, entry, exit_step):
         "dictionary with key=government, and
         value=timeseries number of reactors"
     """
-    deployment = collections.OrderedDict()
-    for inst in insts:
-        num_reactors = []
-        count = 0
-        for t in timestep:
-            for enter in entry:
-                if (enter['entertime'] == t and
-                        enter['parentid'] == inst['agentid']):
-                    count += 1
-            for dec in exit_step:
-                if (dec['exittime'] == t and
-                        dec['parentid'] == inst['agentid']):
-                    count -= 1
-            num_reactors.append(count)
-        deployment[inst['prototype']] = np.asarray(num_reactors)
-
-    return deployment
+    events = [(enter['parentid'], enter['entertime'], 1)
+              for enter in entry]
+    events += [(dec['parentid'], dec['exittime'], -1)
+               for dec in exit_step]
+
+    return event_timeline(insts, timestep, events, dtype=int)
 
 
 def multiple_line_plots(dictionary, timestep,
@@ -1537,17 +1799,17 @@ def plot_in_out_flux(cur, facility, influx_bool,
     agentids = prototype_id(cur, facility)
 
     if influx_bool is True:
-        resources = cur.execute(exec_string(agentids,
-                                            'transactions.receiverId',
-                                            'time, sum(quantity), '
-                                            'qualid') +
-                                ' GROUP BY time, qualid').fetchall()
+        query, params = resource_query(cur, agentids,
+                                       'transactions.receiverId',
+                                       'time, sum(quantity), qualid')
+        resources = cur.execute(query + ' GROUP BY time, qualid',
+                                params).fetchall()
     else:
-        resources = cur.execute(exec_string(agentids,
-                                            'transactions.senderId',
-                                            'time, sum(quantity), '
-                                            'qualid') +
-                                ' GROUP BY time, qualid').fetchall()
+        query, params = resource_query(cur, agentids,
+                                       'transactions.senderId',
+                                       'time, sum(quantity), qualid')
+        resources = cur.execute(query + ' GROUP BY time, qualid',
+                                params).fetchall()
 
     compositions = cur.execute('SELECT qualid, nucid, massfrac '
                                'FROM compositions').fetchall()
@@ -1759,8 +2021,7 @@ def plot_in_flux_cumulative(
     -------
     """
 
-    masstime = cumulative_mass_timeseries(cur, facility, flux='in')[0]
-    times = cumulative_mass_timeseries(cur, facility, flux='in')[1]
+    masstime, times = cumulative_mass_timeseries(cur, facility, flux='in')
     mass_sort = sorted(masstime.items(), key=lambda e: e[
                        1][-1], reverse=True)
     nuclides = [item[0] for item in mass_sort]
@@ -1846,8 +2107,7 @@ def plot_in_flux_basic(
     Returns
     -------
     """
-    masstime = mass_timeseries(cur, facility, flux='in')[0]
-    times = mass_timeseries(cur, facility, flux='in')[1]
+    masstime, times = mass_timeseries(cur, facility, flux='in')
     nuclides = [item[0] for item in masstime]
     masses = [item[1] for item in masstime]
     mass_sort = sorted(masstime.items(), key=lambda e: e[
@@ -1893,8 +2153,7 @@ def plot_out_flux_basic(
     plot : plot
         plot of out flux of isotopes
     """
-    masstime = mass_timeseries(cur, facility, flux='out')[0]
-    times = mass_timeseries(cur, facility, flux='out')[1]
+    masstime, times = mass_timeseries(cur, facility, flux='out')
     nuclides = [item[0] for item in masstime]
     masses = [item[1] for item in masstime]
     mass_sort = sorted(masstime.items(), key=lambda e: e[
@@ -1932,10 +2191,8 @@ def plot_net_flux(
     plot : plot
         plot of net flux of isotopes
     """
-    masstime_in = mass_timeseries(cur, facility, flux='in')[0]
-    times_in = mass_timeseries(cur, facility, flux='in')[1]
-    masstime_out = mass_timeseries(cur, facility, flux='out')[0]
-    times_out = mass_timeseries(cur, facility, flux='out')[1]
+    masstime_in, times_in = mass_timeseries(cur, facility, flux='in')
+    masstime_out, times_out = mass_timeseries(cur, facility, flux='out')
     mass_sort_in = sorted(masstime_in.items(), key=lambda e: e[
         1][-1], reverse=True)
     mass_sort_out = sorted(masstime_out.items(), key=lambda e: e[
@@ -1954,8 +2211,11 @@ def plot_net_flux(
     plt.show()
 
 
-def mass_timeseries(cur, facility, flux):
-    """Returns dictionary of mass timeseries of each isotope at a facility.
+def isotope_mass_matrix(cur, facility, flux):
+    """Returns the mass of each isotope moved in or out of a facility
+        at each timestep as a matrix, from one query joining the
+        resources of the transactions with their compositions and
+        summing the mass of each isotope at each timestep.
 
     Parameters
     ----------
@@ -1964,71 +2224,92 @@ def mass_timeseries(cur, facility, flux):
     facility : str
         name of facility
     flux : str
-        direction of flux
+        direction of flux, 'in' or 'out'
 
     Returns
     -------
-    masstime : dict
-        dictionary of isotopes and their mass series
-    times : list
-        list of times in the simulation
+    nuclides : list
+        names of the isotopes, in order of first transaction
+    monthly : numpy array
+        mass in kg of each isotope at each timestep, with one row per
+        isotope and one column per timestep up to the last transaction.
+        Cumulative masses are given by np.cumsum(monthly, axis=1) and
+        total masses by its last column.
+    lengths : numpy array
+        number of timesteps up to and including the last transaction
+        of each isotope
     """
     agentids = prototype_id(cur, facility)
-
     if flux == 'in':
-        resources = cur.execute(exec_string(agentids,
-                                            'transactions.receiverId',
-                                            'time, sum(quantity), '
-                                            'qualid') +
-                                ' GROUP BY time, qualid').fetchall()
+        agent_colmn = 'transactions.receiverId'
     else:
-        resources = cur.execute(exec_string(agentids,
-                                            'transactions.senderId',
-                                            'time, sum(quantity), '
-                                            'qualid') +
-                                ' GROUP BY time, qualid').fetchall()
+        agent_colmn = 'transactions.senderId'
+    query, params = resource_query(cur, agentids, agent_colmn,
+                                   'time, sum(quantity) AS mass, qualid')
+    # the mass of each qualid is summed first, then split into isotopes.
+    # The qualid and composition row of the first transaction of each
+    # isotope at a timestep give the order of the isotopes. CROSS JOIN
+    # keeps compositions as the outer loop, so it is scanned once and the
+    # summed resources are looked up by qualid.
+    rows = cur.execute('SELECT res.time, compositions.nucid, '
+                       'sum(res.mass * compositions.massfrac), '
+                       'min(res.qualid), compositions.rowid '
+                       'FROM compositions CROSS JOIN '
+                       '(' + query + ' GROUP BY time, qualid) AS res '
+                       'ON res.qualid = compositions.qualid '
+                       'GROUP BY res.time, compositions.nucid',
+                       params).fetchall()
+    if len(rows) == 0:
+        return [], np.zeros((0, 0)), np.zeros(0, dtype=int)
+    times = np.array([row[0] for row in rows], dtype=int)
+    nucid = np.array([row[1] for row in rows], dtype=int)
+    masses = np.array([row[2] for row in rows], dtype=float)
+    qualid = np.array([row[3] for row in rows])
+    rowid = np.array([row[4] for row in rows])
+
+    # isotopes are numbered in order of first transaction
+    first = np.lexsort((rowid, qualid, times))
+    nucids, found = np.unique(nucid[first], return_index=True)
+    order = np.argsort(found)
+    rank = np.empty(len(nucids), dtype=int)
+    rank[order] = np.arange(len(nucids))
+    index = rank[np.searchsorted(nucids, nucid)]
+    nuclides = [nuclide_name(x) for x in nucids[order]]
+
+    columns = times.max() + 1
+    monthly = np.zeros((len(nuclides), columns))
+    monthly[index, times] = masses
+    # timesteps up to the last transaction of each isotope
+    lengths = np.zeros(len(nuclides), dtype=int)
+    np.maximum.at(lengths, index, times + 1)
+    return nuclides, monthly, lengths
 
-    compositions = cur.execute('SELECT qualid, nucid, massfrac '
-                               'FROM compositions').fetchall()
-
-    init_year, init_month, duration, timestep = simulation_timesteps(cur)
 
-    transactions = isotope_transactions(resources, compositions)
-
-    time_mass = []
-    time_waste = {}
-    for key in transactions.keys():
-
-        time_mass.append(transactions[key])
-        time_waste[key] = transactions[key]
+def mass_timeseries(cur, facility, flux):
+    """Returns dictionary of mass timeseries of each isotope at a facility.
 
-    waste_mass = waste_mass_series(transactions.keys(),
-                                   time_mass,
-                                   duration)
-    keys = []
-    for key in waste_mass.keys():
-        keys.append(key)
+    Parameters
+    ----------
+    cur : sqlite cursor
+        sqlite cursor
+    facility : str
+        name of facility
+    flux : str
+        direction of flux
 
+    Returns
+    -------
+    masstime : dict
+        dictionary of isotopes and their mass series
+    times : list
+        list of times in the simulation
+    """
+    nuclides, monthly, lengths = isotope_mass_matrix(cur, facility, flux)
     times = []
-    nuclides = []
     masstime = {}
-    for element in range(len(keys)):
-        time_and_mass = np.array(time_waste[keys[element]])
-        time = [item[0] for item in time_and_mass]
-        mass = [item[1] for item in time_and_mass]
-        mass_per_time = Counter()
-        for time, mass in time_and_mass:
-            mass_per_time.update({time: mass})
-        time = list(mass_per_time.keys())
-        mass_val = list(mass_per_time.values())
-        nuclide = nucname.name(keys[element])
-        for j in np.arange(0, int(time[-1]+1)):
-            if j not in time:
-                time.insert(j, j)
-                mass_val.insert(j, 0)
-        times.append(time)
-        nuclides.append(str(nuclide))
-        masstime[nucname.name(keys[element])] = mass_val
+    for nuclide, mass, length in zip(nuclides, monthly, lengths):
+        times.append(list(range(length)))
+        masstime[nuclide] = list(mass[:length])
     return masstime, times
 
 
@@ -2052,63 +2333,13 @@ def cumulative_mass_timeseries(cur, facility, flux):
     times : list
         list of times in the simulation
     """
-    agentids = prototype_id(cur, facility)
-
-    if flux == 'in':
-        resources = cur.execute(exec_string(agentids,
-                                            'transactions.receiverId',
-                                            'time, sum(quantity), '
-                                            'qualid') +
-                                ' GROUP BY time, qualid').fetchall()
-    else:
-        resources = cur.execute(exec_string(agentids,
-                                            'transactions.senderId',
-                                            'time, sum(quantity), '
-                                            'qualid') +
-                                ' GROUP BY time, qualid').fetchall()
-
-    compositions = cur.execute('SELECT qualid, nucid, massfrac '
-                               'FROM compositions').fetchall()
-
-    init_year, init_month, duration, timestep = simulation_timesteps(cur)
-
-    transactions = isotope_transactions(resources, compositions)
-
-    time_mass = []
-    time_waste = {}
-    for key in transactions.keys():
-
-        time_mass.append(transactions[key])
-        time_waste[key] = transactions[key]
-
-    waste_mass = waste_mass_series(transactions.keys(),
-                                   time_mass,
-                                   duration)
-    keys = []
-    for key in waste_mass.keys():
-        keys.append(key)
-
+    nuclides, monthly, lengths = isotope_mass_matrix(cur, facility, flux)
+    cumulative = np.cumsum(monthly, axis=1)
     times = []
-    nuclides = []
     masstime = {}
-    for element in range(len(keys)):
-        time_and_mass = np.array(time_waste[keys[element]])
-        time = [item[0] for item in time_and_mass]
-        mass = [item[1] for item in time_and_mass]
-        mass_per_time = Counter()
-        for time, mass in time_and_mass:
-            mass_per_time.update({time: mass})
-        time = list(mass_per_time.keys())
-        mass_val = list(mass_per_time.values())
-        nuclide = nucname.name(keys[element])
-        for j in np.arange(0, int(time[-1]+1)):
-            if j not in time:
-                time.insert(j, j)
-                mass_val.insert(j, 0)
-        mass_cum = list(np.cumsum(mass_val))
-        times.append(time)
-        nuclides.append(str(nuclide))
-        masstime[nucname.name(keys[element])] = mass_cum
+    for nuclide, mass_cum, length in zip(nuclides, cumulative, lengths):
+        times.append(list(range(length)))
+        masstime[nuclide] = list(mass_cum[:length])
     return masstime, times
 
 
@@ -2137,7 +2368,7 @@ def plot_cumulative_swu(cur, facilities=[]):
     for num in agentid:
         swu_data = cur.execute('SELECT time, value '
                                'FROM timeseriesenrichmentswu '
-                               'WHERE agentid = ' + str(num)).fetchall()
+                               'WHERE agentid = ?', (num,)).fetchall()
         swu_timeseries = timeseries_cum(swu_data, duration, False)
         swu_dict['Enrichment_' + str(num)] = swu_timeseries
 
@@ -2191,7 +2422,7 @@ def plot_swu(cur, facilities=[]):
     for num in agentid:
         swu_data = cur.execute('SELECT time, value '
                                'FROM timeseriesenrichmentswu '
-                               'WHERE agentid = ' + str(num)).fetchall()
+                               'WHERE agentid = ?', (num,)).fetchall()
         swu_timeseries = timeseries(swu_data, duration, False)
         swu_dict['Enrichment_' + str(num)] = swu_timeseries
 
@@ -2244,7 +2475,7 @@ def plot_cumulative_power(cur, reactors):
     for num in agentid:
         power_data = cur.execute('SELECT time, value '
                                  'FROM timeseriespower '
-                                 'WHERE agentid = ' + str(num)).fetchall()
+                                 'WHERE agentid = ?', (num,)).fetchall()
         power_timeseries = timeseries_cum(power_data, duration, False)
         power_dict['Reactor_' + str(num)] = power_timeseries
 
@@ -2297,7 +2528,7 @@ def plot_power_reactor(cur, reactors):
     for num in agentid:
         power_data = cur.execute('SELECT time, value '
                                  'FROM timeseriespower '
-                                 'WHERE agentid = ' + str(num)).fetchall()
+                                 'WHERE agentid = ?', (num,)).fetchall()
         power_timeseries = timeseries(power_data, duration, False)
         power_dict['Reactor_' + str(num)] = power_timeseries
 
@@ -2350,7 +2581,7 @@ def powerseries_reactor(cur, reactors):
     for num in agentid:
         power_data = cur.execute('SELECT time, value '
                                  'FROM timeseriespower '
-                                 'WHERE agentid = ' + str(num)).fetchall()
+                                 'WHERE agentid = ?', (num,)).fetchall()
         power_timeseries = timeseries(power_data, duration, False)
         power_dict['Reactor_' + str(num)] = power_timeseries
     return power_dict
@@ -2372,13 +2603,14 @@ def total_isotope_used(cur, facility):
         dictionary of isotopes mined and the total mass mined
     """
     flux = 'out'
-    isotope_masses_used = cumulative_mass_timeseries(cur, facility, flux)[0]
-
-    total_isotope = [item[1][-1] for item in isotope_masses_used.items()]
-    nuclides = [item[0] for item in isotope_masses_used.items()]
+    nuclides, monthly, lengths = isotope_mass_matrix(cur, facility, flux)
+    if len(nuclides) == 0:
+        return {}
+    total_isotope = np.cumsum(monthly, axis=1)[:, -1]
     total_mass_used = {}
-    for i in range(len(total_isotope)):
-        nuclide = nuclides[i]
-        mass = total_isotope[i]
+    for nuclide, mass in zip(nuclides, total_isotope):
         total_mass_used[nuclide] = mass
     return total_mass_used
+
+
+ins.instrument_from_environment(__name__)
@@ -1,9 +1,42 @@
+import collections
+import concurrent.futures
+import copy
+import hashlib
+import inspect
+import json
 import numpy as np
 import pandas as pd
+import pickle
+import xml.etree.ElementTree as ET
 import xmltodict
 from pprint import pprint
 import math
 import os
+import instrumentation as ins
+
+# directory the parsed input files are pickled in by cached_parse, set to
+# None to only keep them in memory
+parse_cache_directory = os.environ.get(
+    'TRANSITION_PARSE_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'transition-scenarios',
+                 'parsed'))
+# the least recently used pickles are removed once the directory holds more
+max_parse_cache_bytes = 512 * 1024 ** 2
+# part of the key of every pickle, increase it when the format of the
+# pickled results changes
+PARSE_CACHE_VERSION = 1
+_parsed = {}
+
+# fields of the prototype files read by get_powers and get_lifetime
+REACTOR_FIELDS = {'power_cap': ('facility', 'config', 'Reactor', 'power_cap'),
+                  'lifetime': ('facility', 'lifetime')}
+# directory the indexes of the fields of each directory of prototype files
+# are kept in, set to None to not keep indexes
+index_directory = os.environ.get(
+    'TRANSITION_REACTOR_INDEX',
+    os.path.join(os.path.expanduser('~'), '.cache', 'transition-scenarios',
+                 'reactor_index'))
+_indexes = {}
 
 
 def convert_xml_to_dict(filename):
@@ -25,6 +58,307 @@ def convert_xml_to_dict(filename):
     return xml_dict
 
 
+def read_fields(filename, fields=REACTOR_FIELDS):
+    '''
+    Reads the text of a few elements of an xml file, without building
+    the whole document. The file is only read until every element has
+    been found.
+
+    Parameters
+    ----------
+    filename: str
+        name of xml file
+    fields: dict
+        the keys are the names of the fields (strs), the values are the
+        paths of the elements (tuples of strs), starting at the root
+        element
+
+    Returns
+    -------
+    values: dict
+        the keys are the names of the fields, the values are the text of
+        the first element on each path, with the whitespace stripped as in
+        convert_xml_to_dict, or None if there is no such element or it
+        holds no text
+    '''
+    paths = {path: name for name, path in fields.items()}
+    values = dict.fromkeys(fields)
+    found = set()
+    stack = []
+    for event, element in ET.iterparse(filename, events=('start', 'end')):
+        if event == 'start':
+            stack.append(element.tag)
+            continue
+        path = tuple(stack)
+        stack.pop()
+        if path in paths and path not in found:
+            found.add(path)
+            text = (element.text or '').strip()
+            values[paths[path]] = text if text else None
+            if len(found) == len(paths):
+                break
+        if len(stack) > 1:
+            element.clear()
+    return values
+
+
+def index_file(path):
+    '''
+    Gets the index file of a directory of prototype files, which is in
+    index_directory and named after the directory and a hash of its
+    absolute path.
+
+    Parameters
+    ----------
+    path: str
+        directory name containing xml files for prototypes
+
+    Returns
+    -------
+    index_file: str
+        name of the index file
+    '''
+    path = os.path.abspath(path)
+    digest = hashlib.sha256(path.encode()).hexdigest()[:16]
+    return os.path.join(index_directory,
+                        os.path.basename(path) + '-' + digest + '.json')
+
+
+def load_index(index_file):
+    '''
+    Loads the index of the fields of a directory of prototype files. The
+    index is kept in memory and only loaded again once the file changes.
+
+    Parameters
+    ----------
+    index_file: str
+        name of the index file
+
+    Returns
+    -------
+    index: dict
+        the keys are the names of the files, the values are the
+        modification time, size and fields of each file, empty if there
+        is no index or it cannot be read
+    '''
+    try:
+        stat = os.stat(index_file)
+    except OSError:
+        return {}
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _indexes.get(index_file)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    try:
+        with open(index_file, 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    _indexes[index_file] = (version, index)
+    return index
+
+
+def reactor_fields(path, filenames=None, max_workers=None):
+    '''
+    Gets the REACTOR_FIELDS of the prototype files in a directory. The
+    values are kept in an index file of the directory (index_file), so
+    only files that are new or changed since the last call are read.
+    These are read in parallel.
+
+    Parameters
+    ----------
+    path: str
+        directory name containing xml files for prototypes
+    filenames: list of strs, optional
+        names of the files in the directory, all the xml files if None
+    max_workers: int, optional
+        maximum number of files read at the same time
+
+    Returns
+    -------
+    fields: dict
+        the keys are the names of the files, the values are the fields
+        of each file, from read_fields
+    '''
+    if filenames is None:
+        filenames = [x for x in os.listdir(path) if x[-4:] == ".xml"]
+    directory_index = None
+    index = {}
+    if index_directory is not None:
+        directory_index = index_file(path)
+        index = load_index(directory_index)
+
+    fields = {}
+    pending = {}
+    for filename in filenames:
+        stat = os.stat(os.path.join(path, filename))
+        entry = index.get(filename)
+        if entry is not None and entry['mtime'] == stat.st_mtime_ns and \
+                entry['size'] == stat.st_size:
+            fields[filename] = entry['fields']
+        else:
+            pending[filename] = {'mtime': stat.st_mtime_ns,
+                                 'size': stat.st_size}
+    if not pending:
+        return fields
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        values = executor.map(read_fields,
+                              [os.path.join(path, x) for x in pending])
+        for filename, value in zip(pending, values):
+            fields[filename] = value
+            pending[filename]['fields'] = value
+    if directory_index is not None:
+        index = dict(index, **pending)
+        try:
+            os.makedirs(index_directory, exist_ok=True)
+            temporary = directory_index + '.' + str(os.getpid())
+            with open(temporary, 'w') as f:
+                json.dump(index, f)
+            os.replace(temporary, directory_index)
+            stat = os.stat(directory_index)
+            _indexes[directory_index] = ((stat.st_mtime_ns, stat.st_size),
+                                         index)
+        except OSError:
+            pass
+    return fields
+
+
+def file_hash(filename):
+    '''
+    Hashes the contents of a file
+
+    Parameters
+    ----------
+    filename: str
+        name of the file
+
+    Returns
+    -------
+    digest: str
+        hexadecimal SHA-256 hash of the file
+    '''
+    with open(filename, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def function_hash(function):
+    '''
+    Hashes the source code of a function, or its bytecode if the source
+    is not available
+
+    Parameters
+    ----------
+    function: function
+        function to hash
+
+    Returns
+    -------
+    digest: str
+        hexadecimal SHA-256 hash of the function
+    '''
+    try:
+        code = inspect.getsource(function).encode()
+    except (OSError, TypeError):
+        code = function.__code__.co_code
+    return hashlib.sha256(code).hexdigest()
+
+
+def prune_parse_cache(keep=None):
+    '''
+    Removes the least recently used pickles of cached_parse until
+    parse_cache_directory fits in max_parse_cache_bytes. Pickles removed
+    by another process meanwhile are skipped.
+
+    Parameters
+    ----------
+    keep: str, optional
+        name of a pickle that is never removed
+    '''
+    entries = []
+    for name in os.listdir(parse_cache_directory):
+        if not name.endswith('.pkl'):
+            continue
+        path = os.path.join(parse_cache_directory, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, path))
+    entries.sort()
+    size = sum(x[1] for x in entries)
+    for mtime, pickle_size, path in entries:
+        if size <= max_parse_cache_bytes:
+            break
+        if path == keep:
+            continue
+        size -= pickle_size
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def cached_parse(parse, filenames, *args):
+    '''
+    Calls parse with the names of the files and any additional arguments
+    once for each version of the files and of parse. The result is kept
+    in memory and pickled in parse_cache_directory, keyed by the hashes
+    of the files, of the source of parse and PARSE_CACHE_VERSION, so
+    later calls and later processes get it without parsing the files
+    again. The least recently used pickles are removed once the
+    directory holds more than max_parse_cache_bytes. A copy of the
+    result is returned, so it can be modified.
+
+    Parameters
+    ----------
+    parse: function
+        function reading the files, called as parse(*filenames, *args)
+    filenames: list of strs
+        names of the files read by parse
+    args:
+        additional arguments of parse, which must have a stable repr
+
+    Returns
+    -------
+    parsed: obj
+        copy of the value returned by parse
+    '''
+    digest = hashlib.sha256((str(PARSE_CACHE_VERSION) + parse.__name__ +
+                             function_hash(parse)).encode())
+    for filename in filenames:
+        digest.update(file_hash(filename).encode())
+    digest.update(repr(args).encode())
+    key = digest.hexdigest()
+
+    if key not in _parsed:
+        pickle_file = None
+        if parse_cache_directory is not None:
+            pickle_file = os.path.join(parse_cache_directory, key + '.pkl')
+        try:
+            with open(pickle_file, 'rb') as f:
+                _parsed[key] = pickle.load(f)
+        except (TypeError, OSError, EOFError, pickle.UnpicklingError):
+            _parsed[key] = parse(*filenames, *args)
+            if pickle_file is not None:
+                try:
+                    os.makedirs(parse_cache_directory, exist_ok=True)
+                    temporary = pickle_file + '.' + str(os.getpid())
+                    with open(temporary, 'wb') as f:
+                        pickle.dump(_parsed[key], f)
+                    os.replace(temporary, pickle_file)
+                    prune_parse_cache(keep=pickle_file)
+                except OSError:
+                    pass
+        else:
+            try:
+                # marks the pickle as recently used for the pruning
+                os.utime(pickle_file)
+            except OSError:
+                pass
+    return copy.deepcopy(_parsed[key])
+
+
 def get_deployinst_dict(
         deployinst_dict,
         power_dict,
@@ -64,14 +398,17 @@ def get_deployinst_dict(
                      'prototypes': [],
                      'n_build': [],
                      'build_times': []}
-    for indx, val in enumerate(
-            deployinst_dict['DeployInst']['prototypes']['val']):
+    prototypes = deployinst_dict['DeployInst']['prototypes']['val']
+    if 'lifetimes' not in deployinst_dict['DeployInst']:
+        lifetimes = get_lifetimes(
+            path, [x for x in prototypes if x in power_dict.keys()])
+    for indx, val in enumerate(prototypes):
         if val in power_dict.keys():
             if 'lifetimes' in deployinst_dict['DeployInst']:
                 deployed_dict['lifetime'].append(int(
                     deployinst_dict['DeployInst']['lifetimes']['val'][indx]))
             else:
-                deployed_dict['lifetime'].append(get_lifetime(path, val))
+                deployed_dict['lifetime'].append(lifetimes[val])
             deployed_dict['prototypes'].append(val)
             deployed_dict['n_build'].append(
                 int(deployinst_dict['DeployInst']['n_build']['val'][indx]))
@@ -101,16 +438,10 @@ def get_powers(path):
         in the keys are replaced with underscores.
     '''
     reactor_power = {}
-    for filename in os.listdir(path):
-        file = os.path.join(path, filename)
-        if file[-4:] != ".xml":
-            continue
-        reactor_info = convert_xml_to_dict(file)
-
-        reactor_power.update(
-            {filename[:-4]: reactor_info['facility']['config']['Reactor']['power_cap']
-             }
-        )
+    for filename, fields in reactor_fields(path).items():
+        if fields['power_cap'] is None:
+            raise KeyError('No Reactor power_cap in ' + filename)
+        reactor_power[filename[:-4]] = fields['power_cap']
     return reactor_power
 
 
@@ -137,11 +468,33 @@ def get_pris_powers(country, path, year):
         names (strs), the values are the rated powers (ints). Any spaces
         in the keys are replaced with underscores.
     '''
-    pris_power = {}
-    reactors = pd.read_csv(path + 'reactors_pris_' + str(year) + '.csv')
+    return cached_parse(read_pris_powers,
+                        [path + 'reactors_pris_' + str(year) + '.csv'],
+                        country)
+
+
+def read_pris_powers(filename, country):
+    '''
+    Reads the rated power of the reactor units of a country from a
+    reactors_pris_XXXX.csv file, see get_pris_powers
+
+    Parameters
+    ----------
+    filename: str
+        name of the pris csv file
+    country: str
+        name of country to get LWR data for
+
+    Returns
+    -------
+    pris_power: dict
+        dictionary of reactor names and rated powers, the keys are the reactor
+        names (strs), the values are the rated powers (ints). Any spaces
+        in the keys are replaced with underscores.
+    '''
+    reactors = pd.read_csv(filename)
     reactors = reactors.loc[reactors['Country'] == country]
-    for index, row in reactors.iterrows():
-        pris_power[row['Unit']] = row['RUP [MWe]']
+    pris_power = dict(zip(reactors['Unit'], reactors['RUP [MWe]']))
     pris_power = {k.replace(' ', '_'): v for k, v in pris_power.items()}
     return pris_power
 
@@ -162,16 +515,52 @@ def get_lifetime(path, name):
     lifetime: int
         lifetime of prototype
     '''
-    prototype_dict = convert_xml_to_dict(path + name + '.xml')
-    lifetime = int(prototype_dict['facility']['lifetime'])
-    return lifetime
+    return get_lifetimes(path, [name])[name]
+
+
+def get_lifetimes(path, names):
+    '''
+    Get the lifetimes of several prototypes from the modular files of the
+    prototype definitions, reading the index of the directory once
+
+    Parameters
+    ----------
+    path: str
+        relative path to prototype definition files
+    names: list of strs
+        names of prototypes
+
+    Returns
+    -------
+    lifetimes: dict
+        the keys are the names of the prototypes, the values are their
+        lifetimes (ints)
+    '''
+    files = collections.defaultdict(dict)
+    for name in names:
+        directory, filename = os.path.split(path + name + '.xml')
+        files[directory or '.'][filename] = name
+    lifetimes = {}
+    for directory, filenames in files.items():
+        fields = reactor_fields(directory, list(filenames))
+        for filename, name in filenames.items():
+            if fields[filename]['lifetime'] is None:
+                raise KeyError('No lifetime in ' + filename)
+            lifetimes[name] = int(fields[filename]['lifetime'])
+    return lifetimes
 
 
 def get_deployed_power(power_dict, deployed_dict, sim_duration):
     '''
     Creates array of the total power from agents in a given
     DeployInst. Each entry in the array is for each time step in
-    the simulation.
+    the simulation. The power of each agent is added at its build
+    time and subtracted at the end of its lifetime in a difference
+    array, which is then summed cumulatively.
+
+    Multiple DeployInsts, such as variants of the LWR lifetimes
+    in a parametric sweep, can be given as a list to get the power
+    of all of them at once.
 
     Parameters
     ----------
@@ -180,10 +569,10 @@ def get_deployed_power(power_dict, deployed_dict, sim_duration):
         The keys are the reactor
         names (strs), the values are the rated powers (ints). Any spaces
         in the keys are replaced with underscores.
-    deployed_dict: dict
+    deployed_dict: dict or list of dicts
         contains the lifetimes, number built, and name of each
         prototype in the DeployInst. The keys are strs and values
-        are lists of ints.
+        are lists of ints. Build times are non-negative time steps.
     sim_duration: int
         number of timesteps in the simulation
 
@@ -193,17 +582,38 @@ def get_deployed_power(power_dict, deployed_dict, sim_duration):
         ranged arrays of durations
     inst_power: array of ints
         deployed power at each timestep from a single DeployInst
-        based on the power and duration of each prototype
+        based on the power and duration of each prototype. If
+        deployed_dict is a list, a 2-D array with one row for each
+        DeployInst.
     '''
     t = np.arange(sim_duration)
-    for key, val in deployed_dict.items():
-        power_profile = np.zeros(len(t))
-        for i, v in enumerate(deployed_dict['prototypes']):
-            prototype_power = np.zeros(len(t))
-            prototype_power[deployed_dict['build_times'][i]:deployed_dict['build_times'][
-                i] + deployed_dict['lifetime'][i]] += \
-                float(power_dict[v] * deployed_dict['n_build'][i])
-            power_profile += prototype_power
+    deployed_dicts = deployed_dict
+    if isinstance(deployed_dict, dict):
+        deployed_dicts = [deployed_dict]
+
+    entries = []
+    for row, deployed in enumerate(deployed_dicts):
+        for v, build_time, lifetime, n_build in zip(
+                deployed['prototypes'], deployed['build_times'],
+                deployed['lifetime'], deployed['n_build']):
+            entries.append((row, int(build_time),
+                            int(build_time) + int(lifetime),
+                            float(power_dict[v]) * int(n_build)))
+    entries = np.array(entries, dtype=float).reshape(-1, 4)
+    rows = entries[:, 0].astype(int)
+    starts = entries[:, 1].astype(int)
+    stops = entries[:, 2].astype(int)
+    powers = entries[:, 3]
+    starts = np.clip(starts, 0, sim_duration)
+    stops = np.clip(stops, 0, sim_duration)
+    active = stops > starts
+
+    power_change = np.zeros((len(deployed_dicts), sim_duration + 1))
+    np.add.at(power_change, (rows[active], starts[active]), powers[active])
+    np.add.at(power_change, (rows[active], stops[active]), -powers[active])
+    power_profile = np.cumsum(power_change[:, :sim_duration], axis=1)
+    if isinstance(deployed_dict, dict):
+        power_profile = power_profile[0]
     return t, power_profile
 
 
@@ -483,6 +893,9 @@ def determine_deployment_schedule(
         deployment schedule of reactor prototypes with the
         structure for a DeployInst
     '''
+    # positions in deploy_schedule of the builds at each
+    # (build time, prototype), to find reactors to redeploy
+    build_index = collections.defaultdict(list)
     deploy_schedule = {'DeployInst': {'prototypes': {'val': []},
                                       'build_times': {'val': []},
                                       'n_build': {'val': []},
@@ -502,21 +915,15 @@ def determine_deployment_schedule(
                     0, len(deployment_order)))}
         for reactor in deployment_order:
             previous_time = index - reactor_prototypes[reactor][1]
-            if previous_time in deploy_schedule['DeployInst']['build_times']['val']:
-                previous_index = [
-                    ii for ii, e in enumerate(
-                        deploy_schedule['DeployInst']['build_times']['val']) if
-                    e == previous_time]
-                for item in previous_index:
-                    if deploy_schedule['DeployInst']['prototypes']['val'][item] == reactor:
-                        new_reactors = redeploy_reactors(value,
-                                                         reactor,
-                                                         reactor_prototypes,
-                                                         deploy_schedule,
-                                                         item)
-                        power_gap, value = update_power_demand(
-                            power_gap, index, value, new_reactors, reactor_prototypes, reactor)
-                        num_reactors[reactor] += new_reactors
+            for item in build_index.get((previous_time, reactor), []):
+                new_reactors = redeploy_reactors(value,
+                                                 reactor,
+                                                 reactor_prototypes,
+                                                 deploy_schedule,
+                                                 item)
+                power_gap, value = update_power_demand(
+                    power_gap, index, value, new_reactors, reactor_prototypes, reactor)
+                num_reactors[reactor] += new_reactors
         # Deploy new reactors
         if shares:
             for reactor in shares:
@@ -534,6 +941,8 @@ def determine_deployment_schedule(
         for reactor in deployment_order:
             if num_reactors[reactor] <= 0:
                 continue
+            build_index[(index, reactor)].append(
+                len(deploy_schedule['DeployInst']['build_times']['val']))
             deploy_schedule = update_di(
                 deploy_schedule,
                 reactor,
@@ -544,6 +953,44 @@ def determine_deployment_schedule(
     return deploy_schedule
 
 
+def determine_deployment_schedules(
+        power_gaps,
+        reactor_prototypes,
+        shares=None):
+    '''
+    Define the deployment schedules for multiple gaps in production
+    and demand at once, such as those of many demand curves. Each
+    schedule is the same as the one returned by
+    determine_deployment_schedule for that gap, but the gaps passed
+    in are not modified.
+
+    Parameters
+    ----------
+    power_gaps: 2-D array or list of arrays
+        gap in power production and demand, one row per curve. A 2-D
+        array can be made from multiple demand curves with
+        determine_power_gap(power_profile, demands).
+    reactor_prototypes: dictionary
+        information about reactor prototypes to be deployed. The
+        keys are the prototype names (strs) and the values are
+        a tuple of the power output and lifetime (ints)
+    shares: dict
+        contains information about build share for specified
+        prototypes, {name(str): build share(int)}
+
+    Returns
+    -------
+    deploy_schedules: list of dicts
+        deployment schedule of reactor prototypes with the
+        structure for a DeployInst, for each row of power_gaps
+    '''
+    deploy_schedules = []
+    for power_gap in power_gaps:
+        deploy_schedules.append(determine_deployment_schedule(
+            np.array(power_gap), reactor_prototypes, shares))
+    return deploy_schedules
+
+
 def write_deployinst(deploy_schedule, out_path):
     '''
     Write xml file for the DeployInst to meet the power demand
@@ -595,30 +1042,93 @@ def write_lwr_deployinst(lwr_param, DI_file, lwr_order):
         {'val':[]}, 'build_times':{'val':[]},'lifetimes':{'val':[]}}}.
         The values in the inner-most dict are ints
     '''
-    DI_dict = convert_xml_to_dict(DI_file)
+    return lwr_deployinst(lwr_param, *cached_parse(read_lwr_deployinst,
+                                                   [DI_file, lwr_order]))
+
+
+def lwr_deployinst(lwr_param, DI_dict, lwrs, order_index):
+    '''
+    Create the DeployInst for the LWRs of write_lwr_deployinst from the
+    files already read by read_lwr_deployinst, so that many DeployInsts
+    can be created without reading the files again. The given DI_dict
+    is not modified.
+
+    Parameters
+    ----------
+    lwr_param: float
+        percent of LWRs to receive lifetime extensions
+    DI_dict: dict
+        contents of the DeployInst file, from read_lwr_deployinst
+    lwrs: list of strs
+        LWRs ordered by power output, from read_lwr_deployinst
+    order_index: array of ints
+        index in the DeployInst prototypes of each LWR in lwrs, from
+        read_lwr_deployinst
+
+    Returns
+    -------
+    DI_dict: dict
+        nested dictionary, contains information for the DeployInst in
+        the form {'DeployInst':{'prototypes':{'val':[]}, 'n_build':
+        {'val':[]}, 'build_times':{'val':[]},'lifetimes':{'val':[]}}}.
+        The values in the inner-most dict are ints
+    '''
+    DI_dict = dict(DI_dict, DeployInst=dict(DI_dict['DeployInst']))
     DI_dict['DeployInst']['lifetimes'] = {'val': []}
     DI_dict['DeployInst']['lifetimes']['val'] = np.repeat(720, 116)
     DI_dict['DeployInst']['lifetimes']['val'][0] = 600
 
-    with open(lwr_order, 'r') as f:
-        lwrs = f.readlines()
-    for index, item in enumerate(lwrs):
-        lwrs[index] = item.strip("\n")
-    lwrs_extended = lwrs[:int(lwr_param) + 1]
-
-    for lwr in lwrs_extended:
-        index = DI_dict['DeployInst']['prototypes']['val'].index(lwr)
-        DI_dict['DeployInst']['lifetimes']['val'][index] = 960
+    extended = order_index[:int(lwr_param) + 1]
+    if (extended < 0).any():
+        missing = lwrs[:int(lwr_param) + 1][np.argmax(extended < 0)]
+        raise ValueError(repr(missing) + ' is not in list')
+    DI_dict['DeployInst']['lifetimes']['val'][extended] = 960
     return DI_dict
 
 
+def read_lwr_deployinst(DI_file, lwr_order):
+    '''
+    Reads the DeployInst for LWRs and the order of the LWRs by power
+    output, for write_lwr_deployinst
+
+    Parameters
+    ----------
+    DI_file: str
+        file name and path to DeployInst file for LWRs
+    lwr_order: str
+        path and name of file containing LWRs ordered by power output.
+
+    Returns
+    -------
+    DI_dict: dict
+        contents of the DeployInst file, from convert_xml_to_dict
+    lwrs: list of strs
+        LWRs ordered by power output
+    order_index: array of ints
+        index in the DeployInst prototypes of the first occurrence of
+        each LWR in lwrs, -1 if it is not in the DeployInst
+    '''
+    DI_dict = convert_xml_to_dict(DI_file)
+    with open(lwr_order, 'r') as f:
+        lwrs = [item.strip("\n") for item in f.readlines()]
+
+    prototypes = DI_dict['DeployInst']['prototypes']['val']
+    first_index = {}
+    for index, prototype in enumerate(prototypes):
+        first_index.setdefault(prototype, index)
+    order_index = np.array([first_index.get(lwr, -1) for lwr in lwrs],
+                           dtype=int)
+    return DI_dict, lwrs, order_index
+
+
 def write_AR_deployinst(
         lwr_DI,
         lwr_path,
         duration,
         reactor_prototypes,
         demand_eq,
-        shares=None):
+        shares=None,
+        lwr_powers=None):
     ''''
     Creates the DeployInst for the deployment of advanced reactors
 
@@ -640,6 +1150,10 @@ def write_AR_deployinst(
     shares: dict
         contains information about build share for specified
         prototypes, {name(str):build share(int)}
+    lwr_powers: dict, optional
+        power of each LWR, from get_powers(lwr_path). Passing it avoids
+        reading every file in lwr_path again when many DeployInsts are
+        written for the same LWRs.
 
 
     Returns
@@ -650,7 +1164,8 @@ def write_AR_deployinst(
         {'val':[]}, 'build_times':{'val':[]},'lifetimes':{'val':[]}}}.
         The values in the inner-most dict are ints
     '''
-    lwr_powers = get_powers(lwr_path)
+    if lwr_powers is None:
+        lwr_powers = get_powers(lwr_path)
     deployed_lwr_dict = get_deployinst_dict(
         lwr_DI, lwr_powers, lwr_path)
     time, deployed_power = get_deployed_power(lwr_powers,
@@ -661,3 +1176,6 @@ def write_AR_deployinst(
                                                     reactor_prototypes,
                                                     shares)
     return deploy_schedule
+
+
+ins.instrument_from_environment(__name__)
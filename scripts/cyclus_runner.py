@@ -0,0 +1,304 @@
+'''
+Runs batches of Cyclus simulations in parallel, with a limit on the
+number of Cyclus processes running at the same time. Each job is a
+Cyclus input file and the output database it should produce.
+
+Jobs whose output database already holds a finished simulation are
+skipped, so an interrupted batch is resumed by running it again. Every
+simulation writes to a temporary database that is only moved to the
+output name once Cyclus exits successfully, which keeps unfinished runs
+from being mistaken for finished ones. The output of each run is written
+to a log file and the time each job took is returned and, optionally,
+appended to a JSON lines file.
+
+To run:
+    python cyclus_runner.py [--output-dir outputs] [--overwrite]
+        [max_workers] [input.xml] [input.xml] ...
+'''
+import argparse
+import concurrent.futures
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+CYCLUS = 'cyclus'
+
+
+def valid_output(output_sqlite):
+    '''
+    Checks if a Cyclus output database holds a finished simulation,
+    which is the case when its Finish table has a row.
+
+    Parameters
+    ----------
+    output_sqlite: str
+        name of Cyclus SQLite output file
+
+    Returns
+    -------
+    valid: bool
+        True if the simulation in the database finished
+    '''
+    if not os.path.isfile(output_sqlite) or \
+            os.path.getsize(output_sqlite) == 0:
+        return False
+    try:
+        connect = sqlite3.connect('file:' + os.path.abspath(output_sqlite) +
+                                  '?mode=ro', uri=True)
+        try:
+            row = connect.execute('SELECT * FROM Finish LIMIT 1').fetchone()
+        finally:
+            connect.close()
+    except sqlite3.Error:
+        return False
+    return row is not None
+
+
+def partial_file(output_sqlite):
+    '''
+    Gets the name of the temporary database a job writes to. The
+    extension is kept because Cyclus picks its output backend from it.
+
+    Parameters
+    ----------
+    output_sqlite: str
+        name of Cyclus SQLite output file
+
+    Returns
+    -------
+    partial: str
+        name of the temporary output file
+    '''
+    root, extension = os.path.splitext(output_sqlite)
+    return root + '.partial' + extension
+
+
+def log_file(output_sqlite, log_dir=None):
+    '''
+    Gets the name of the file the output of a job is written to
+
+    Parameters
+    ----------
+    output_sqlite: str
+        name of Cyclus SQLite output file
+    log_dir: str, optional
+        directory of the log files, if None the log is written next
+        to the output file
+
+    Returns
+    -------
+    log: str
+        name of the log file
+    '''
+    log = os.path.splitext(output_sqlite)[0] + '.log'
+    if log_dir is not None:
+        log = os.path.join(log_dir, os.path.basename(log))
+    return log
+
+
+def cyclus_command(input_xml, output_sqlite, executable=CYCLUS, args=()):
+    '''
+    Builds the command line of a Cyclus run
+
+    Parameters
+    ----------
+    input_xml: str
+        name of Cyclus xml input file
+    output_sqlite: str
+        name of Cyclus SQLite output file
+    executable: str, optional
+        Cyclus executable
+    args: list of strs, optional
+        additional command line arguments
+
+    Returns
+    -------
+    command: list of strs
+        command line of the run
+    '''
+    return [executable, '-i', input_xml, '-o', output_sqlite] + list(args)
+
+
+def run_job(input_xml, output_sqlite, executable=CYCLUS, args=(),
+            log_dir=None, env=None):
+    '''
+    Runs a single Cyclus simulation. A temporary database left by an
+    interrupted run is removed first, because Cyclus would append to it.
+
+    Parameters
+    ----------
+    input_xml: str
+        name of Cyclus xml input file
+    output_sqlite: str
+        name of Cyclus SQLite output file
+    executable: str, optional
+        Cyclus executable
+    args: list of strs, optional
+        additional command line arguments
+    log_dir: str, optional
+        directory of the log files, if None the log is written next
+        to the output file
+    env: dict, optional
+        environment of the Cyclus process
+
+    Returns
+    -------
+    result: dict
+        input, output, status ('ran' or 'failed'), return code, wall
+        time in seconds, and log file of the job
+    '''
+    partial = partial_file(output_sqlite)
+    log = log_file(output_sqlite, log_dir)
+    for directory in [os.path.dirname(partial), os.path.dirname(log)]:
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    if os.path.exists(partial):
+        os.remove(partial)
+
+    command = cyclus_command(input_xml, partial, executable, args)
+    start = time.time()
+    with open(log, 'w') as f:
+        f.write(' '.join(command) + '\n')
+        f.flush()
+        try:
+            returncode = subprocess.call(command, stdout=f,
+                                         stderr=subprocess.STDOUT, env=env)
+        except OSError as error:
+            f.write(str(error) + '\n')
+            returncode = None
+    seconds = time.time() - start
+
+    if returncode == 0 and valid_output(partial):
+        os.replace(partial, output_sqlite)
+        status = 'ran'
+    else:
+        if os.path.exists(partial):
+            os.remove(partial)
+        status = 'failed'
+
+    return {'input': input_xml, 'output': output_sqlite, 'status': status,
+            'returncode': returncode, 'seconds': seconds, 'log': log}
+
+
+def run_jobs(jobs, max_workers=None, executable=CYCLUS, args=(),
+             log_dir=None, env=None, timings_file=None, overwrite=False):
+    '''
+    Runs Cyclus simulations in parallel, skipping the jobs whose output
+    database already holds a finished simulation. Every job runs in its
+    own Cyclus process, so the pool only needs threads to wait on them.
+
+    Parameters
+    ----------
+    jobs: list of tuples
+        name of the Cyclus xml input file and of the SQLite output file
+        of each job
+    max_workers: int, optional
+        maximum number of simulations run at the same time, if None one
+        simulation is run per CPU
+    executable: str, optional
+        Cyclus executable
+    args: list of strs, optional
+        additional command line arguments of every run
+    log_dir: str, optional
+        directory of the log files, if None each log is written next
+        to its output file
+    env: dict, optional
+        environment of the Cyclus processes
+    timings_file: str, optional
+        JSON lines file the result of each job is appended to when the
+        job finishes
+    overwrite: bool, optional
+        if True, jobs are run even if their output is valid
+
+    Returns
+    -------
+    results: list of dicts
+        result of each job, in the order of jobs, with the status
+        'skipped' for jobs that were not run
+    '''
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    results = [None] * len(jobs)
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as pool:
+        futures = {}
+        for index, (input_xml, output_sqlite) in enumerate(jobs):
+            if not overwrite and valid_output(output_sqlite):
+                results[index] = {'input': input_xml,
+                                  'output': output_sqlite,
+                                  'status': 'skipped', 'returncode': None,
+                                  'seconds': 0.0, 'log': None}
+                continue
+            if overwrite and os.path.exists(output_sqlite):
+                os.remove(output_sqlite)
+            future = pool.submit(run_job, input_xml, output_sqlite,
+                                 executable, args, log_dir, env)
+            futures[future] = index
+
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if timings_file is not None:
+                with open(timings_file, 'a') as f:
+                    f.write(json.dumps(result) + '\n')
+
+    return results
+
+
+def main(max_workers, input_files, output_dir=None, overwrite=False,
+         executable=CYCLUS):
+    '''
+    Runs Cyclus on each input file, writing the output database named
+    after it in output_dir, and reports the status and wall time of each
+    job
+
+    Parameters
+    ----------
+    max_workers: int
+        maximum number of simulations run at the same time
+    input_files: list of strs
+        names of Cyclus xml input files
+    output_dir: str, optional
+        directory of the output databases, if None each database is
+        written next to its input file
+    overwrite: bool, optional
+        if True, jobs are run even if their output is valid
+    executable: str, optional
+        Cyclus executable
+
+    Returns
+    -------
+    failed: int
+        number of jobs that failed
+    '''
+    jobs = []
+    for input_file in input_files:
+        output_sqlite = os.path.splitext(input_file)[0] + '.sqlite'
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            output_sqlite = os.path.join(output_dir,
+                                         os.path.basename(output_sqlite))
+        jobs.append((input_file, output_sqlite))
+    results = run_jobs(jobs, max_workers, executable, overwrite=overwrite)
+    for result in results:
+        print(result['status'], round(result['seconds'], 1), result['output'])
+    return sum(result['status'] == 'failed' for result in results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Runs Cyclus input files in parallel')
+    parser.add_argument('max_workers', type=int,
+                        help='maximum number of simulations run at once')
+    parser.add_argument('input_files', nargs='+',
+                        help='Cyclus xml input files')
+    parser.add_argument('--output-dir',
+                        help='directory of the output databases, next to '
+                        'the input files by default')
+    parser.add_argument('--overwrite', action='store_true',
+                        help='runs the jobs whose output is finished again')
+    args = parser.parse_args()
+    sys.exit(main(args.max_workers, args.input_files, args.output_dir,
+                  args.overwrite) > 0)
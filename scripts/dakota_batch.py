@@ -0,0 +1,214 @@
+'''
+Evaluates a batch of Dakota parameter points in one Python process. The
+scenario of every point is written first, then the Cyclus runs are
+spread over a pool of workers with cyclus_runner, and the responses of
+each point are calculated from its output database with one
+output_metrics.MetricsSession.
+
+Runs of inputs that are identical to an earlier run are served from the
+run cache, and points of a batch that render the same scenario are only
+simulated once.
+'''
+import os
+import re
+
+import cyclus_runner as cr
+import output_metrics as oup
+import run_cache as rc
+import table_cache as tc
+
+
+def scenario_name(params, variables):
+    '''
+    Builds the name of the scenario of a parameter point from the integer
+    values of its variables, in the form
+    '<variable>_<value>_<variable>_<value>...'
+
+    Parameters
+    ----------
+    params: dakota.interfacing.Parameters or dict
+        values of the variables of the point
+    variables: list of strs
+        names of the variables used in the name, in order
+
+    Returns
+    -------
+    name: str
+        name of the scenario
+    '''
+    return '_'.join(variable + '_' + str(int(params[variable]))
+                    for variable in variables)
+
+
+def variable_dict(params, variables):
+    '''
+    Builds the dictionary of template variables of a parameter point,
+    with the value of each variable rounded to an integer
+
+    Parameters
+    ----------
+    params: dakota.interfacing.Parameters or dict
+        values of the variables of the point
+    variables: list of strs
+        names of the variables
+
+    Returns
+    -------
+    variable_dict: dict of strs
+        integer value of each variable, as a str
+    '''
+    return {variable: str(int(params[variable])) for variable in variables}
+
+
+def evaluation_concurrency(dakota_input):
+    '''
+    Reads the evaluation_concurrency of the interface block of a Dakota
+    input file
+
+    Parameters
+    ----------
+    dakota_input: str
+        name of the Dakota input file
+
+    Returns
+    -------
+    concurrency: int or None
+        maximum number of evaluations Dakota runs at the same time, None
+        if the input does not set it
+    '''
+    with open(dakota_input) as f:
+        for line in f:
+            match = re.match(r'\s*evaluation_concurrency\s*=?\s*(\d+)',
+                             line.split('#')[0])
+            if match:
+                return int(match.group(1))
+    return None
+
+
+def run_jobs(jobs, max_workers=None, executable=None):
+    '''
+    Runs the Cyclus jobs of a batch. Outputs that already exist are kept,
+    outputs of inputs in the run cache are served from it, and the other
+    jobs are run on the worker pool and added to the cache.
+
+    Parameters
+    ----------
+    jobs: list of tuples
+        name of the Cyclus xml input file and of the SQLite output file
+        of each point, the same output may appear more than once
+    max_workers: int, optional
+        maximum number of simulations run at the same time, if None one
+        simulation is run per CPU
+    executable: str, optional
+        Cyclus executable, cyclus_runner.CYCLUS if None
+
+    Returns
+    -------
+    failed: set of strs
+        names of the outputs that could not be produced
+    '''
+    if executable is None:
+        executable = cr.CYCLUS
+    pending = {}
+    for input_xml, output_sqlite in jobs:
+        if output_sqlite in pending or os.path.exists(output_sqlite):
+            continue
+        digest = rc.input_digest(input_xml, executable)
+        if digest is not None and rc.fetch(digest, output_sqlite):
+            continue
+        pending[output_sqlite] = (input_xml, digest)
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    results = cr.run_jobs([(x[0], output) for output, x in pending.items()],
+                          max_workers, executable, ['--warn-limit', '2'])
+
+    failed = set()
+    for result in results:
+        if result['status'] == 'failed':
+            failed.add(result['output'])
+        elif pending[result['output']][1] is not None:
+            rc.store(pending[result['output']][1], result['output'])
+    return failed
+
+
+def write_responses(results, output_sqlite, responses=oup.RESPONSES):
+    '''
+    Calculates the responses Dakota requested for a point from its
+    output database
+
+    Parameters
+    ----------
+    results: dakota.interfacing.Results
+        results of the point, the responses are looked up by their
+        descriptors
+    output_sqlite: str
+        name of Cyclus SQLite output file of the point
+    responses: list of dicts
+        definitions of the responses, as in output_metrics.RESPONSES
+
+    Returns
+    -------
+    results: dakota.interfacing.Results
+        results with the function value of each response set
+    '''
+    definitions = {response['name']: response for response in responses}
+    session = oup.MetricsSession(output_sqlite)
+    for name in results.descriptors:
+        if name not in definitions:
+            raise ValueError('No definition for the response ' + name)
+        results[name].function = session.evaluate(definitions[name])
+    return results
+
+
+def run_batch(batch_params, batch_results, prepare, max_workers=None,
+              responses=oup.RESPONSES, remove_outputs=False,
+              executable=None):
+    '''
+    Evaluates a batch of Dakota parameter points and writes the results
+    file of the batch. Points whose simulation fails are reported to
+    Dakota as failed.
+
+    Parameters
+    ----------
+    batch_params: dakota.interfacing.BatchParameters
+        parameters of each point of the batch
+    batch_results: dakota.interfacing.BatchResults
+        results of each point of the batch
+    prepare: function
+        writes the Cyclus input of a point, takes the parameters of the
+        point and returns the names of the Cyclus xml input file and of
+        the SQLite output file
+    max_workers: int, optional
+        maximum number of simulations run at the same time, e.g. the
+        evaluation_concurrency of the Dakota input, read with
+        evaluation_concurrency. If None, one simulation is run per CPU.
+    responses: list of dicts
+        definitions of the responses, as in output_metrics.RESPONSES
+    remove_outputs: bool, optional
+        if True, the output databases and their cached tables are
+        removed once the results are written
+    executable: str, optional
+        Cyclus executable, cyclus_runner.CYCLUS if None
+
+    Returns
+    -------
+    batch_results: dakota.interfacing.BatchResults
+        results of each point of the batch
+    '''
+    jobs = [prepare(params) for params in batch_params]
+    failed = run_jobs(jobs, max_workers, executable)
+
+    for (input_xml, output_sqlite), results in zip(jobs, batch_results):
+        if output_sqlite in failed:
+            results.fail()
+        else:
+            write_responses(results, output_sqlite, responses)
+    batch_results.write()
+
+    if remove_outputs:
+        for output_sqlite in set(job[1] for job in jobs):
+            if os.path.exists(output_sqlite):
+                tc.invalidate(output_sqlite)
+                os.remove(output_sqlite)
+    return batch_results
@@ -0,0 +1,246 @@
+""" Incremental analysis of Cyclus output files that are still being
+written, e.g. to re-plot a long simulation while it runs.
+
+An IncrementalStore keeps the mass traded per timestep between each
+pair of prototypes and the power produced per timestep by each
+prototype. It records how far it has read each database (the last
+TransactionId and the last TimeSeriesPower row), so a refresh only
+reads the rows written since the previous one and extends the cached
+cumulative series from the earliest timestep they changed. When the
+SimId of the database changes, i.e. a new simulation was written to the
+same file, the store starts over.
+"""
+import collections
+import os
+import sqlite3 as lite
+import numpy as np
+
+_stores = {}
+
+
+def get_store(db_file):
+    """Gets the store of a database, creating it on first use
+
+    Parameters
+    ----------
+    db_file: str
+        name of the sqlite file
+
+    Returns
+    -------
+    store: IncrementalStore
+        store of the database, shared by every caller
+    """
+    path = os.path.abspath(db_file)
+    if path not in _stores:
+        _stores[path] = IncrementalStore(path)
+    return _stores[path]
+
+
+class IncrementalStore():
+    """Per timestep mass flows and power of a Cyclus output file, read
+    incrementally
+
+    Parameters
+    ----------
+    db_file: str
+        name of the sqlite file
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.reset()
+
+    def reset(self):
+        """Drops everything read from the database"""
+        self.sim_id = None
+        self.duration = 0
+        self.transaction_id = 0
+        self.power_row = 0
+        self.time = -1
+        self.flux = collections.defaultdict(self._zeros)
+        self.power = collections.defaultdict(self._zeros)
+        self._changes = []
+        self._cumulative = {}
+
+    def _zeros(self):
+        return np.zeros(self.duration)
+
+    @property
+    def high_water_mark(self):
+        """dict: SimId, last TransactionId, last TimeSeriesPower row and
+        last timestep read from the database"""
+        return {'SimId': self.sim_id,
+                'TransactionId': self.transaction_id,
+                'PowerRow': self.power_row,
+                'Time': self.time}
+
+    def refresh(self):
+        """Reads the rows written to the database since the last refresh.
+        Rows whose resource or agents are not in the database yet are
+        left for the next refresh.
+
+        Returns
+        -------
+        rows: int
+            number of (time, commodity, sender, receiver) and
+            (time, prototype) groups read
+        """
+        con = lite.connect(self.db_file)
+        try:
+            info = con.execute('SELECT SimId, Duration FROM Info').fetchone()
+            if info is None:
+                return 0
+            if info[0] != self.sim_id:
+                self.reset()
+                self.sim_id, self.duration = info
+            earliest = self.duration
+            flux = self._read_transactions(con)
+            power = self._read_power(con)
+        finally:
+            con.close()
+
+        for rows, series in ((flux, self.flux), (power, self.power)):
+            for row in rows:
+                time, key, value = int(row[0]), tuple(row[1:-1]), row[-1]
+                if 0 <= time < self.duration:
+                    series[key][time] += value
+                    earliest = min(earliest, time)
+                self.time = max(self.time, time)
+        self._changes.append(earliest)
+        return len(flux) + len(power)
+
+    def _read_transactions(self, con):
+        joins = (' FROM transactions '
+                 'LEFT JOIN resources '
+                 'ON resources.resourceid = transactions.resourceid '
+                 'LEFT JOIN agententry AS sender '
+                 'ON sender.agentid = transactions.senderid '
+                 'LEFT JOIN agententry AS receiver '
+                 'ON receiver.agentid = transactions.receiverid '
+                 'WHERE transactions.transactionid > ?')
+        incomplete = con.execute(
+            'SELECT min(transactions.transactionid)' + joins +
+            ' AND (resources.resourceid IS NULL OR sender.agentid IS NULL'
+            ' OR receiver.agentid IS NULL)', [self.transaction_id]).fetchone()
+        stop = con.execute(
+            'SELECT max(transactionid) FROM transactions').fetchone()[0]
+        if incomplete[0] is not None:
+            stop = incomplete[0] - 1
+        if stop is None or stop <= self.transaction_id:
+            return []
+        rows = con.execute(
+            'SELECT transactions.time, commodity, sender.prototype, '
+            'receiver.prototype, sum(quantity)' + joins +
+            ' AND transactions.transactionid <= ? GROUP BY transactions.time, '
+            'commodity, sender.prototype, receiver.prototype',
+            [self.transaction_id, stop]).fetchall()
+        self.transaction_id = stop
+        return rows
+
+    def _read_power(self, con):
+        joins = (' FROM timeseriespower LEFT JOIN agententry '
+                 'ON agententry.agentid = timeseriespower.agentid '
+                 'WHERE timeseriespower.rowid > ?')
+        try:
+            incomplete = con.execute(
+                'SELECT min(timeseriespower.rowid)' + joins +
+                ' AND agententry.agentid IS NULL',
+                [self.power_row]).fetchone()
+        except lite.OperationalError:
+            # no reactor has reported power yet
+            return []
+        stop = con.execute(
+            'SELECT max(rowid) FROM timeseriespower').fetchone()[0]
+        if incomplete[0] is not None:
+            stop = incomplete[0] - 1
+        if stop is None or stop <= self.power_row:
+            return []
+        rows = con.execute(
+            'SELECT time, prototype, sum(value)' + joins +
+            ' AND timeseriespower.rowid <= ? GROUP BY time, prototype',
+            [self.power_row, stop]).fetchall()
+        self.power_row = stop
+        return rows
+
+    def _series(self, name, select, cache_key, is_cum, scale):
+        """Sums the selected series and, if is_cum, extends the cached
+        cumulative sum from the earliest timestep changed since it was
+        computed"""
+        monthly = np.zeros(self.duration)
+        for key, values in getattr(self, name).items():
+            if select(key):
+                monthly += values
+        monthly *= scale
+        if not is_cum:
+            return monthly
+
+        cache_key = (name, cache_key, scale)
+        cumulative, seen = self._cumulative.get(cache_key, (None, 0))
+        if cumulative is None or len(cumulative) != self.duration:
+            cumulative, seen = np.zeros(self.duration), 0
+            start = 0
+        else:
+            start = min(self._changes[seen:], default=self.duration)
+        if start < self.duration:
+            # the sum continues from the previous timestep, as np.cumsum
+            # over the whole series would
+            offset = cumulative[start - 1:start] if start > 0 else []
+            cumulative[start:] = np.cumsum(
+                np.concatenate((offset, monthly[start:])))[len(offset):]
+        self._cumulative[cache_key] = (cumulative, len(self._changes))
+        return cumulative.copy()
+
+    def commodity_flux(self, commodity, senders=None, receivers=None,
+                       is_cum=True, kg_to_tons=True):
+        """Returns the mass of a commodity traded in each timestep
+
+        Parameters
+        ----------
+        commodity: str
+            name of the commodity
+        senders: list, optional
+            prototypes sending the commodity, any if None
+        receivers: list, optional
+            prototypes receiving the commodity, any if None
+        is_cum: bool
+            gets cumulative timeseries if True, monthly value if False
+        kg_to_tons: bool
+            if True, the timeseries has units of tons
+            if False, the timeseries has units of kilograms
+
+        Returns
+        -------
+        timeseries: numpy array
+            mass traded at (or up to) each timestep
+        """
+        senders = None if senders is None else frozenset(senders)
+        receivers = None if receivers is None else frozenset(receivers)
+
+        def select(key):
+            return (key[0] == commodity and
+                    (senders is None or key[1] in senders) and
+                    (receivers is None or key[2] in receivers))
+        return self._series('flux', select, (commodity, senders, receivers),
+                            is_cum, 0.001 if kg_to_tons else 1.0)
+
+    def power_timeseries(self, prototypes=None, is_cum=False):
+        """Returns the power produced in each timestep
+
+        Parameters
+        ----------
+        prototypes: list, optional
+            reactor prototypes, any if None
+        is_cum: bool
+            gets cumulative timeseries if True, monthly value if False
+
+        Returns
+        -------
+        timeseries: numpy array
+            power produced at (or up to) each timestep
+        """
+        prototypes = None if prototypes is None else frozenset(prototypes)
+
+        def select(key):
+            return prototypes is None or key[0] in prototypes
+        return self._series('power', select, prototypes, is_cum, 1.0)
@@ -0,0 +1,348 @@
+'''
+Opt-in profiling of the public functions of the metric scripts. Each
+call records its wall time, the number of rows read from SQLite through
+the sqlite3 module, and its peak memory allocation, all including the
+functions it calls, which are recorded as its children, e.g.
+get_all_results -> MetricsSession.swu -> MetricsSession.transactions.
+
+Profiling is turned on with the profile context manager:
+
+    with instrumentation.profile() as report:
+        oup.get_all_results(results, output_sqlite)
+    print(report.table())
+
+or for a whole process, e.g. a Dakota evaluation, by setting the
+environment variable TRANSITION_PROFILE to the name of a JSON lines file
+the calls are appended to, or to 1 to print a table when the process
+exits.
+
+The functions are only wrapped while profiling is on. Otherwise the
+modules hold their original functions, so there is no overhead.
+Generator functions are not wrapped.
+'''
+import atexit
+import functools
+import inspect
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+ENVIRONMENT_VARIABLE = 'TRANSITION_PROFILE'
+MODULES = ['analysis', 'output_metrics', 'transition_metrics',
+           'create_AR_DeployInst']
+
+_reports = []
+_originals = {}
+_calls = [0]
+_rows = [0]
+_local = threading.local()
+_connect = sqlite3.connect
+_started_tracemalloc = [False]
+
+
+class Report():
+    '''
+    Calls recorded while profiling, in the order they returned
+
+    Parameters
+    ----------
+    output: str, optional
+        name of a JSON lines file each call is appended to
+    '''
+
+    def __init__(self, output=None):
+        self.output = output
+        self.records = []
+
+    def add(self, record):
+        '''
+        Adds a call to the report
+
+        Parameters
+        ----------
+        record: dict
+            call id, parent call id, depth, function name, wall time (s),
+            rows read, and peak memory (bytes) of the call
+        '''
+        self.records.append(record)
+        if self.output is not None:
+            with open(self.output, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+    def table(self):
+        '''
+        Formats the calls as a table, in the order they were made, with
+        the functions called indented under their caller
+
+        Returns
+        -------
+        table: str
+            one line per call
+        '''
+        lines = ['%-60s %10s %10s %12s' % ('function', 'time (s)', 'rows',
+                                           'peak (MB)')]
+        for record in sorted(self.records, key=lambda x: x['call']):
+            name = '  ' * record['depth'] + record['function']
+            peak = record['peak_memory']
+            lines.append('%-60s %10.4f %10d %12s' % (
+                name, record['wall_time'], record['rows'],
+                '-' if peak is None else '%.3f' % (peak / 1e6)))
+        return '\n'.join(lines)
+
+
+class _CountingCursor(sqlite3.Cursor):
+    '''
+    Cursor counting the rows it returns
+    '''
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            _rows[0] += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = super().fetchmany(*args, **kwargs)
+        _rows[0] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        _rows[0] += len(rows)
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        _rows[0] += 1
+        return row
+
+
+class _CountingConnection(sqlite3.Connection):
+    '''
+    Connection whose cursors count the rows they return
+    '''
+
+    def cursor(self, factory=_CountingCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+
+def _counting_connect(*args, **kwargs):
+    kwargs.setdefault('factory', _CountingConnection)
+    return _connect(*args, **kwargs)
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def _wrap(function, name):
+    '''
+    Wraps a function so that its calls are added to the active reports
+    '''
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _reports:
+            return function(*args, **kwargs)
+        stack = _stack()
+        _calls[0] += 1
+        frame = {'call': _calls[0],
+                 'parent': stack[-1]['call'] if stack else None,
+                 'depth': len(stack), 'function': name}
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            for caller in stack:
+                caller['peak'] = max(caller['peak'], peak)
+            tracemalloc.reset_peak()
+            frame['memory'] = frame['peak'] = current
+        stack.append(frame)
+        rows = _rows[0]
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            wall_time = time.perf_counter() - start
+            stack.pop()
+            peak_memory = None
+            if 'memory' in frame:
+                peak = tracemalloc.get_traced_memory()[1]
+                for caller in stack + [frame]:
+                    caller['peak'] = max(caller['peak'], peak)
+                peak_memory = frame['peak'] - frame['memory']
+            record = {'call': frame['call'], 'parent': frame['parent'],
+                      'depth': frame['depth'], 'function': name,
+                      'wall_time': wall_time, 'rows': _rows[0] - rows,
+                      'peak_memory': peak_memory}
+            for report in list(_reports):
+                report.add(record)
+    wrapper.__instrumented__ = function
+    return wrapper
+
+
+def _public_functions(module):
+    '''
+    Lists the public functions of a module and the public methods and
+    properties of its classes, as (owner, attribute, function, name)
+    '''
+    found = []
+    for attribute, value in vars(module).items():
+        if attribute.startswith('_') or \
+                getattr(value, '__module__', None) != module.__name__:
+            continue
+        short = module.__name__ + '.' + attribute
+        if inspect.isfunction(value):
+            found.append((module, attribute, value, short))
+        elif inspect.isclass(value):
+            for method, member in vars(value).items():
+                if method.startswith('_') and method != '__init__':
+                    continue
+                name = short + '.' + method
+                if inspect.isfunction(member):
+                    found.append((value, method, member, name))
+                elif isinstance(member, property) and member.fget:
+                    found.append((value, method, member, name))
+    return found
+
+
+def instrument(module):
+    '''
+    Wraps the public functions of a module, once
+
+    Parameters
+    ----------
+    module: module
+        module to instrument
+    '''
+    for owner, attribute, value, name in _public_functions(module):
+        if (owner, attribute) in _originals:
+            continue
+        if isinstance(value, property):
+            if inspect.isgeneratorfunction(value.fget):
+                continue
+            wrapped = property(_wrap(value.fget, name), value.fset,
+                               value.fdel, value.__doc__)
+        elif inspect.isgeneratorfunction(value):
+            continue
+        else:
+            wrapped = _wrap(value, name)
+        _originals[(owner, attribute)] = value
+        setattr(owner, attribute, wrapped)
+
+
+def restore():
+    '''
+    Puts the original functions back in the instrumented modules
+    '''
+    for (owner, attribute), value in _originals.items():
+        setattr(owner, attribute, value)
+    _originals.clear()
+
+
+def start(report, memory=True):
+    '''
+    Starts recording calls to a report
+
+    Parameters
+    ----------
+    report: Report
+        report the calls are added to
+    memory: bool
+        if True, the peak memory of the calls is recorded with
+        tracemalloc, which slows them down
+    '''
+    if not _reports:
+        sqlite3.connect = _counting_connect
+    _reports.append(report)
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracemalloc[0] = True
+
+
+def stop(report):
+    '''
+    Stops recording calls to a report. When no report is left, the
+    original functions are put back.
+
+    Parameters
+    ----------
+    report: Report
+        report the calls were added to
+    '''
+    _reports.remove(report)
+    if not _reports:
+        sqlite3.connect = _connect
+        restore()
+        if _started_tracemalloc[0]:
+            tracemalloc.stop()
+            _started_tracemalloc[0] = False
+
+
+@contextmanager
+def profile(modules=None, output=None, memory=True):
+    '''
+    Records the calls to the public functions of the metric scripts
+    made inside the with block
+
+    Parameters
+    ----------
+    modules: list of modules, optional
+        modules to instrument, the importable ones of MODULES if None
+    output: str, optional
+        name of a JSON lines file the calls are appended to
+    memory: bool
+        if True, the peak memory of the calls is recorded
+
+    Yields
+    ------
+    report: Report
+        calls recorded
+    '''
+    if modules is None:
+        modules = []
+        for name in MODULES:
+            try:
+                modules.append(__import__(name))
+            except ImportError:
+                continue
+    report = Report(output)
+    start(report, memory)
+    try:
+        for module in modules:
+            instrument(module)
+        yield report
+    finally:
+        stop(report)
+
+
+def instrument_from_environment(module_name):
+    '''
+    Instruments a module if the TRANSITION_PROFILE environment variable
+    is set. The first module instrumented starts a report for the rest
+    of the process. Called by the metric scripts once they are defined.
+
+    Parameters
+    ----------
+    module_name: str
+        name of the module, __name__ in the module
+    '''
+    output = os.environ.get(ENVIRONMENT_VARIABLE)
+    if not output or output == '0':
+        return
+    if not _reports:
+        report = Report(None if output == '1' else output)
+        start(report)
+        if output == '1':
+            atexit.register(lambda: print(report.table(), file=sys.stderr))
+    instrument(sys.modules[module_name])
@@ -1,8 +1,8 @@
-from fuzzywuzzy import fuzz
 import numpy as np
 import pandas as pd
 import sqlite3 as sql
 import sys
+import name_matching as nm
 
 if len(sys.argv) < 3:
     print('Usage: python merge_coordinates.py [pris_link] [webscrape_link]')
@@ -152,22 +152,15 @@ def merge_coordinates(pris_link, scrape_link):
     """
     others = edge_cases()
     pris = import_pris(pris_link)
-    coords = import_webscrape_data(scrape_link)
-    for web in coords:
-        for idx, prs in pris.iterrows():
-            webscrape_name = sanitize_webscrape_name(web['name'])
-            pris_name = prs[1].lower()
-            if fuzz.ratio(webscrape_name, pris_name) > 64:
-                prs[13] = web['lat']
-                prs[14] = web['long']
-            else:
-                for other in others.keys():
-                    edge_case_key = other.lower()
-                    edge_case_value = others[other].lower()
-                    if (fuzz.ratio(pris_name, edge_case_key) > 80 and
-                            fuzz.ratio(webscrape_name, edge_case_value) > 75):
-                        prs[13] = web['lat']
-                        prs[14] = web['long']
+    coords = import_webscrape_data(scrape_link).fetchall()
+    webscrape_names = [sanitize_webscrape_name(web['name']) for web in coords]
+    pris_names = [name.lower() for name in pris.iloc[:, 1]]
+    match = nm.last_match(pris_names, webscrape_names, others, 64)
+    found = match >= 0
+    lat = np.array([web['lat'] for web in coords], dtype=object)
+    long = np.array([web['long'] for web in coords], dtype=object)
+    pris.loc[found, 'Latitude'] = lat[match[found]]
+    pris.loc[found, 'Longitude'] = long[match[found]]
     return pris
 
 
@@ -0,0 +1,176 @@
+""" Matches reactor names from two sources with fuzzywuzzy, as done by
+merge_coordinates.py and predicting_the_past_import.py to find the
+coordinates of PRIS reactors in the webscrape database.
+
+Instead of scoring every pair of names, each name is sanitized once and
+described by the counts of its characters. The number of characters two
+names have in common bounds fuzz.ratio from above, so the pairs that
+cannot pass the threshold are discarded with a few array operations and
+only the remaining candidates are scored. The matches found are the
+same as when every pair is scored.
+"""
+from fuzzywuzzy import fuzz
+import numpy as np
+
+
+def char_counts(names, alphabet):
+    """ Counts the characters of each name
+
+    Parameters
+    ----------
+    names: list of strs
+        names to count the characters of
+    alphabet: dict
+        column of each character in the counts
+
+    Returns
+    -------
+    counts: np.ndarray
+        number of times each character appears in each name, with one
+        row per name and one column per character of the alphabet
+    """
+    counts = np.zeros((len(names), len(alphabet)), dtype=np.int32)
+    for row, name in enumerate(names):
+        for char in name:
+            counts[row, alphabet[char]] += 1
+    return counts
+
+
+def ratio_bound(left, right, chunk_size=256):
+    """ Bounds fuzz.ratio for every pair of names from above. A pair of
+    names with la and lb characters, c of which are in common, has at
+    most c matching characters, so its ratio is at most
+    100 * 2 * c / (la + lb).
+
+    Parameters
+    ----------
+    left: list of strs
+        first names of the pairs
+    right: list of strs
+        second names of the pairs
+    chunk_size: int
+        number of left names compared at the same time, to limit memory
+
+    Returns
+    -------
+    bound: np.ndarray
+        upper bound of the ratio of each pair, with one row per left name
+        and one column per right name. Pairs with one empty name are 0
+        and pairs of empty names are 100, as returned by fuzz.ratio.
+    """
+    alphabet = {char: column for column, char in
+                enumerate(sorted(set(''.join(left) + ''.join(right))))}
+    left_counts = char_counts(left, alphabet)
+    right_counts = char_counts(right, alphabet)
+    left_lengths = left_counts.sum(axis=1)
+    right_lengths = right_counts.sum(axis=1)
+
+    bound = np.zeros((len(left), len(right)))
+    for start in range(0, len(left), chunk_size):
+        stop = start + chunk_size
+        common = np.minimum(left_counts[start:stop, None, :],
+                            right_counts[None, :, :]).sum(axis=2)
+        total = left_lengths[start:stop, None] + right_lengths[None, :]
+        np.divide(200 * common, total, out=bound[start:stop],
+                  where=common > 0)
+        bound[start:stop][total == 0] = 100
+    return bound
+
+
+def ratio_above(left, right, threshold):
+    """ Finds the pairs of names whose fuzz.ratio is above a threshold,
+    scoring only the pairs that ratio_bound does not rule out
+
+    Parameters
+    ----------
+    left: list of strs
+        first names of the pairs
+    right: list of strs
+        second names of the pairs
+    threshold: int
+        the ratio of a pair has to be greater than this value
+
+    Returns
+    -------
+    above: np.ndarray
+        True for each pair whose ratio is above the threshold, with one
+        row per left name and one column per right name
+    """
+    above = np.zeros((len(left), len(right)), dtype=bool)
+    # the bound is compared to threshold - 1 so that the rounding done by
+    # fuzz.ratio cannot push a discarded pair over the threshold
+    rows, columns = np.nonzero(ratio_bound(left, right) > threshold - 1)
+    for row, column in zip(rows, columns):
+        above[row, column] = fuzz.ratio(left[row], right[column]) > threshold
+    return above
+
+
+def unique_ratio_above(left, right, threshold):
+    """ Same as ratio_above, but each distinct name is only scored once
+
+    Parameters
+    ----------
+    left: list of strs
+        first names of the pairs
+    right: list of strs
+        second names of the pairs
+    threshold: int
+        the ratio of a pair has to be greater than this value
+
+    Returns
+    -------
+    above: np.ndarray
+        True for each pair whose ratio is above the threshold, with one
+        row per left name and one column per right name
+    """
+    unique_left, left_index = np.unique(np.array(left, dtype=object),
+                                        return_inverse=True)
+    unique_right, right_index = np.unique(np.array(right, dtype=object),
+                                          return_inverse=True)
+    above = ratio_above(list(unique_left), list(unique_right), threshold)
+    return above[left_index][:, right_index]
+
+
+def last_match(pris_names, web_names, edge_cases, threshold,
+               edge_thresholds=(80, 75)):
+    """ Matches sanitized PRIS reactor names to sanitized webscrape plant
+    names. A pair matches if its fuzz.ratio is above the threshold, or
+    if the PRIS name is close to the key of an edge case and the
+    webscrape name is close to its value. When a PRIS name matches more
+    than one webscrape name, the last one is kept, as the webscrape
+    records were applied in order.
+
+    Parameters
+    ----------
+    pris_names: list of strs
+        sanitized PRIS reactor names
+    web_names: list of strs
+        sanitized webscrape plant names, in the order of the records
+    edge_cases: dict
+        edge cases with "key=pris_reactor_name, and
+        value=webscrape_plant_name"
+    threshold: int
+        ratio above which a PRIS name and a webscrape name match
+    edge_thresholds: tuple of ints
+        ratios above which a PRIS name matches the key of an edge case
+        and a webscrape name matches its value
+
+    Returns
+    -------
+    match: np.ndarray
+        index of the matching webscrape name for each PRIS name, -1 if
+        there is none
+    """
+    if len(pris_names) == 0 or len(web_names) == 0:
+        return np.full(len(pris_names), -1)
+    keys = [key.lower() for key in edge_cases.keys()]
+    values = [value.lower() for value in edge_cases.values()]
+
+    matches = unique_ratio_above(web_names, pris_names, threshold)
+    if keys:
+        pris_edges = unique_ratio_above(pris_names, keys, edge_thresholds[0])
+        web_edges = unique_ratio_above(web_names, values, edge_thresholds[1])
+        matches |= (web_edges.astype(int) @ pris_edges.T.astype(int)) > 0
+
+    last = len(web_names) - 1 - np.argmax(matches[::-1], axis=0)
+    return np.where(matches.any(axis=0), last, -1)
@@ -3,9 +3,43 @@ import numpy as np
 import pandas as pd
 import sqlite3
 import os
+import subprocess
 
 import dataframe_analysis as dfa
+import table_cache as tc
 import create_AR_DeployInst as cdi
+import cyclus_runner as cr
+import run_cache as rc
+import instrumentation as ins
+
+# U-235 assay of the fuel of each advanced reactor and of the
+# enrichment feed and tails streams
+ASSAYS = {'MMR': 0.1975, 'Xe-100': 0.155,
+          'VOYGR': 0.0409, 'feed': 0.00711, 'tails': 0.002}
+
+# responses returned to Dakota by get_all_results
+RESPONSES = [
+    {'name': 'enr_u', 'metric': 'enriched_u',
+     'prototypes': ['Xe-100', 'MMR', 'VOYGR'], 'commodity': 'fresh_uox',
+     'transition_start': 721},
+    {'name': 'haleu', 'metric': 'enriched_u',
+     'prototypes': ['Xe-100', 'MMR'], 'commodity': 'fresh_uox',
+     'transition_start': 721},
+    {'name': 'swu', 'metric': 'swu',
+     'prototypes': ['Xe-100', 'MMR', 'VOYGR'], 'commodity': 'fresh_uox',
+     'assays': ASSAYS, 'transition_start': 721},
+    {'name': 'haleu_swu', 'metric': 'swu',
+     'prototypes': ['Xe-100', 'MMR'], 'commodity': 'fresh_uox',
+     'assays': ASSAYS, 'transition_start': 721},
+    {'name': 'waste', 'metric': 'waste',
+     'prototypes': ['Xe-100', 'MMR', 'VOYGR'],
+     'commodity': {'MMR': 'spent_MMR_haleu',
+                   'Xe-100': 'spent_xe100_haleu',
+                   'VOYGR': 'spent_smr_fuel'},
+     'transition_start': 721},
+    {'name': 'feed', 'metric': 'feed',
+     'prototypes': ['Xe-100', 'MMR'], 'commodity': 'fresh_uox',
+     'assays': ASSAYS, 'transition_start': 721}]
 
 
 def merge_and_fillna_col(left, right, lcol, rcol, how='left', on=None):
@@ -47,7 +81,8 @@ def get_table_from_output(db_file, table_name):
     it as a pandas dataframe. The dataframe for the 'Resources'
     uses only select columns from that table because of memory
     issues experienced, and only the columns called here were
-    used for later functions.
+    used for later functions. Tables are read through table_cache,
+    so each table of a database is only read from SQLite once.
 
     Parameters
     ----------
@@ -61,13 +96,7 @@ def get_table_from_output(db_file, table_name):
     table_df: DataFrame
         requested table from database
     '''
-    connect = sqlite3.connect(db_file)
-    if table_name == 'Resources':
-        table_df = pd.read_sql_query(
-            'SELECT SimId, ResourceId, ObjId, TimeCreated, Quantity, Units FROM Resources',
-            connect)
-    else:
-        table_df = pd.read_sql_query('SELECT * FROM ' + table_name, connect)
+    table_df = tc.get_table(db_file, table_name).copy()
     return table_df
 
 
@@ -219,11 +248,110 @@ def get_multiple_prototype_transactions(db_file, prototypes, commodity):
         The mass sent to each prototype is in a separate column, with
         the name of the column matching the prototype name.
     '''
-    transactions = add_receiver_prototype(db_file)
-    commodity_transactions = pd.DataFrame(columns=prototypes)
-    for prototype in prototypes:
-        commodity_transactions[prototype] = dfa.commodity_to_prototype(
-            transactions, commodity, prototype)['Quantity']
+    return MetricsSession(db_file).prototype_transactions(prototypes,
+                                                          commodity)
+
+
+def stream_prototype_transactions(db_file, prototypes, commodity,
+                                  receiver=True, chunksize=10000):
+    '''
+    Streams the mass of a commodity sent to (or from) the specified
+    prototypes in each time step. The join of the Transactions,
+    Resources and AgentEntry tables, the commodity and prototype
+    filters, and the sum over each time step are done in SQLite, and
+    the result is read in chunks of chunksize rows, so the memory used
+    depends on chunksize instead of the size of the database.
+
+    Parameters
+    ----------
+    db_file: str
+        name of database file
+    prototypes: list of strs
+        names of prototypes to get transactions to or from
+    commodity: str
+        name of commodity
+    receiver: bool, optional
+        if True, gets the transactions sent to the prototypes,
+        if False, the transactions sent from the prototypes
+    chunksize: int, optional
+        number of rows read from the database at a time
+
+    Yields
+    ------
+    chunk: DataFrame
+        Time, Prototype, and summed Quantity of the transactions,
+        in ascending order of Time
+    '''
+    agent_column = 'ReceiverId' if receiver else 'SenderId'
+    query = ('SELECT Transactions.Time AS Time, '
+             'AgentEntry.Prototype AS Prototype, '
+             'SUM(Resources.Quantity) AS Quantity '
+             'FROM Transactions INNER JOIN Resources '
+             'ON Resources.ResourceId = Transactions.ResourceId '
+             'INNER JOIN AgentEntry '
+             'ON AgentEntry.SimId = Transactions.SimId '
+             'AND AgentEntry.AgentId = Transactions.' + agent_column +
+             ' WHERE Transactions.Commodity = ? '
+             'AND AgentEntry.Prototype IN (' +
+             ', '.join('?' * len(prototypes)) + ') '
+             'GROUP BY Transactions.Time, AgentEntry.Prototype '
+             'ORDER BY Transactions.Time')
+    connect = sqlite3.connect(db_file)
+    try:
+        for chunk in pd.read_sql_query(query, connect,
+                                       params=[commodity] + list(prototypes),
+                                       chunksize=chunksize):
+            yield chunk
+    finally:
+        connect.close()
+
+
+def get_streamed_prototype_transactions(db_file, prototypes, commodity,
+                                        receiver=True, chunksize=10000,
+                                        index_stop=1752):
+    '''
+    Gets the transactions of the given commodity sent to (or from) the
+    specified prototypes in each time step, like
+    get_multiple_prototype_transactions, without loading the
+    Transactions and Resources tables into memory. See
+    stream_prototype_transactions.
+
+    Parameters
+    ----------
+    db_file: str
+        name of database file
+    prototypes: list of strs
+        names of prototypes to get transactions to or from
+    commodity: str
+        name of commodity
+    receiver: bool, optional
+        if True, gets the transactions sent to the prototypes,
+        if False, the transactions sent from the prototypes
+    chunksize: int, optional
+        number of rows read from the database at a time
+    index_stop: int, optional
+        number of time steps included, as in
+        dataframe_analysis.sum_and_add_missing_time
+
+    Returns
+    -------
+    commodity_transactions: DataFrame
+        DataFrame of transactions for commodity to specific prototypes.
+        The mass sent to each prototype is in a separate column, with
+        the name of the column matching the prototype name.
+    '''
+    columns = {prototype: i for i, prototype in enumerate(prototypes)}
+    quantities = np.zeros((index_stop, len(prototypes)))
+    for chunk in stream_prototype_transactions(db_file, prototypes,
+                                               commodity, receiver,
+                                               chunksize):
+        chunk = chunk.loc[(chunk['Time'] >= 0) &
+                          (chunk['Time'] < index_stop)]
+        np.add.at(quantities,
+                  (chunk['Time'].to_numpy(dtype=int),
+                   chunk['Prototype'].map(columns).to_numpy(dtype=int)),
+                  chunk['Quantity'].to_numpy(dtype=float))
+    commodity_transactions = pd.DataFrame(quantities, columns=prototypes)
     return commodity_transactions
 
 
@@ -249,16 +377,11 @@ def get_enriched_u_mass(db_file, prototypes, transition_start):
             the cumulative mass of enriched uranium sent to specified
             prototypes starting at the transition start time
     '''
-    enriched_u_df = get_multiple_prototype_transactions(
-        db_file, prototypes, 'fresh_uox')
-    total_adv_rx_enriched_u = 0
-    for prototype in prototypes:
-        total_adv_rx_enriched_u += enriched_u_df[prototype]
-    cumulative_u = total_adv_rx_enriched_u[int(transition_start):].cumsum()
-    return cumulative_u.loc[cumulative_u.index[-1]]
+    return MetricsSession(db_file).enriched_u_mass(prototypes,
+                                                   transition_start)
 
 
-def calculate_feed(db_file, prototypes, transition_start):
+def calculate_feed(db_file, prototypes, transition_start, assays=ASSAYS):
     '''
     Calculate the cumulative feed uranium needed to create enriched
     uranium for the specified prototypes
@@ -271,6 +394,10 @@ def calculate_feed(db_file, prototypes, transition_start):
         names of prototypes to consider in calculation
     transition_start: int
         time step the modeled transition begins at
+    assays: dict, optional
+        dictionary of the prototype names and the uranium assay for
+        the fuel for the prototype, including the 'tails' and 'feed'
+        streams. Defaults to ASSAYS.
 
     Returns
     -------
@@ -278,24 +405,11 @@ def calculate_feed(db_file, prototypes, transition_start):
         The total feed uranium required for the prototypes,
         starting at the transition start time.
     '''
-    assays = {'MMR': 0.1975, 'Xe-100': 0.155,
-              'VOYGR': 0.0409, 'feed': 0.00711, 'tails': 0.002}
-    enriched_u_mass = get_multiple_prototype_transactions(
-        db_file, prototypes, 'fresh_uox')
-    feed = 0
-    for prototype in prototypes:
-        tails = dfa.calculate_tails(
-            enriched_u_mass[prototype],
-            assays[prototype],
-            assays['tails'],
-            assays['feed'])
-        prototype_feed = dfa.calculate_feed(enriched_u_mass[prototype], tails)
-        feed += prototype_feed
-    cumulative_feed = feed[int(transition_start):].cumsum()
-    return cumulative_feed.loc[cumulative_feed.index[-1]]
-
-
-def calculate_swu(db_file, prototypes, transition_start):
+    return MetricsSession(db_file).feed(prototypes, transition_start,
+                                        assays=assays)
+
+
+def calculate_swu(db_file, prototypes, transition_start, assays=ASSAYS):
     '''
     Calculates the cumulative amount of SWU capacity required to
     create the enriched uranium in the simulation.
@@ -308,12 +422,12 @@ def calculate_swu(db_file, prototypes, transition_start):
         names of prototypes to consider in calculation
     transition_start: int
         time step the modeled transition begins at
-    assays: dict
+    assays: dict, optional
         dictionary of the prototype names and the uranium assay for
         the fuel for the prototype, form of the dictionary is
         {prototype name(str):assay(float)}. This dictionary MUST
         contain the assays for the tails and feed streams, and be labeled
-        as 'tails' and 'feed'
+        as 'tails' and 'feed'. Defaults to ASSAYS.
 
     Returns
     -------
@@ -321,28 +435,8 @@ def calculate_swu(db_file, prototypes, transition_start):
         the average SWU capacity required for the simulation,
         starting at the transition start time
     '''
-    assays = {'MMR': 0.1975, 'Xe-100': 0.155,
-              'VOYGR': 0.0409, 'feed': 0.00711, 'tails': 0.002}
-    enriched_u_mass = get_multiple_prototype_transactions(
-        db_file, prototypes, 'fresh_uox')
-    swu = 0
-    for prototype in prototypes:
-        tails = dfa.calculate_tails(
-            enriched_u_mass[prototype],
-            assays[prototype],
-            assays['tails'],
-            assays['feed'])
-        feed = dfa.calculate_feed(enriched_u_mass[prototype], tails)
-        prototype_swu = dfa.calculate_SWU(
-            enriched_u_mass[prototype],
-            assays[prototype],
-            tails,
-            assays['tails'],
-            feed,
-            assays['feed'])
-        swu += prototype_swu
-    cumulative_swu = swu[int(transition_start):].cumsum()
-    return cumulative_swu.loc[cumulative_swu.index[-1]]
+    return MetricsSession(db_file).swu(prototypes, transition_start,
+                                       assays=assays)
 
 
 def get_waste_discharged(db_file, prototypes, transition_start, commodities):
@@ -368,14 +462,9 @@ def get_waste_discharged(db_file, prototypes, transition_start, commodities):
     waste_discharged: float
         cumulative waste discharged from all specified prototypes
     '''
-    transactions = add_sender_prototype(db_file)
-    waste = 0
-    for prototype in prototypes:
-        waste += dfa.commodity_from_prototype(transactions,
-                                              commodities[prototype],
-                                              prototype)['Quantity']
-    waste_discharged = waste[int(transition_start):].cumsum()
-    return waste_discharged.loc[waste_discharged.index[-1]]
+    return MetricsSession(db_file).waste_discharged(prototypes,
+                                                    transition_start,
+                                                    commodities)
 
 
 def get_annual_electricity_table(db_file):
@@ -497,14 +586,258 @@ def get_lwr_energy(db_file, advanced_rx):
     lwr_energy['Energy'] = lwr_energy['Energy'] / 1000
     return lwr_energy
 
-def get_all_results(results, output_sqlite):
+class MetricsSession():
+    '''
+    Calculates metrics of a single Cyclus output file. The transactions
+    are merged with the resources and annotated with the prototypes of
+    the sender and receiver once, and the transactions of each
+    prototype are kept, so any number of metrics can be calculated
+    without repeating the merges.
+
+    If chunksize is given, the transactions of each prototype are
+    instead streamed from the database with
+    get_streamed_prototype_transactions, and the merged DataFrame is
+    never created.
+
+    Parameters
+    ----------
+    db_file: str
+        name of database file
+    chunksize: int, optional
+        number of rows read from the database at a time in
+        streaming mode
+    '''
+
+    def __init__(self, db_file, chunksize=None):
+        self.db_file = db_file
+        self.chunksize = chunksize
+        self._transactions = None
+        self._prototype_quantities = {}
+
+    @property
+    def transactions(self):
+        '''
+        DataFrame of all transactions with the quantity of material
+        and the ReceiverPrototype and SenderPrototype names, in
+        ascending order of Time then TransactionId
+        '''
+        if self._transactions is None:
+            trans_resources = merge_transactions_resources(self.db_file)
+            agents = create_agents_table(self.db_file)
+            agents = agents[['SimId', 'AgentId', 'Prototype']]
+            transactions = pd.merge(
+                trans_resources,
+                agents.rename(columns={'AgentId': 'ReceiverId',
+                                       'Prototype': 'ReceiverPrototype'}),
+                on=['SimId', 'ReceiverId'])
+            transactions = pd.merge(
+                transactions,
+                agents.rename(columns={'AgentId': 'SenderId',
+                                       'Prototype': 'SenderPrototype'}),
+                on=['SimId', 'SenderId'])
+            self._transactions = transactions.sort_values(
+                by=['Time', 'TransactionId']).reset_index(drop=True)
+        return self._transactions
+
+    def prototype_quantity(self, commodity, prototype, receiver=True):
+        '''
+        Gets the mass of a commodity sent to or from a prototype in
+        each time step
+
+        Parameters
+        ----------
+        commodity: str
+            name of commodity
+        prototype: str
+            name of prototype
+        receiver: bool
+            if True, gets the transactions sent to the prototype,
+            if False, the transactions sent from the prototype
+
+        Returns
+        -------
+        quantity: Series
+            mass traded in each time step
+        '''
+        key = (commodity, prototype, receiver)
+        if key not in self._prototype_quantities and \
+                self.chunksize is not None:
+            streamed = get_streamed_prototype_transactions(
+                self.db_file, [prototype], commodity, receiver,
+                self.chunksize)
+            self._prototype_quantities[key] = \
+                streamed[prototype].rename('Quantity')
+        elif key not in self._prototype_quantities:
+            if receiver:
+                prototype_transactions = dfa.commodity_to_prototype(
+                    self.transactions, commodity, prototype)
+            else:
+                prototype_transactions = dfa.commodity_from_prototype(
+                    self.transactions, commodity, prototype)
+            self._prototype_quantities[key] = \
+                prototype_transactions['Quantity']
+        return self._prototype_quantities[key]
+
+    def prototype_transactions(self, prototypes, commodity):
+        '''
+        Gets the transactions of the given commodity sent to the
+        specified prototypes in each time step, as in
+        get_multiple_prototype_transactions
+
+        Parameters
+        ----------
+        prototypes: list of strs
+            names of prototypes to get transactions to
+        commodity: str
+            name of commodity
+
+        Returns
+        -------
+        commodity_transactions: DataFrame
+            mass sent to each prototype, in a column named after
+            the prototype
+        '''
+        commodity_transactions = pd.DataFrame(columns=prototypes)
+        for prototype in prototypes:
+            commodity_transactions[prototype] = self.prototype_quantity(
+                commodity, prototype)
+        return commodity_transactions
+
+    def enriched_u_mass(self, prototypes, transition_start,
+                        commodity='fresh_uox'):
+        '''
+        Calculates the cumulative mass of enriched uranium sent to
+        the prototypes from the start of the transition, as in
+        get_enriched_u_mass
+        '''
+        total_adv_rx_enriched_u = 0
+        for prototype in prototypes:
+            total_adv_rx_enriched_u += self.prototype_quantity(commodity,
+                                                               prototype)
+        cumulative_u = total_adv_rx_enriched_u[int(
+            transition_start):].cumsum()
+        return cumulative_u.loc[cumulative_u.index[-1]]
+
+    def feed(self, prototypes, transition_start, commodity='fresh_uox',
+             assays=ASSAYS):
+        '''
+        Calculates the cumulative feed uranium needed to create the
+        enriched uranium for the prototypes, as in calculate_feed
+        '''
+        feed = 0
+        for prototype in prototypes:
+            enriched_u_mass = self.prototype_quantity(commodity, prototype)
+            tails = dfa.calculate_tails(
+                enriched_u_mass,
+                assays[prototype],
+                assays['tails'],
+                assays['feed'])
+            feed += dfa.calculate_feed(enriched_u_mass, tails)
+        cumulative_feed = feed[int(transition_start):].cumsum()
+        return cumulative_feed.loc[cumulative_feed.index[-1]]
+
+    def swu(self, prototypes, transition_start, commodity='fresh_uox',
+            assays=ASSAYS):
+        '''
+        Calculates the cumulative SWU capacity required to create the
+        enriched uranium for the prototypes, as in calculate_swu
+        '''
+        swu = 0
+        for prototype in prototypes:
+            enriched_u_mass = self.prototype_quantity(commodity, prototype)
+            tails = dfa.calculate_tails(
+                enriched_u_mass,
+                assays[prototype],
+                assays['tails'],
+                assays['feed'])
+            feed = dfa.calculate_feed(enriched_u_mass, tails)
+            swu += dfa.calculate_SWU(
+                enriched_u_mass,
+                assays[prototype],
+                tails,
+                assays['tails'],
+                feed,
+                assays['feed'])
+        cumulative_swu = swu[int(transition_start):].cumsum()
+        return cumulative_swu.loc[cumulative_swu.index[-1]]
+
+    def waste_discharged(self, prototypes, transition_start, commodities):
+        '''
+        Calculates the cumulative mass of fuel discharged from the
+        prototypes, as in get_waste_discharged
+        '''
+        waste = 0
+        for prototype in prototypes:
+            waste += self.prototype_quantity(commodities[prototype],
+                                             prototype, receiver=False)
+        waste_discharged = waste[int(transition_start):].cumsum()
+        return waste_discharged.loc[waste_discharged.index[-1]]
+
+    def evaluate(self, response):
+        '''
+        Calculates the value of a response definition
+
+        Parameters
+        ----------
+        response: dict
+            definition of the response, with the keys 'metric'
+            ('enriched_u', 'feed', 'swu' or 'waste'), 'prototypes',
+            'commodity' and 'transition_start', and optionally
+            'assays'. For 'waste', 'commodity' is a dictionary of the
+            waste commodity of each prototype.
+
+        Returns
+        -------
+        value: float
+            value of the response
+        '''
+        metric = response['metric']
+        prototypes = response['prototypes']
+        start = response['transition_start']
+        assays = response.get('assays', ASSAYS)
+        if metric == 'enriched_u':
+            return self.enriched_u_mass(prototypes, start,
+                                        response['commodity'])
+        elif metric == 'feed':
+            return self.feed(prototypes, start, response['commodity'],
+                             assays)
+        elif metric == 'swu':
+            return self.swu(prototypes, start, response['commodity'],
+                            assays)
+        elif metric == 'waste':
+            return self.waste_discharged(prototypes, start,
+                                         response['commodity'])
+        raise ValueError('Unknown metric: ' + str(metric))
+
+    def evaluate_all(self, responses=RESPONSES):
+        '''
+        Calculates the values of multiple response definitions
+
+        Parameters
+        ----------
+        responses: list of dicts
+            response definitions, see evaluate. Each also has a 'name'.
+
+        Returns
+        -------
+        values: dict
+            value of each response, keyed by its name
+        '''
+        values = {}
+        for response in responses:
+            values[response['name']] = self.evaluate(response)
+        return values
+
+
+def get_all_results(results, output_sqlite, chunksize=None):
     '''
     Calls multiple functions in this script at the same time to get all
     metrics from the output files and return them to Dakota.
     Metrics include the total mass of enriched uranium, mass of
     HALEU, SWU capacity, SWU capacity to produce HALEU, feed mass to
     produce HALEU, and the total mass of spent nuclear fuel
-    discharged.
+    discharged, as defined in RESPONSES. All of them are calculated
+    from one MetricsSession, so the transactions are only merged once.
 
     Parameters
     ----------
@@ -512,6 +845,9 @@ def get_all_results(results, output_sqlite):
         results passed to Dakota
     output_sqlite: str
         file name for Cyclus output SQLite file
+    chunksize: int, optional
+        if given, the transactions are streamed from the database in
+        chunks of this many rows, see MetricsSession
 
     Returns
     -------
@@ -519,26 +855,9 @@ def get_all_results(results, output_sqlite):
         results passed to Dakota
     '''
 
-    results['enr_u'].function = get_enriched_u_mass(output_sqlite,
-                                                        ['Xe-100', 'MMR', 'VOYGR'],
-                                                        721)
-    results['haleu'].function = get_enriched_u_mass(output_sqlite,
-                                                        ['Xe-100', 'MMR'],
-                                                        721)
-    results['swu'].function = calculate_swu(
-        output_sqlite, ['Xe-100', 'MMR', 'VOYGR'], 721)
-    results['haleu_swu'].function = calculate_swu(
-        output_sqlite, ['Xe-100', 'MMR'], 721)
-    results['waste'].function = get_waste_discharged(output_sqlite,
-                                                         ['Xe-100', 'MMR', 'VOYGR'],
-                                                         721,
-                                                         {'MMR': 'spent_MMR_haleu',
-                                                          'Xe-100': 'spent_xe100_haleu',
-                                                          'VOYGR': 'spent_smr_fuel'}
-                                                         )
-    results['feed'].function = calculate_feed(output_sqlite,
-                                                  ['Xe-100', 'MMR'],
-                                                  721)
+    session = MetricsSession(output_sqlite, chunksize)
+    for name, value in session.evaluate_all(RESPONSES).items():
+        results[name].function = value
 
     results.write()
 
@@ -547,7 +866,9 @@ def get_all_results(results, output_sqlite):
 def run_cyclus(output_sqlite, input_xml):
     '''
     Define the Cyclus output file name, and run cyclus with a given
-    input file name.
+    input file name. If the run cache is enabled and holds a run of an
+    identical input (including the files it XIncludes), the output is
+    served from the cache instead of running Cyclus again.
 
     Parameters
     ----------
@@ -561,6 +882,15 @@ def run_cyclus(output_sqlite, input_xml):
     null
 
     '''
-    if not os.path.exists(output_sqlite):
-        os.system('cyclus -i ' + input_xml + ' -o ' + output_sqlite +
-                  ' --warn-limit 2')
+    if os.path.exists(output_sqlite):
+        return
+    digest = rc.input_digest(input_xml)
+    if digest is not None and rc.fetch(digest, output_sqlite):
+        return
+    subprocess.call(cr.cyclus_command(input_xml, output_sqlite, cr.CYCLUS,
+                                      ['--warn-limit', '2']))
+    if digest is not None:
+        rc.store(digest, output_sqlite)
+
+
+ins.instrument_from_environment(__name__)
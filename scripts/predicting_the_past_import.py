@@ -1,13 +1,28 @@
+import collections
+import concurrent.futures
 import csv
 import dateutil.parser as date
+import functools
 import jinja2
 import numpy as np
 import os
 import pathlib
 import pandas as pd
 import sqlite3 as sql
-from fuzzywuzzy import fuzz
 from pyne import nucname as nn
+import name_matching as nm
+
+# number of assemblies in the core, number of batches, and core mass in kg
+# of each reactor type, reactors of other types use DEFAULT_REACTOR_TYPE
+REACTOR_TYPES = {'BWR': (732, 3, 138000),
+                 'ESBWR': (732, 3, 138000),
+                 'GCR': (324, 3, 114000),  # Need batch number
+                 'HWGCR': (324, 3, 114000),  # Need batch number
+                 'HTGR': (3944, 3, 39000),  # Need batch number
+                 'PHWR': (390, 45, 80000),
+                 'VVER': (312, 3, 41500),  # Need batch number
+                 'VVER-1200': (163, 3, 80000)}  # Need batch number
+DEFAULT_REACTOR_TYPE = (241, 3, 103000)
 
 
 def get_cursor(file_name):
@@ -200,22 +215,15 @@ def merge_coordinates(pris_link, scrape_link, data_year):
     """
     others = get_edge_cases()
     pris = import_pris(pris_link)
-    coords = import_webscrape_data(scrape_link)
-    for web in coords:
-        for i, prs in pris.iterrows():
-            webscrape_name = sanitize_webscrape_name(web['name'])
-            pris_name = sanitize_pris_name(prs[1])
-            if fuzz.ratio(webscrape_name, pris_name) > 78:
-                prs['Latitude'] = web['lat']
-                prs['Longitude'] = web['long']
-            else:
-                for other in others.keys():
-                    edge_case_key = other.lower()
-                    edge_case_value = others[other].lower()
-                    if fuzz.ratio(pris_name, edge_case_key) > 80:
-                        if fuzz.ratio(webscrape_name, edge_case_value) > 75:
-                            prs['Latitude'] = web['lat']
-                            prs['Longitude'] = web['long']
+    coords = import_webscrape_data(scrape_link).fetchall()
+    webscrape_names = [sanitize_webscrape_name(web['name']) for web in coords]
+    pris_names = [sanitize_pris_name(name) for name in pris.iloc[:, 1]]
+    match = nm.last_match(pris_names, webscrape_names, others, 78)
+    found = match >= 0
+    lat = np.array([web['lat'] for web in coords], dtype=object)
+    long = np.array([web['long'] for web in coords], dtype=object)
+    pris.loc[found, 'Latitude'] = lat[match[found]]
+    pris.loc[found, 'Longitude'] = long[match[found]]
     pris.to_csv(
         '../database/reactors_pris_' +
         str(data_year) +
@@ -285,6 +293,61 @@ def load_template(in_template):
     return output_template
 
 
+def write_if_changed(out_file, content):
+    """ Writes a file, unless it already holds the same content. Files
+    that are not written keep their modification time, so the tools that
+    check it do not see them as changed.
+
+    Parameters
+    ---------
+    out_file: str
+        path and name of the file
+    content: str
+        content of the file
+
+    Returns
+    -------
+    written: bool
+        True if the file was written
+    """
+    try:
+        with open(out_file, 'r') as existing:
+            if existing.read() == content:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    with open(out_file, 'w') as output:
+        output.write(content)
+    return True
+
+
+def render_files(template, files, max_workers=None):
+    """ Renders a jinja template for each of a group of files on a pool of
+    threads, and writes the files whose content changed.
+
+    Parameters
+    ---------
+    template: jinja template object
+        jinja template object to be rendered
+    files: dict
+        dictionary with key=[path and name of file], and
+        value=[dict of the variables of the template]
+    max_workers: int
+        maximum number of files rendered at the same time
+
+    Returns
+    -------
+    written: list
+        paths and names of the files that were written
+    """
+    def render(out_file):
+        return write_if_changed(out_file, template.render(**files[out_file]))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        written = list(executor.map(render, files))
+    return [out_file for out_file, changed in zip(files, written) if changed]
+
+
 def get_composition_fresh(in_list, burnup):
     """ Returns a dictionary of isotope and composition (in mass fraction)
     using vision_recipes for fresh UOX fuel.
@@ -376,8 +439,7 @@ def write_recipes(fresh_dict, spent_dict, in_template,
     pathlib.Path(out_path).mkdir(parents=True, exist_ok=True)
     rendered = in_template.render(fresh=fresh_dict,
                                   spent=spent_dict)
-    with open(out_path + '/uox_' + str(burnup) + '.xml', 'w') as output:
-        output.write(rendered)
+    write_if_changed(out_path + '/uox_' + str(burnup) + '.xml', rendered)
 
 
 def produce_recipes(in_csv, recipe_template, burnup, out_path):
@@ -405,6 +467,50 @@ def produce_recipes(in_csv, recipe_template, burnup, out_path):
                   load_template(recipe_template), burnup, out_file)
 
 
+@functools.lru_cache(maxsize=None)
+def parse_date(date_str):
+    """ Parses a date string from PRIS data file with dateutil. The
+    result of each string is kept, so the dates shared by select_region,
+    get_lifetime, and get_buildtime are only parsed once.
+
+    Parameters
+    ----------
+    date_str: str
+        date string from PRIS data file
+
+    Returns
+    -------
+    parsed: datetime.datetime
+        the parsed date
+    """
+    return date.parse(date_str)
+
+
+def parse_dates(dates):
+    """ Parses a column of date strings from PRIS data file. Dates in
+    the YYYY-MM-DD format of the PRIS files are parsed together by pandas,
+    the others by parse_date.
+
+    Parameters
+    ----------
+    dates: pd.Series
+        date strings from PRIS data file
+
+    Returns
+    -------
+    parsed: pd.Series
+        the parsed dates, NaT for the strings that are not a date
+    """
+    dates = dates.astype(str)
+    parsed = pd.to_datetime(dates, format='%Y-%m-%d', errors='coerce')
+    for index in parsed.index[parsed.isna()]:
+        try:
+            parsed[index] = parse_date(dates[index])
+        except (ValueError, OverflowError):
+            pass
+    return parsed
+
+
 def confirm_deployment(row, start_year):
     """ Confirms if reactor is to be deployed for CYCLUS by
     checking if the capacity > 400 and if the commercial date
@@ -431,13 +537,13 @@ def confirm_deployment(row, start_year):
     if len(start_date) > 4 and float(capacity) > 400:
         if end_date == 'nan':
             try:
-                date.parse(start_date)
+                parse_date(start_date)
                 is_deployed = True
             except BaseException:
                 pass
-        elif date.parse(end_date).year > start_year:
+        elif parse_date(end_date).year > start_year:
             try:
-                date.parse(start_date)
+                parse_date(start_date)
                 is_deployed = True
             except BaseException:
                 pass
@@ -446,7 +552,8 @@ def confirm_deployment(row, start_year):
 
 def select_region(in_dataframe, region, start_year):
     """ Returns a list of reactors that will be deployed for
-    CYCLUS by checking the capacity and commercial date
+    CYCLUS by checking the capacity and commercial date, as
+    confirm_deployment does for a single reactor
 
     Parameters
     ----------
@@ -493,13 +600,23 @@ def select_region(in_dataframe, region, start_year):
                'ALL': ALL}
     if region.upper() not in regions.keys():
         raise ValueError(region + 'is not a valid region')
-    reactor_df = pd.DataFrame(columns=in_dataframe.columns)
-    for index, row in in_dataframe.iterrows():
-        country = row['Country']
-        if country.upper() in regions[region.upper()]:
-            if confirm_deployment(row, start_year):
-                reactor_df = reactor_df.append(
-                    in_dataframe.loc[index], ignore_index=True)
+    in_region = in_dataframe['Country'].str.upper().isin(
+        regions[region.upper()])
+    start_date = in_dataframe['Grid Date'].astype(str)
+    end_date = in_dataframe['Shutdown Date'].astype(str)
+    capacity = pd.to_numeric(in_dataframe['RUP [MWe]'], errors='coerce')
+    candidates = in_region & (start_date.str.len() > 4) & (capacity > 400)
+
+    end = parse_dates(end_date[candidates & (end_date != 'nan')])
+    if end.isna().any():
+        raise ValueError(end_date[end.index[end.isna()][0]] +
+                         ' is not a valid shutdown date')
+    end_year = end.dt.year.reindex(in_dataframe.index)
+    deployed = candidates & ((end_date == 'nan') | (end_year > start_year))
+    deployed &= parse_dates(start_date[deployed]).reindex(
+        in_dataframe.index).notna()
+
+    reactor_df = in_dataframe[deployed].reset_index(drop=True)
     reactor_df = reactor_df.replace(np.nan, '')
     reactor_df = reactor_df.astype(str)
 
@@ -525,19 +642,42 @@ def get_lifetime(in_row, start_year):
         lifetime of reactor
     """
     comm_date = in_row['Grid Date']
-    if date.parse(comm_date).year < start_year:
+    if parse_date(comm_date).year < start_year:
         comm_date = str(start_year) + '-02-01'
     shutdown_date = in_row['Shutdown Date']
     if not shutdown_date.strip():
         return 720
     else:
         n_days_month = 365.0 / 12
-        delta = (date.parse(shutdown_date) - date.parse(comm_date)).days
+        delta = (parse_date(shutdown_date) - parse_date(comm_date)).days
         return int(delta / n_days_month)
 
 
+def reactor_type_parameters(reactor_type):
+    """ Looks up the core of a reactor type in REACTOR_TYPES.
+
+    Parameters
+    ----------
+    reactor_type: str
+        type of the reactor from PRIS data file
+
+    Returns
+    -------
+    assem_no: int
+        number of assemblies in the core
+    assem_per_batch: int
+        number of assemblies in a batch
+    assem_size: float
+        mass of an assembly in kg
+    """
+    assem_no, batches, core_mass = REACTOR_TYPES.get(reactor_type,
+                                                     DEFAULT_REACTOR_TYPE)
+    return assem_no, int(assem_no / batches), core_mass / assem_no
+
+
 def write_reactors(in_dataframe, out_path, reactor_template, start_year,
-                   cycle_time=18, refuel_time=1, capacity_factor=1):
+                   cycle_time=18, refuel_time=1, capacity_factor=1,
+                   max_workers=None):
     """ Renders CYCAMORE::reactor specifications using jinja2.
 
     Parameters
@@ -556,55 +696,29 @@ def write_reactors(in_dataframe, out_path, reactor_template, start_year,
         average refuel time in months
     capacity_factor: float
         capacity factor to apply to all reactors, as a decimal
+    max_workers: int
+        maximum number of files rendered at the same time
 
     Returns
     -------
     null
-        writes xml files with CYCAMORE::reactor config
+        writes xml files with CYCAMORE::reactor config, files that did
+        not change are not written again
     """
     if out_path[-1] != '/':
         out_path += '/'
     pathlib.Path(out_path).mkdir(parents=True, exist_ok=True)
     reactor_template = load_template(reactor_template)
-    for index, row in in_dataframe.iterrows():
+    files = {}
+    for row in in_dataframe.to_dict('records'):
         capacity = float(row['RUP [MWe]'])
         if capacity >= 400:
-            name = row[1].replace(' ', '_')
-            assem_per_batch = 0
-            assem_no = 0
-            assem_size = 0
-            reactor_type = row['Type']
+            name = row[in_dataframe.columns[1]].replace(' ', '_')
+            assem_no, assem_per_batch, assem_size = reactor_type_parameters(
+                row['Type'])
             latitude = row['Latitude'] if row['Latitude'] != '' else 0
             longitude = row['Longitude'] if row['Longitude'] != '' else 0
-            if reactor_type in ['BWR', 'ESBWR']:
-                assem_no = 732
-                assem_per_batch = int(assem_no / 3)
-                assem_size = 138000 / assem_no
-            elif reactor_type in ['GCR', 'HWGCR']:  # Need batch number
-                assem_no = 324
-                assem_per_batch = int(assem_no / 3)
-                assem_size = 114000 / assem_no
-            elif reactor_type == 'HTGR':  # Need batch number
-                assem_no = 3944
-                assem_per_batch = int(assem_no / 3)
-                assem_size = 39000 / assem_no
-            elif reactor_type == 'PHWR':
-                assem_no = 390
-                assem_per_batch = int(assem_no / 45)
-                assem_size = 80000 / assem_no
-            elif reactor_type == 'VVER':  # Need batch number
-                assem_no = 312
-                assem_per_batch = int(assem_no / 3)
-                assem_size = 41500 / assem_no
-            elif reactor_type == 'VVER-1200':  # Need batch number
-                assem_no = 163
-                assem_per_batch = int(assem_no / 3)
-                assem_size = 80000 / assem_no
-            else:
-                assem_no = 241
-                assem_per_batch = int(assem_no / 3)
-                assem_size = 103000 / assem_no
-            config = reactor_template.render(
+            files[out_path + name.replace(' ', '_') + '.xml'] = dict(
                 name=name,
                 lifetime=get_lifetime(
                     row,
@@ -618,9 +732,7 @@ def write_reactors(in_dataframe, out_path, reactor_template, start_year,
                 capacity_factor,
                 lon=longitude,
                 lat=latitude)
-            with open(out_path + name.replace(' ', '_') + '.xml',
-                      'w') as output:
-                output.write(config)
+    render_files(reactor_template, files, max_workers)
 
 
 def obtain_reactors(in_csv, region, reactor_template, out_path, start_year):
@@ -651,7 +763,7 @@ def obtain_reactors(in_csv, region, reactor_template, out_path, start_year):
 
 
 def write_deployment(in_dict, out_path, deployinst_template,
-                     inclusions_template):
+                     inclusions_template, max_workers=None):
     """ Renders jinja template using dictionary of reactor name and buildtime.
     Outputs an xml file that uses xinclude to include the reactor xml files
     located in cyclus_input/reactors.
@@ -666,11 +778,14 @@ def write_deployment(in_dict, out_path, deployinst_template,
         path to deployinst template
     inclusions_template: str
         path to inclusions template
+    max_workers: int
+        maximum number of files rendered at the same time
 
     Returns
     -------
     null
-        generates input files that have deployment and xml inclusions
+        generates input files that have deployment and xml inclusions,
+        files that did not change are not written again
     """
     if out_path[-1] != '/':
         out_path += '/'
@@ -678,20 +793,18 @@ def write_deployment(in_dict, out_path, deployinst_template,
     deployinst_template = load_template(deployinst_template)
     inclusions_template = load_template(inclusions_template)
     country_list = {value[0] for value in in_dict.values()}
+    by_country = collections.defaultdict(dict)
+    for reactor, (country, buildtime) in in_dict.items():
+        by_country[country.upper()][reactor] = buildtime
+    files = {}
     for nation in country_list:
-        temp_dict = {}
-        for reactor in in_dict.keys():
-            if in_dict[reactor][0].upper() == nation.upper():
-                temp_dict.update({reactor: in_dict[reactor][1]})
         pathlib.Path(out_path + nation.replace(' ', '_') +
                      '/').mkdir(parents=True, exist_ok=True)
-        deployinst = deployinst_template.render(reactors=temp_dict)
-        with open(out_path + nation.replace(' ', '_') +
-                  '/deployinst.xml', 'w') as output1:
-            output1.write(deployinst)
+        files[out_path + nation.replace(' ', '_') + '/deployinst.xml'] = {
+            'reactors': by_country[nation.upper()]}
+    render_files(deployinst_template, files, max_workers)
     inclusions = inclusions_template.render(reactors=in_dict)
-    with open(out_path + 'inclusions.xml', 'w') as output2:
-        output2.write(inclusions)
+    write_if_changed(out_path + 'inclusions.xml', inclusions)
 
 
 def get_buildtime(in_list, start_year, path_list):
@@ -714,21 +827,22 @@ def get_buildtime(in_list, start_year, path_list):
         value=[set of country and buildtime]
     """
     buildtime_dict = {}
-    for index, row in in_list.iterrows():
-        comm_date = date.parse(row['Grid Date'])
+    file_names = set((reactor.replace(
+        os.path.dirname(reactor), '')).replace('/', '')
+        for reactor in path_list)
+    for unit, country, grid_date in zip(in_list['Unit'], in_list['Country'],
+                                        in_list['Grid Date']):
+        name = unit.replace(' ', '_')
+        if name + '.xml' not in file_names:
+            continue
+        comm_date = parse_date(grid_date)
         start_date = [comm_date.year, comm_date.month, comm_date.day]
         delta = ((start_date[0] - int(start_year)) * 12 +
                  (start_date[1]) +
                  round(start_date[2] / (365.0 / 12)))
         if delta < 0:
             delta = 1
-        for index, reactor in enumerate(path_list):
-            name = row['Unit'].replace(' ', '_')
-            country = row['Country']
-            file_name = (reactor.replace(
-                os.path.dirname(path_list[index]), '')).replace('/', '')
-            if (name + '.xml' == file_name):
-                buildtime_dict.update({name: (country, delta)})
+        buildtime_dict.update({name: (country, delta)})
     return buildtime_dict
 
 
@@ -187,25 +187,18 @@ def direct_decommission(df, ar_dict):
         The dataframe of capacity information with the decommissioned reactors.
     """
 
-    # define number of years
-    num_years = len(df['Year'])
+    counts = np.array([df[f'num_{reactor}'].to_numpy(dtype=float)
+                       for reactor in ar_dict.keys()])
+    lifetimes = [ar_dict[reactor][2] for reactor in ar_dict.keys()]
 
     # now we are going to note when reactors are decommissioned
-    for reactor in ar_dict.keys():
-        # create a decommissioning column
-        df[f'{reactor}Decom'] = 0
-        for year in range(num_years):
-            decom_year = year + ar_dict[reactor][2]
-            if decom_year >= num_years:
-                pass
-            else:
-                # tracks the number of decommissioned reactors
-                df.loc[decom_year, f'{reactor}Decom'] += \
-                    df.loc[year, f'num_{reactor}']
+    decom = decommission_engine(counts, lifetimes)
 
-                # construct new reactors to replace the decommissioned ones
-                df.loc[decom_year, f'num_{reactor}'] += \
-                    df.loc[year, f'num_{reactor}']
+    for row, reactor in enumerate(ar_dict.keys()):
+        df[f'{reactor}Decom'] = column_values(decom[row], np.dtype(int))
+    for row, reactor in enumerate(ar_dict.keys()):
+        df[f'num_{reactor}'] = column_values(counts[row],
+                                             df[f'num_{reactor}'].dtype)
 
     return df
 
@@ -280,6 +273,291 @@ def reactor_columns(df, ar_dict):
     return df
 
 
+# # # # # # # # # # # # # # Array Engine # # # # # # # # # # # # # #
+# The deployment functions run on contiguous NumPy arrays: one capacity
+# vector over the years and one count matrix of reactors x years. The
+# DataFrame columns are only written back once the algorithm is done.
+
+def deployment_arrays(df, base_col, ar_dict):
+    """
+    This function copies the capacity column and the number of reactors
+    columns of a dataframe into the arrays used by the deployment engine.
+
+    Parameters
+    ----------
+    df: :class:`pandas.DataFrame`
+        The dataframe of capacity information, with the number of reactors
+        columns already created by reactor_columns.
+    base_col: str
+        The string name corresponding to the column of capacity.
+    ar_dict: dictionary
+        A dictionary of reactors with information of the form:
+        {reactor: [Power (MWe), capacity_factor (%), lifetime (yr)]}
+
+    Returns
+    -------
+    capacity: :class:`numpy.ndarray`
+        The capacity for each year.
+    counts: :class:`numpy.ndarray`
+        The number of each reactor deployed each year, with one row per
+        reactor in the order of ar_dict.
+    """
+    capacity = df[base_col].to_numpy(dtype=float, copy=True)
+    counts = np.array([df[f'num_{reactor}'].to_numpy(dtype=float)
+                       for reactor in ar_dict.keys()])
+
+    return capacity, counts
+
+
+def column_values(values, dtype):
+    """
+    This function converts values computed by the deployment engine back to
+    the dtype of an integer column if every value is a whole number, which
+    is the dtype the column keeps when it is updated one cell at a time.
+
+    Parameters
+    ----------
+    values: :class:`numpy.ndarray`
+        The values of the column.
+    dtype: :class:`numpy.dtype`
+        The dtype of the column before the deployment.
+
+    Returns
+    -------
+    values: :class:`numpy.ndarray`
+        The values, as integers if possible.
+    """
+    if np.issubdtype(dtype, np.integer) and np.all(np.mod(values, 1) == 0):
+        return values.astype(dtype)
+
+    return values
+
+
+def write_deployment(df, ar_dict, counts, decom, capacity=None):
+    """
+    This function writes the results of the deployment engine back to the
+    dataframe.
+
+    Parameters
+    ----------
+    df: :class:`pandas.DataFrame`
+        The dataframe of capacity information.
+    ar_dict: dictionary
+        A dictionary of reactors with information of the form:
+        {reactor: [Power (MWe), capacity_factor (%), lifetime (yr)]}
+    counts: :class:`numpy.ndarray`
+        The number of each reactor deployed each year (reactors x years).
+    decom: :class:`numpy.ndarray`
+        The number of each reactor decommissioned each year
+        (reactors x years).
+    capacity: :class:`numpy.ndarray`
+        The remaining capacity each year, written to the 'buffer_base'
+        column if given.
+
+    Returns
+    -------
+    df: :class:`pandas.DataFrame`
+        The dataframe with the number of reactors, decommissioning, and
+        buffer columns filled in.
+    """
+    if capacity is not None:
+        df['buffer_base'] = column_values(capacity, df['buffer_base'].dtype)
+
+    for row, reactor in enumerate(ar_dict.keys()):
+        df[f'num_{reactor}'] = column_values(counts[row],
+                                             df[f'num_{reactor}'].dtype)
+    for row, reactor in enumerate(ar_dict.keys()):
+        df[f'{reactor}Decom'] = column_values(decom[row], np.dtype(int))
+
+    return df
+
+
+def greedy_engine(capacity, counts, powers, lifetimes, start_index):
+    """
+    This function runs the greedy deployment on the arrays of the
+    deployment engine. Every deployed reactor reduces the capacity left to
+    meet over its lifetime.
+
+    Parameters
+    ----------
+    capacity: :class:`numpy.ndarray`
+        The capacity for each year, updated in place.
+    counts: :class:`numpy.ndarray`
+        The number of each reactor deployed each year (reactors x years),
+        updated in place.
+    powers: list
+        The power (MWe) of each reactor.
+    lifetimes: list
+        The lifetime (yr) of each reactor.
+    start_index: int
+        The index of the year to start the deployment.
+    """
+    for year in range(start_index, len(capacity)):
+        remaining_cap = capacity[year]
+        for row, power in enumerate(powers):
+            if power > remaining_cap:
+                reactor_div = 0
+            else:
+                # find out how many of this reactor to deploy
+                reactor_div = math.floor(remaining_cap / power)
+            # remaining capacity to meet
+            diff = reactor_div * power
+            remaining_cap -= diff
+            counts[row, year] += reactor_div
+            capacity[year:year + lifetimes[row] + 1] -= diff
+
+
+def pre_det_engine(capacity, counts, powers, distributions, start_index,
+                   greedy=True):
+    """
+    This function runs the pre-determined distribution deployment on the
+    arrays of the deployment engine.
+
+    Parameters
+    ----------
+    capacity: :class:`numpy.ndarray`
+        The capacity for each year.
+    counts: :class:`numpy.ndarray`
+        The number of each reactor deployed each year (reactors x years),
+        updated in place.
+    powers: list
+        The power (MWe) of each reactor.
+    distributions: list
+        The distribution of each reactor, which is a list of caps for each
+        year or anything else if the reactor is not capped.
+    start_index: int
+        The index of the year to start the deployment.
+    greedy: bool
+        A True/False value that determines whether the initial deployment is
+        greedy or linear.
+    """
+    capped = [type(dist) == list for dist in distributions]
+
+    for year in range(start_index, len(capacity)):
+        cap_difference = capacity[year]
+        if greedy is True:
+            for row, power in enumerate(powers):
+                # The number of reactors you'd need to meet the remaining
+                # capacity, limited to the cap if there is one.
+                most_reactors = math.floor(cap_difference / power)
+                if capped[row] and \
+                        most_reactors >= distributions[row][year]:
+                    most_reactors = distributions[row][year]
+                cap_difference -= most_reactors * power
+                counts[row, year] += most_reactors
+        else:
+            while cap_difference > 0:
+                for row, power in enumerate(powers):
+                    # Set the limit one of the smallest reactors below zero
+                    # so the while loop can end.
+                    if cap_difference - power <= -(power + 1):
+                        continue
+                    # Check if the cap will be exceeded by adding another
+                    # reactor.
+                    if capped[row] and \
+                            distributions[row][year] < counts[row, year] + 1:
+                        continue
+                    counts[row, year] += 1
+                    cap_difference -= power
+
+
+def rand_engine(capacity, counts, powers, lifetimes, start_index,
+                set_seed=False, rough=True):
+    """
+    This function runs the random deployment on the arrays of the
+    deployment engine. Every deployed reactor reduces the capacity left to
+    meet over its lifetime.
+
+    Parameters
+    ----------
+    capacity: :class:`numpy.ndarray`
+        The capacity for each year, updated in place.
+    counts: :class:`numpy.ndarray`
+        The number of each reactor deployed each year (reactors x years),
+        updated in place.
+    powers: list
+        The power (MWe) of each reactor.
+    lifetimes: list
+        The lifetime (yr) of each reactor.
+    start_index: int
+        The index of the year to start the deployment.
+    set_seed: bool
+        A True/False value that determines whether the seed used for the random
+        number is set or varies based on time.
+    rough: bool
+        A True/False value that determines whether the initial deployment is
+        rough or complete.
+    """
+    for year in range(start_index, len(capacity)):
+        years_capacity = capacity[year]
+
+        if set_seed is False:
+            # sample random number based on time
+            c = datetime.now()
+            real_seed = int(c.strftime('%y%m%d%H%M%S'))
+        else:
+            real_seed = 20240527121205
+
+        rng = np.random.default_rng(seed=real_seed)
+
+        # I set the limit this way so that something close to 0 could still
+        # deploy the smallest reactor.
+        while years_capacity > -(powers[-1] + 1):
+            row = rng.integers(0, len(powers))
+
+            if powers[row] > years_capacity:
+                if rough is True:
+                    # for a much rougher check, use break
+                    break
+                # for a more accurate, but much much longer run
+                # todo, finish this ensuring it can converge
+                raise NotImplementedError('This feature is unstable.')
+            counts[row, year] += 1
+            years_capacity -= powers[row]
+            capacity[year:year + lifetimes[row] + 1] -= powers[row]
+
+
+def decommission_engine(counts, lifetimes):
+    """
+    This function replaces every decommissioned reactor with a new version
+    of itself on the count matrix of the deployment engine. The reactors
+    deployed in one lifetime-long block of years are replaced in the next
+    block, so the replacements are added a block at a time.
+
+    Parameters
+    ----------
+    counts: :class:`numpy.ndarray`
+        The number of each reactor deployed each year (reactors x years),
+        updated in place with the replacement reactors.
+    lifetimes: list
+        The lifetime (yr) of each reactor.
+
+    Returns
+    -------
+    decom: :class:`numpy.ndarray`
+        The number of each reactor decommissioned each year
+        (reactors x years).
+    """
+    decom = np.zeros_like(counts)
+    num_years = counts.shape[1]
+
+    for row, lifetime in enumerate(lifetimes):
+        if lifetime == 0:
+            # reactors are replaced in the year they are built
+            decom[row] += counts[row]
+            counts[row] += counts[row]
+            continue
+        for start in range(lifetime, num_years, lifetime):
+            stop = min(start + lifetime, num_years)
+            built = counts[row, start - lifetime:stop - lifetime]
+            # tracks the number of decommissioned reactors
+            decom[row, start:stop] += built
+            # construct new reactors to replace the decommissioned ones
+            counts[row, start:stop] += built
+
+    return decom
+
+
 # # # # # # # # # # # # Deployment Functions # # # # # # # # # # #
 # 1. Greedy Algorithm: deploy the largest reactor first at each time step, fill
 #   in the remaining capacity with the next smallest, and so on.
@@ -330,22 +608,15 @@ def greedy_deployment(df, base_col, ar_dict, dep_start_year):
 
     start_index = pull_start_index(df, dep_start_year)
 
-    for year in range(start_index, len(df[base_col])):
-        remaining_cap = df['buffer_base'][year].copy()
-        for reactor in ar_dict.keys():
-            if ar_dict[reactor][0] > remaining_cap:
-                reactor_div = 0
-            else:
-                # find out how many of this reactor to deploy
-                reactor_div = math.floor(remaining_cap / ar_dict[reactor][0])
-            # remaining capacity to meet
-            diff = reactor_div * ar_dict[reactor][0]
-            remaining_cap -= diff
-            df.loc[year, f'num_{reactor}'] += reactor_div
-            df.loc[year:ar_dict[reactor][2]+year, 'buffer_base'] -= diff
+    capacity, counts = deployment_arrays(df, 'buffer_base', ar_dict)
+    powers = [ar_dict[reactor][0] for reactor in ar_dict.keys()]
+    lifetimes = [ar_dict[reactor][2] for reactor in ar_dict.keys()]
+
+    greedy_engine(capacity, counts, powers, lifetimes, start_index)
 
     # account for decommissioning with a direct replacement
-    df = direct_decommission(df, ar_dict)
+    decom = decommission_engine(counts, lifetimes)
+    df = write_deployment(df, ar_dict, counts, decom, capacity)
 
     # Now calculate the total capacity each year (includes capacity from a
     # replacement reactor that is new that year, but not new overall because it
@@ -402,64 +673,17 @@ def pre_det_deployment(df, base_col, ar_dict, dep_start_year, greedy=True):
 
     start_index = pull_start_index(df, dep_start_year)
 
-    if greedy is True:
-        for year in range(start_index, len(df[base_col])):
-            cap_difference = df[base_col][year].copy()
-            for reactor in ar_dict.keys():
-                # The number of reactors you'd need to meet the remaining
-                # capacity.
-                most_reactors = math.floor(cap_difference/ar_dict[reactor][0])
-                # If there is a distribution we'll use it. Otherwise, we
-                # will use a greedy deployment.
-                if type(ar_dict[reactor][3]) == list:
-                    # Check if the desired amount is greater than the cap.
-                    if most_reactors >= ar_dict[reactor][3][year]:
-                        # If so, we will only deploy up to the cap.
-                        cap_difference -= ar_dict[reactor][3][year] \
-                                          * ar_dict[reactor][0]
-                        df.loc[year, f'num_{reactor}'] += \
-                            ar_dict[reactor][3][year]
-                    # If the desired is less than the cap, then we'll deploy a
-                    # greedy amount of reactors.
-                    else:
-                        cap_difference -= most_reactors * ar_dict[reactor][0]
-                        df.loc[year, f'num_{reactor}'] += most_reactors
-                # If there's no cap then we'll deploy a greedy amount of
-                # reactors.
-                else:
-                    cap_difference -= most_reactors * ar_dict[reactor][0]
-                    df.loc[year, f'num_{reactor}'] += most_reactors
-    # Not greedy.
-    else:
-        for year in range(start_index, len(df[base_col])):
-            cap_difference = df[base_col][year].copy()
-            while cap_difference > 0:
-                for reactor in ar_dict.keys():
-                    # Check if the next reactor will exceed or equal the
-                    # desired capacity.
-                    next_difference = cap_difference - ar_dict[reactor][0]
-                    # Set the limit one of the smallest reactors below zero
-                    # so the while loop can end.
-                    if next_difference <= -(ar_dict[reactor][0] + 1):
-                        continue
-                    else:
-                        # Check if a cap exists.
-                        if type(ar_dict[reactor][3]) == list:
-                            # Check if the cap will be exceeded by adding
-                            # another reactor.
-                            if ar_dict[reactor][3][year] >= \
-                              (df.loc[year, f'num_{reactor}'] + 1):
-                                df.loc[year, f'num_{reactor}'] += 1
-                                # Update remaining capacity to be met.
-                                cap_difference -= ar_dict[reactor][0]
-                        # If there isn't a cap add another reactor.
-                        else:
-                            df.loc[year, f'num_{reactor}'] += 1
-                            # Update remaining capacity to be met.
-                            cap_difference -= ar_dict[reactor][0]
+    capacity, counts = deployment_arrays(df, base_col, ar_dict)
+    powers = [ar_dict[reactor][0] for reactor in ar_dict.keys()]
+    lifetimes = [ar_dict[reactor][2] for reactor in ar_dict.keys()]
+    distributions = [ar_dict[reactor][3] for reactor in ar_dict.keys()]
+
+    pre_det_engine(capacity, counts, powers, distributions, start_index,
+                   greedy)
 
     # account for decommissioning with a direct replacement
-    df = direct_decommission(df, ar_dict)
+    decom = decommission_engine(counts, lifetimes)
+    df = write_deployment(df, ar_dict, counts, decom)
 
     # Now calculate the total capacity each year (includes capacity from a
     # replacement reactor that is new that year, but not new overall because it
@@ -522,42 +746,16 @@ def rand_deployment(df, base_col, ar_dict, dep_start_year,
 
     start_index = pull_start_index(df, dep_start_year)
 
-    for year in range(start_index, len(df['buffer_base'])):
-        years_capacity = df['buffer_base'][year]
-        # I set the limit this way so that something close to 0 could still
-        # deploy the smallest reactor.
-
-        if set_seed is False:
-            # sample random number based on time
-            c = datetime.now()
-            real_seed = int(c.strftime('%y%m%d%H%M%S'))
-        else:
-            real_seed = 20240527121205
+    capacity, counts = deployment_arrays(df, 'buffer_base', ar_dict)
+    powers = [ar_dict[reactor][0] for reactor in ar_dict.keys()]
+    lifetimes = [ar_dict[reactor][2] for reactor in ar_dict.keys()]
 
-        rng = np.random.default_rng(seed=real_seed)
-
-        while years_capacity > -(ar_dict[list(ar_dict.keys())[-1]][0] + 1):
-            rand_reactor = rng.integers(0, len(ar_dict.keys()))
-
-            # identify random reactor
-            deployed = list(ar_dict.keys())[rand_reactor]
-
-            if ar_dict[deployed][0] > years_capacity:
-                if rough is True:
-                    # for a much rougher check, use break
-                    break
-                elif rough is False:
-                    # for a more accurate, but much much longer run
-                    # todo, finish this ensuring it can converge
-                    raise NotImplementedError('This feature is unstable.')
-                    continue
-            else:
-                df.loc[year, f'num_{deployed}'] += 1
-                years_capacity -= ar_dict[deployed][0]
-                df.loc[year:(ar_dict[deployed][2] + year), 'buffer_base'] -= ar_dict[deployed][0]
+    rand_engine(capacity, counts, powers, lifetimes, start_index, set_seed,
+                rough)
 
     # account for decommissioning with a direct replacement
-    df = direct_decommission(df, ar_dict)
+    decom = decommission_engine(counts, lifetimes)
+    df = write_deployment(df, ar_dict, counts, decom, capacity)
 
     # Now calculate the total capacity each year (includes capacity from a
     # replacement reactor that is new that year, but not new overall because it
@@ -617,15 +815,16 @@ def rand_greedy_deployment(df, base_col, ar_dict,
     df = greedy_deployment(df, 'remaining_cap', ar_dict, dep_start_year)
 
     # reset the total capacity column
-    df['new_cap'] = 0
+    new_cap = np.zeros(len(df))
 
     # populate the greedy reactor column
-    for year in range(len(df[base_col])):
-        for reactor in ar_dict.keys():
-            df.loc[year, f'greedy_num_{reactor}'] = \
-                   df.loc[year, f'num_{reactor}'] \
-                   - df.loc[year, f'rand_num_{reactor}']
-            df.loc[year, f'new_cap'] += df.loc[year, f'{reactor}_cap']
+    for reactor in ar_dict.keys():
+        greedy_num = df[f'num_{reactor}'].to_numpy(dtype=float) \
+            - df[f'rand_num_{reactor}'].to_numpy(dtype=float)
+        df[f'greedy_num_{reactor}'] = column_values(
+            greedy_num, df[f'greedy_num_{reactor}'].dtype)
+        new_cap += df[f'{reactor}_cap'].to_numpy(dtype=float)
+    df['new_cap'] = column_values(new_cap, np.dtype(int))
 
     return df
 
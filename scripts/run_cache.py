@@ -0,0 +1,479 @@
+'''
+Content-addressed cache of Cyclus output databases. A run is identified
+by a hash of its fully rendered input: the input file with every
+XIncluded file (reactors, DeployInsts, recipes, ...) replaced by the hash
+of its contents, together with the version of the Cyclus executable, so
+outputs of an older Cyclus are not reused after an upgrade. Two inputs
+that only differ in file names or in the location of the included files
+share one cache entry, and a repeated run is served by a copy of the
+stored database instead of a new simulation. The copy is a copy-on-write
+clone (reflink) where the file system supports it.
+
+Entries are stored in cache_directory as <hash>.sqlite. A stored
+database is checked before it is reused, and the least recently used
+entries are evicted once the cache holds more than max_cache_bytes. The
+last use of an entry is recorded in a <hash>.used file, so the
+modification time of the outputs is never changed by the cache.
+Setting hardlink = True serves and stores the databases by hardlinks
+instead of copies. These share their contents with the cache entry, so
+only use it if the outputs are never modified afterwards.
+'''
+import glob
+import hashlib
+import os
+import shutil
+import sqlite3
+import subprocess
+import xml.etree.ElementTree as ET
+
+import cyclus_runner as cr
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+XINCLUDE = '{http://www.w3.org/2001/XInclude}include'
+XML_BASE = '{http://www.w3.org/XML/1998/namespace}base'
+# Linux ioctl cloning the contents of a file (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+cache_directory = os.environ.get(
+    'CYCLUS_RUN_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'transition-scenarios',
+                 'cyclus-runs'))
+max_cache_bytes = 50 * 1024 ** 3
+hardlink = False
+enabled = True
+
+_versions = {}
+
+
+def include_path(href, directory, base=None):
+    '''
+    Resolves the href of an XInclude the same way Cyclus does, relative
+    to the xml:base of the including element, if there is one, and to the
+    directory of the including file otherwise
+
+    Parameters
+    ----------
+    href: str
+        href attribute of the include, without the xpointer fragment
+    directory: str
+        directory of the including file
+    base: str, optional
+        xml:base in effect for the include
+
+    Returns
+    -------
+    path: str
+        path of the included file
+    '''
+    if base is not None:
+        directory = os.path.join(directory, base)
+    return os.path.normpath(os.path.join(directory, href))
+
+
+def file_digest(path, _digests=None):
+    '''
+    Hashes a Cyclus input file with the files it XIncludes. Each include
+    is replaced by the hash of the included file and the xpointer of the
+    include, and xml:base attributes are dropped, so that the hash only
+    depends on what Cyclus reads and not on where the files are.
+
+    Parameters
+    ----------
+    path: str
+        name of the xml file
+    _digests: dict, optional
+        hashes of the files already visited, used by the recursion
+
+    Returns
+    -------
+    digest: str
+        hexadecimal SHA-256 hash
+    '''
+    if _digests is None:
+        _digests = {}
+    path = os.path.abspath(path)
+    if path in _digests:
+        return _digests[path]
+
+    tree = ET.parse(path)
+    directory = os.path.dirname(path)
+    parents = [(tree.getroot(), None)]
+    while parents:
+        element, base = parents.pop()
+        if element.get(XML_BASE) is not None:
+            base = element.get(XML_BASE) if base is None else \
+                os.path.join(base, element.get(XML_BASE))
+            del element.attrib[XML_BASE]
+        for child in element:
+            if child.tag != XINCLUDE:
+                parents.append((child, base))
+                continue
+            href, _, fragment = child.get('href', '').partition('#')
+            included = include_path(href, directory, base)
+            if child.get('parse') == 'text':
+                with open(included, 'rb') as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()
+            else:
+                digest = file_digest(included, _digests)
+            child.set('href', digest + '#' + fragment)
+
+    digest = hashlib.sha256(ET.tostring(tree.getroot())).hexdigest()
+    _digests[path] = digest
+    return digest
+
+
+def cyclus_version(executable=None):
+    '''
+    Gets the version of a Cyclus executable, as printed by
+    executable --version. It is only asked again once the executable
+    changes. If it cannot be asked, the path and modification time of
+    the executable are used instead.
+
+    Parameters
+    ----------
+    executable: str, optional
+        Cyclus executable, cyclus_runner.CYCLUS if None
+
+    Returns
+    -------
+    version: str or None
+        version of the executable, None if it cannot be found
+    '''
+    if executable is None:
+        executable = cr.CYCLUS
+    path = shutil.which(executable)
+    if path is None:
+        return None
+    path = os.path.realpath(path)
+    key = (path, os.stat(path).st_mtime_ns)
+    if key not in _versions:
+        try:
+            version = subprocess.run([path, '--version'],
+                                     capture_output=True, text=True,
+                                     timeout=60)
+        except (OSError, subprocess.SubprocessError):
+            version = None
+        if version is not None and version.returncode == 0:
+            _versions[key] = version.stdout
+        else:
+            _versions[key] = path + ' ' + str(key[1])
+    return _versions[key]
+
+
+def input_digest(input_xml, executable=None):
+    '''
+    Gets the key of a run in the cache. Problems with the input are left
+    for Cyclus to report, so no key is returned for an input that cannot
+    be read.
+
+    Parameters
+    ----------
+    input_xml: str
+        name of Cyclus xml input file
+    executable: str, optional
+        Cyclus executable the input is run with, cyclus_runner.CYCLUS if
+        None
+
+    Returns
+    -------
+    digest: str or None
+        hash of the input from file_digest and of the version of the
+        executable, None if the cache is not enabled, the input or one of
+        its includes cannot be read, or the executable cannot be found
+    '''
+    if not enabled:
+        return None
+    version = cyclus_version(executable)
+    if version is None:
+        return None
+    try:
+        digest = file_digest(input_xml)
+    except (OSError, ET.ParseError):
+        return None
+    return hashlib.sha256((digest + version).encode()).hexdigest()
+
+
+def entry_file(digest):
+    '''
+    Gets the name of the cached database of a run
+
+    Parameters
+    ----------
+    digest: str
+        hash of the input of the run, from file_digest
+
+    Returns
+    -------
+    path: str
+        name of the cached database
+    '''
+    return os.path.join(cache_directory, digest + '.sqlite')
+
+
+def valid_entry(path):
+    '''
+    Checks that a cached database holds a finished simulation and that
+    SQLite finds no corruption in it
+
+    Parameters
+    ----------
+    path: str
+        name of the cached database
+
+    Returns
+    -------
+    valid: bool
+        True if the database can be reused
+    '''
+    if not cr.valid_output(path):
+        return False
+    try:
+        connect = sqlite3.connect('file:' + path + '?mode=ro', uri=True)
+        try:
+            check = connect.execute('PRAGMA quick_check').fetchone()
+        finally:
+            connect.close()
+    except sqlite3.Error:
+        return False
+    return check == ('ok',)
+
+
+def reflink(source, destination):
+    '''
+    Clones a file with copy-on-write, so that the copy shares the blocks
+    of the file until either of them is modified
+
+    Parameters
+    ----------
+    source: str
+        name of the file
+    destination: str
+        name of the new file
+
+    Raises
+    ------
+    OSError
+        if the platform or the file system cannot clone files
+    '''
+    if fcntl is None:
+        raise OSError('Cloning files is not supported on this platform')
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(source, destination)
+
+
+def link_or_copy(source, destination):
+    '''
+    Copies a file, cloning it where the file system supports it, or
+    hardlinks it if hardlink is True. The destination is written under a
+    temporary name and then renamed, so it never holds a partial file.
+
+    Parameters
+    ----------
+    source: str
+        name of the file
+    destination: str
+        name of the new file
+    '''
+    temporary = destination + '.' + str(os.getpid())
+    try:
+        linked = False
+        if hardlink:
+            try:
+                os.link(source, temporary)
+                linked = True
+            except OSError:
+                pass
+        if not linked:
+            try:
+                reflink(source, temporary)
+            except OSError:
+                shutil.copy2(source, temporary)
+        os.replace(temporary, destination)
+    except BaseException:
+        remove_file(temporary)
+        raise
+
+
+def remove_file(path):
+    '''
+    Removes a file, if another process has not removed it already
+
+    Parameters
+    ----------
+    path: str
+        name of the file
+    '''
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def used_file(path):
+    '''
+    Gets the name of the file recording the last use of an entry
+
+    Parameters
+    ----------
+    path: str
+        name of the cached database
+
+    Returns
+    -------
+    used: str
+        name of the file whose modification time is the last use
+    '''
+    return os.path.splitext(path)[0] + '.used'
+
+
+def last_used(path):
+    '''
+    Gets the time an entry was last stored or fetched
+
+    Parameters
+    ----------
+    path: str
+        name of the cached database
+
+    Returns
+    -------
+    time: float
+        modification time of the .used file of the entry, or of the
+        entry if it was never fetched
+
+    Raises
+    ------
+    FileNotFoundError
+        if the entry was removed
+    '''
+    modified = os.path.getmtime(path)
+    try:
+        return max(modified, os.path.getmtime(used_file(path)))
+    except FileNotFoundError:
+        return modified
+
+
+def fetch(digest, output_sqlite):
+    '''
+    Serves a run from the cache. An entry that fails the check in
+    valid_entry is removed.
+
+    Parameters
+    ----------
+    digest: str
+        hash of the input of the run, from file_digest
+    output_sqlite: str
+        name of Cyclus SQLite output file to create
+
+    Returns
+    -------
+    found: bool
+        True if the output file was created from the cache
+    '''
+    path = entry_file(digest)
+    if not os.path.exists(path):
+        return False
+    if not valid_entry(path):
+        remove_file(path)
+        remove_file(used_file(path))
+        return False
+    directory = os.path.dirname(os.path.abspath(output_sqlite))
+    os.makedirs(directory, exist_ok=True)
+    try:
+        link_or_copy(path, output_sqlite)
+    except FileNotFoundError:
+        # the entry was evicted by another process
+        return False
+    # marks the entry as recently used for the eviction, without touching
+    # the entry itself, which may be hardlinked to outputs
+    with open(used_file(path), 'w'):
+        pass
+    return True
+
+
+def store(digest, output_sqlite):
+    '''
+    Adds the output of a finished run to the cache, then evicts the least
+    recently used entries until the cache fits in max_cache_bytes.
+    Outputs of unfinished simulations are not stored.
+
+    Parameters
+    ----------
+    digest: str
+        hash of the input of the run, from file_digest
+    output_sqlite: str
+        name of Cyclus SQLite output file
+
+    Returns
+    -------
+    stored: bool
+        True if the output was added to the cache
+    '''
+    if not cr.valid_output(output_sqlite):
+        return False
+    os.makedirs(cache_directory, exist_ok=True)
+    link_or_copy(output_sqlite, entry_file(digest))
+    remove_file(used_file(entry_file(digest)))
+    evict(keep=entry_file(digest))
+    return True
+
+
+def cache_size():
+    '''
+    Gets the size of the cached databases
+
+    Returns
+    -------
+    size: int
+        total size in bytes
+    '''
+    size = 0
+    for path in glob.glob(os.path.join(cache_directory, '*.sqlite')):
+        try:
+            size += os.path.getsize(path)
+        except FileNotFoundError:
+            continue
+    return size
+
+
+def evict(keep=None):
+    '''
+    Removes the least recently used entries until the cache fits in
+    max_cache_bytes. Entries removed by another process meanwhile are
+    skipped.
+
+    Parameters
+    ----------
+    keep: str, optional
+        name of an entry that is never removed
+    '''
+    entries = []
+    for path in glob.glob(os.path.join(cache_directory, '*.sqlite')):
+        try:
+            entries.append((last_used(path), os.path.getsize(path), path))
+        except FileNotFoundError:
+            continue
+    entries.sort()
+    size = sum(x[1] for x in entries)
+    for used, entry_size, path in entries:
+        if size <= max_cache_bytes:
+            break
+        if path == keep:
+            continue
+        size -= entry_size
+        remove_file(path)
+        remove_file(used_file(path))
+
+
+def clear():
+    '''
+    Removes every entry of the cache
+    '''
+    for path in glob.glob(os.path.join(cache_directory, '*.sqlite')) + \
+            glob.glob(os.path.join(cache_directory, '*.used')):
+        remove_file(path)
@@ -0,0 +1,336 @@
+""" Compares the supply and demand of commodities between the output
+databases of several deployment methods, as plotted by
+transition_plots.plot_all_undersupply.
+
+Each database is opened once and the supply and demand of every
+requested commodity are read with a single query. The series are
+returned as arrays with one row per commodity and one column per
+timestep of the simulation, with zeros where nothing was recorded, and
+the databases of the different methods are evaluated in parallel
+processes.
+"""
+import concurrent.futures
+import sqlite3
+import numpy as np
+
+
+def series_tables(commod, driving=False):
+    """ Returns the names of the tables holding the supply and demand of
+    a commodity in a d3ploy output database. The supply of a driving
+    commodity is recorded by the facilities in TimeSeries<commod>
+    (e.g. TimeSeriesPower) and its demand is given by an equation, while
+    the supply and demand of the other commodities are recorded by
+    d3ploy.
+
+    Parameters
+    ----------
+    commod : str
+        Name of the commodity.
+    driving : bool, optional
+        Indicates if the commodity is a driving commodity (True)
+        or not (False).
+        Defaults to False.
+
+    Returns
+    -------
+    tables : tuple of str
+        Names of the supply table and, for a non driving commodity, of
+        the demand table.
+    """
+    if driving:
+        return ('TimeSeries' + commod,)
+    return ('TimeSeriessupply' + commod, 'TimeSeriesdemand' + commod)
+
+
+def supply_demand_query(commods, driving_commods=('power',)):
+    """ Builds the query summing the values of the supply and demand
+    tables of all the commodities at each timestep. Each row holds the
+    index of the series in the supply and demand arrays, the time and
+    the summed value.
+
+    Parameters
+    ----------
+    commods : list of str
+        List of commodities.
+    driving_commods : tuple of str, optional
+        Commodities whose demand is given by the demand equation.
+        Defaults to ('power',).
+
+    Returns
+    -------
+    query : str
+        Query on the output database.
+    """
+    selects = []
+    for row, commod in enumerate(commods):
+        tables = series_tables(commod, commod in driving_commods)
+        for offset, table in enumerate(tables):
+            selects.append('SELECT %i, time, sum(value) FROM "%s" '
+                           'GROUP BY time' % (row + offset * len(commods),
+                                              table))
+    return ' UNION ALL '.join(selects)
+
+
+def demand_series(demand_eq, duration):
+    """ Evaluates the demand equation of a driving commodity at every
+    timestep
+
+    Parameters
+    ----------
+    demand_eq : str
+        Demand equation, as a function of the timestep t.
+    duration : int
+        Number of timesteps of the simulation.
+
+    Returns
+    -------
+    demand : np.ndarray
+        Demand at each timestep.
+    """
+    t = np.arange(duration, dtype=float)
+    demand = eval(demand_eq, {'np': np, 't': t})
+    return np.broadcast_to(np.asarray(demand, dtype=float), t.shape).copy()
+
+
+def supply_demand_arrays(output_file, commods, demand_eq='0',
+                         driving_commods=('power',)):
+    """ Reads the supply and demand of several commodities from an
+    output database, opening it once
+
+    Parameters
+    ----------
+    output_file : str
+        Path to the SQLite file.
+    commods : list of str
+        List of commodities.
+    demand_eq : str, optional
+        Demand equation, only used for the driving commodities.
+        Defaults to '0'.
+    driving_commods : tuple of str, optional
+        Commodities whose demand is given by the demand equation.
+        Defaults to ('power',).
+
+    Returns
+    -------
+    supply : np.ndarray
+        Supply of each commodity at each timestep, with one row per
+        commodity and one column per timestep.
+    demand : np.ndarray
+        Demand of each commodity at each timestep, in the same layout.
+    """
+    conn = sqlite3.connect(output_file)
+    try:
+        duration = conn.execute('SELECT Duration FROM Info').fetchone()[0]
+        rows = []
+        if commods:
+            rows = conn.execute(
+                supply_demand_query(commods, driving_commods)).fetchall()
+    finally:
+        conn.close()
+    values = np.zeros((2 * len(commods), duration))
+    if rows:
+        series, time, value = np.array(rows, dtype=float).T
+        values[series.astype(int), time.astype(int)] = value
+    supply, demand = values[:len(commods)], values[len(commods):]
+    for row, commod in enumerate(commods):
+        if commod in driving_commods:
+            demand[row] = demand_series(demand_eq, duration)
+    return supply, demand
+
+
+def undersupply(supply, demand, driving=None, demand_driven=True):
+    """ Finds the timesteps where a commodity is undersupplied. Demand
+    driven commodities are undersupplied when their supply is below
+    their demand, and supply driven commodities when their supply is
+    above it. Driving commodities are always demand driven.
+
+    Parameters
+    ----------
+    supply : np.ndarray
+        Supply of each commodity at each timestep.
+    demand : np.ndarray
+        Demand of each commodity at each timestep.
+    driving : np.ndarray, optional
+        True for the rows of the driving commodities.
+        Defaults to None, for no driving commodity.
+    demand_driven : bool, optional
+        Indicates whether the commodities are demand-driven (True) or
+        supply-driven (False).
+        Defaults to True.
+
+    Returns
+    -------
+    undersupplied : np.ndarray
+        True at the timesteps where each commodity is undersupplied.
+    diff : np.ndarray
+        Difference between supply and demand.
+    """
+    diff = supply - demand
+    if driving is None:
+        driving = np.zeros(len(diff), dtype=bool)
+    driving = np.asarray(driving, dtype=bool)[:, None]
+    undersupplied = diff < 0 if demand_driven else diff > 0
+    return np.where(driving, diff < 0, undersupplied), diff
+
+
+def dict_arrays(all_dict):
+    """ Aligns the supply and demand dictionaries of a commodity, as
+    returned by d3ploy.tester, on the timesteps of the demand
+
+    Parameters
+    ----------
+    all_dict : dict
+        Dictionary with supply and demand timeseries
+        data for a commodity.
+
+    Returns
+    -------
+    times : list
+        Timesteps of the demand dictionary, in its order.
+    supply : np.ndarray
+        Supply at each timestep.
+    demand : np.ndarray
+        Demand at each timestep.
+    """
+    dict_demand = all_dict['dict_demand']
+    dict_supply = all_dict['dict_supply']
+    times = list(dict_demand)
+    supply = np.fromiter(map(dict_supply.__getitem__, times), dtype=float,
+                         count=len(times))
+    demand = np.fromiter(dict_demand.values(), dtype=float,
+                         count=len(times))
+    return times, supply, demand
+
+
+def undersupply_stats(undersupplied, diff):
+    """ Summarizes the undersupply of each commodity
+
+    Parameters
+    ----------
+    undersupplied : np.ndarray
+        True at the timesteps where each commodity is undersupplied, with
+        one row per commodity and one column per timestep.
+    diff : np.ndarray
+        Difference between supply and demand, in the same layout.
+
+    Returns
+    -------
+    stats : dict
+        Dictionary with "key=statistic, and value=array with one value per
+        commodity". The statistics are the number of undersupplied
+        timesteps (count), the length of the longest run of consecutive
+        undersupplied timesteps (longest), the first and last
+        undersupplied timesteps (first and last, -1 if there are none)
+        and the total and largest absolute difference between supply and
+        demand over the undersupplied timesteps (magnitude and
+        max_magnitude).
+    """
+    undersupplied = np.asarray(undersupplied, dtype=bool)
+    rows, columns = undersupplied.shape
+    padded = np.zeros((rows, columns + 2), dtype=np.int8)
+    padded[:, 1:-1] = undersupplied
+    steps = np.diff(padded, axis=1)
+    # the starts and ends of the runs are found in the same row order
+    run_rows, starts = np.nonzero(steps == 1)
+    ends = np.nonzero(steps == -1)[1]
+    longest = np.zeros(rows, dtype=int)
+    np.maximum.at(longest, run_rows, ends - starts)
+
+    found = undersupplied.any(axis=1)
+    first = np.full(rows, -1)
+    last = np.full(rows, -1)
+    # np.argmax cannot be taken over zero timesteps
+    if columns > 0:
+        first[found] = np.argmax(undersupplied, axis=1)[found]
+        last[found] = columns - 1 - np.argmax(undersupplied[:, ::-1],
+                                              axis=1)[found]
+    magnitude = np.where(undersupplied, np.abs(diff), 0)
+    return {'count': undersupplied.sum(axis=1),
+            'longest': longest,
+            'first': first,
+            'last': last,
+            'magnitude': magnitude.sum(axis=1),
+            'max_magnitude': magnitude.max(axis=1, initial=0)}
+
+
+def method_undersupply(output_file, commods, demand_eq='0',
+                       demand_driven=True, driving_commods=('power',)):
+    """ Finds the timesteps where each commodity is undersupplied in an
+    output database
+
+    Parameters
+    ----------
+    output_file : str
+        Path to the SQLite file.
+    commods : list of str
+        List of commodities.
+    demand_eq : str, optional
+        Demand equation, only used for the driving commodities.
+        Defaults to '0'.
+    demand_driven : bool, optional
+        Indicates whether the commodities are demand-driven (True) or
+        supply-driven (False).
+        Defaults to True.
+    driving_commods : tuple of str, optional
+        Commodities whose demand is given by the demand equation.
+        Defaults to ('power',).
+
+    Returns
+    -------
+    undersupplied : np.ndarray
+        True at the timesteps where each commodity is undersupplied.
+    diff : np.ndarray
+        Difference between supply and demand.
+    """
+    supply, demand = supply_demand_arrays(output_file, commods, demand_eq,
+                                          driving_commods)
+    driving = [commod in driving_commods for commod in commods]
+    return undersupply(supply, demand, driving, demand_driven)
+
+
+def compare_methods(general_sqlite, methods, commods, demand_eq='0',
+                    demand_driven=True, driving_commods=('power',),
+                    max_workers=None):
+    """ Finds the timesteps where each commodity is undersupplied for
+    several deployment methods, reading the database of each method in
+    its own process
+
+    Parameters
+    ----------
+    general_sqlite : str
+        Name of the SQLite database without the method name added at the
+        end.
+    methods : list of str
+        List of prediction methods.
+    commods : list of str
+        List of commodities.
+    demand_eq : str, optional
+        Demand equation, only used for the driving commodities.
+        Defaults to '0'.
+    demand_driven : bool, optional
+        Indicates whether the commodities are demand-driven (True) or
+        supply-driven (False).
+        Defaults to True.
+    driving_commods : tuple of str, optional
+        Commodities whose demand is given by the demand equation.
+        Defaults to ('power',).
+    max_workers : int, optional
+        Number of processes. Defaults to None, for one per CPU. With 1,
+        the databases are read in the calling process.
+
+    Returns
+    -------
+    results : dict
+        Dictionary with "key=method, and value=(undersupplied, diff)" as
+        returned by method_undersupply.
+    """
+    output_files = [general_sqlite + method + '.sqlite'
+                    for method in methods]
+    args = (len(methods) * [commods], len(methods) * [demand_eq],
+            len(methods) * [demand_driven], len(methods) * [driving_commods])
+    if max_workers == 1 or len(methods) <= 1:
+        return dict(zip(methods, map(method_undersupply, output_files,
+                                     *args)))
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        return dict(zip(methods, executor.map(method_undersupply,
+                                              output_files, *args)))
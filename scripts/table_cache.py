@@ -0,0 +1,350 @@
+'''
+Per-database cache of the tables in Cyclus output files. Each table
+is read from SQLite once per database. It is then kept in an in-memory
+LRU cache bounded by size and, when pyarrow is available, stored as a
+Feather file in cache_root so that later processes can memory-map it
+instead of querying SQLite again. The database itself is never written
+to. The least recently used Feather files are removed once cache_root
+holds more than max_disk_bytes.
+
+Cache entries are keyed on the absolute path, modification time and
+size of the database, so a database rewritten by a new Cyclus run is
+read again automatically.
+'''
+import collections
+import glob
+import hashlib
+import os
+import sqlite3
+
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+# only select columns of Resources are read because of memory issues
+TABLE_QUERIES = {
+    'Resources': 'SELECT SimId, ResourceId, ObjId, TimeCreated, Quantity, '
+                 'Units FROM Resources'}
+
+cache_root = os.environ.get(
+    'TRANSITION_TABLE_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'transition-scenarios',
+                 'tables'))
+max_cache_bytes = 2 * 1024 ** 3
+max_disk_bytes = 10 * 1024 ** 3
+persist = True
+
+_tables = collections.OrderedDict()
+_cache_bytes = 0
+
+
+def database_key(db_file):
+    '''
+    Gets the key identifying the current contents of a database file
+
+    Parameters
+    ----------
+    db_file: str
+        filename of database
+
+    Returns
+    -------
+    key: tuple
+        absolute path, modification time (ns), and size of the file
+    '''
+    path = os.path.abspath(db_file)
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
+def cache_directory(db_file):
+    '''
+    Gets the directory the Feather files of a database are stored in,
+    which is in cache_root and named after the database and a hash of
+    its absolute path.
+
+    Parameters
+    ----------
+    db_file: str
+        filename of database
+
+    Returns
+    -------
+    directory: str
+        path of the cache directory
+    '''
+    path = os.path.abspath(db_file)
+    digest = hashlib.sha256(path.encode()).hexdigest()[:16]
+    return os.path.join(cache_root, os.path.splitext(
+        os.path.basename(path))[0] + '-' + digest)
+
+
+def feather_file(key, table_name):
+    '''
+    Gets the name of the Feather file for a table of a database
+
+    Parameters
+    ----------
+    key: tuple
+        key of the database, from database_key
+    table_name: str
+        name of table in the database
+
+    Returns
+    -------
+    path: str
+        path of the Feather file
+    '''
+    path, mtime, size = key
+    return os.path.join(cache_directory(path),
+                        table_name + '-' + str(mtime) + '-' + str(size) +
+                        '.feather')
+
+
+def read_table(db_file, table_name):
+    '''
+    Reads a table from the SQLite database, bypassing the cache
+
+    Parameters
+    ----------
+    db_file: str
+        filename of database
+    table_name: str
+        name of table in the database
+
+    Returns
+    -------
+    table_df: DataFrame
+        requested table from database
+    '''
+    query = TABLE_QUERIES.get(table_name, 'SELECT * FROM ' + table_name)
+    connect = sqlite3.connect(db_file)
+    try:
+        table_df = pd.read_sql_query(query, connect)
+    finally:
+        connect.close()
+    return table_df
+
+
+def load_feather(key, table_name):
+    '''
+    Memory-maps the Feather file of a table, if it exists, and marks
+    it as recently used for the eviction
+
+    Parameters
+    ----------
+    key: tuple
+        key of the database, from database_key
+    table_name: str
+        name of table in the database
+
+    Returns
+    -------
+    table_df: DataFrame or None
+        stored table, None if it is not stored or cannot be read
+    '''
+    path = feather_file(key, table_name)
+    if feather is None or not os.path.exists(path):
+        return None
+    try:
+        table_df = feather.read_table(path, memory_map=True).to_pandas()
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return None
+    return table_df
+
+
+def store_feather(key, table_name, table_df):
+    '''
+    Writes a table to its Feather file, removes the files of older
+    versions of the database, then evicts the least recently used files
+    until cache_root fits in max_disk_bytes. The file is written under a
+    temporary name first so that concurrent processes never read a
+    partial file.
+
+    Parameters
+    ----------
+    key: tuple
+        key of the database, from database_key
+    table_name: str
+        name of table in the database
+    table_df: DataFrame
+        table to store
+    '''
+    if feather is None:
+        return
+    path = feather_file(key, table_name)
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        temporary = path + '.' + str(os.getpid())
+        feather.write_feather(table_df, temporary)
+        os.replace(temporary, path)
+    except OSError:
+        return
+    for old in glob.glob(os.path.join(directory, table_name + '-*.feather')):
+        if old != path:
+            remove_file(old)
+    evict_files(keep=path)
+
+
+def remove_file(path):
+    '''
+    Removes a Feather file, if another process has not removed it already
+
+    Parameters
+    ----------
+    path: str
+        path of the Feather file
+    '''
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def evict_files(keep=None):
+    '''
+    Removes the least recently used Feather files until the files in
+    cache_root fit in max_disk_bytes
+
+    Parameters
+    ----------
+    keep: str, optional
+        path of a Feather file that is never removed
+    '''
+    entries = []
+    for path in glob.glob(os.path.join(cache_root, '*', '*.feather')):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, path))
+    entries.sort()
+    size = sum(x[1] for x in entries)
+    for mtime, file_size, path in entries:
+        if size <= max_disk_bytes:
+            break
+        if path == keep:
+            continue
+        size -= file_size
+        remove_file(path)
+
+
+def get_table(db_file, table_name):
+    '''
+    Gets a table from the cache, reading it from the Feather file or
+    the database if the cache has no current copy. The returned
+    DataFrame is shared with the cache and must not be modified.
+
+    Parameters
+    ----------
+    db_file: str
+        filename of database
+    table_name: str
+        name of table in the database
+
+    Returns
+    -------
+    table_df: DataFrame
+        requested table from database
+    '''
+    key = database_key(db_file)
+    entry = _tables.get((key[0], table_name))
+    if entry is not None and entry[0] == key:
+        _tables.move_to_end((key[0], table_name))
+        return entry[1]
+
+    table_df = None
+    if persist:
+        table_df = load_feather(key, table_name)
+    if table_df is None:
+        table_df = read_table(db_file, table_name)
+        if persist:
+            store_feather(key, table_name, table_df)
+    add_table(key, table_name, table_df)
+    return table_df
+
+
+def add_table(key, table_name, table_df):
+    '''
+    Adds a table to the in-memory cache, then evicts the least recently
+    used tables until the cache fits in max_cache_bytes.
+
+    Parameters
+    ----------
+    key: tuple
+        key of the database, from database_key
+    table_name: str
+        name of table in the database
+    table_df: DataFrame
+        table to add
+    '''
+    global _cache_bytes
+    remove_table((key[0], table_name))
+    size = int(table_df.memory_usage(index=True, deep=True).sum())
+    _tables[(key[0], table_name)] = (key, table_df, size)
+    _cache_bytes += size
+    while _cache_bytes > max_cache_bytes and len(_tables) > 1:
+        remove_table(next(iter(_tables)))
+
+
+def remove_table(cache_key):
+    '''
+    Removes a table from the in-memory cache, if it is present
+
+    Parameters
+    ----------
+    cache_key: tuple
+        absolute path of the database and table name
+    '''
+    global _cache_bytes
+    entry = _tables.pop(cache_key, None)
+    if entry is not None:
+        _cache_bytes -= entry[2]
+
+
+def cached_tables():
+    '''
+    Lists the tables held in memory, least recently used first
+
+    Returns
+    -------
+    tables: list of tuples
+        absolute path of the database and table name of each table
+    '''
+    return list(_tables.keys())
+
+
+def invalidate(db_file=None, remove_files=True):
+    '''
+    Drops the cached tables of a database, or of every database held
+    in memory if db_file is None.
+
+    Parameters
+    ----------
+    db_file: str, optional
+        filename of database
+    remove_files: bool, optional
+        if True, also deletes the Feather files of the database
+    '''
+    if db_file is None:
+        paths = set(path for path, table_name in _tables)
+    else:
+        paths = [os.path.abspath(db_file)]
+    for path in paths:
+        for cache_key in [x for x in _tables if x[0] == path]:
+            remove_table(cache_key)
+        if remove_files:
+            for old in glob.glob(os.path.join(cache_directory(path),
+                                              '*.feather')):
+                remove_file(old)
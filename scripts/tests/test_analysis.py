@@ -3,6 +3,7 @@ import pytest
 import collections
 import sqlite3 as lite
 import os
+import shutil
 import sys
 path = os.path.realpath(__file__)
 sys.path.append(os.path.dirname(os.path.dirname(path)))
@@ -129,6 +130,51 @@ def test_power_capacity():
     assert power_dict['fr_inst'].all() == fr_inst.all()
 
 
+def test_power_capacity_of_region():
+    """Tests if power_capacity_of_region only returns the
+       matching institution"""
+    cur = get_sqlite_cursor()
+    power_dict = an.power_capacity_of_region(cur, 'lwr')
+    answer = an.power_capacity(cur)
+    assert list(power_dict.keys()) == ['lwr_inst']
+    assert np.allclose(power_dict['lwr_inst'], answer['lwr_inst'])
+
+
+def test_capacity_calc_events():
+    """Tests if capacity_calc adds and subtracts capacity at the
+       entry and exit timesteps of each institution"""
+    insts = [{'prototype': 'a_inst', 'agentid': 1},
+             {'prototype': 'b_inst', 'agentid': 2}]
+    timestep = np.linspace(0, 5, 6)
+    entry_exit = [{'max(value)': 1000, 'parentid': 1,
+                   'entertime': 1, 'entertime + lifetime': 4},
+                  {'max(value)': 500, 'parentid': 1,
+                   'entertime': 2, 'entertime + lifetime': 10},
+                  {'max(value)': 2000, 'parentid': 2,
+                   'entertime': 0, 'entertime + lifetime': 3},
+                  {'max(value)': 300, 'parentid': 3,
+                   'entertime': 0, 'entertime + lifetime': 3}]
+    power = an.capacity_calc(insts, timestep, entry_exit)
+    assert list(power.keys()) == ['a_inst', 'b_inst']
+    assert np.allclose(power['a_inst'], [0, 1, 1.5, 1.5, 0.5, 0.5])
+    assert np.allclose(power['b_inst'], [2, 2, 2, 0, 0, 0])
+
+
+def test_reactor_deployments():
+    """Tests if reactor_deployments counts reactors entering
+       and exiting each institution"""
+    insts = [{'prototype': 'a_inst', 'agentid': 1},
+             {'prototype': 'b_inst', 'agentid': 2}]
+    timestep = np.linspace(0, 4, 5)
+    entry = [{'parentid': 1, 'entertime': 0},
+             {'parentid': 1, 'entertime': 0},
+             {'parentid': 2, 'entertime': 3}]
+    exit_step = [{'parentid': 1, 'exittime': 2}]
+    deployment = an.reactor_deployments(insts, timestep, entry, exit_step)
+    assert np.array_equal(deployment['a_inst'], [2, 2, 1, 1, 1])
+    assert np.array_equal(deployment['b_inst'], [0, 0, 0, 1, 1])
+
+
 def test_u_util_calc():
     """ Tests if u_util_calc function works properly """
     cur = get_sqlite_cursor()
@@ -160,6 +206,71 @@ def test_exec_string_commodity():
     assert string == answer
 
 
+def test_in_clause():
+    """Test if in_clause binds short lists as parameters"""
+    cur = get_sqlite_cursor()
+    condition, params = an.in_clause(cur, 'receiverid', ['12', '35'])
+    assert condition == 'receiverid IN (?, ?)'
+    assert params == ['12', '35']
+    with pytest.raises(Exception):
+        an.in_clause(cur, 'receiverid', [])
+
+
+def test_in_clause_temp_table():
+    """Test if in_clause joins long lists through a temporary table
+       and selects the same transactions as bound parameters"""
+    cur = get_sqlite_cursor()
+    agentids = an.agent_ids(cur, 'Reactor')
+    padded = agentids + [str(x) for x in range(10 ** 6, 10 ** 6 +
+                                                an.MAX_BOUND_PARAMETERS)]
+    condition, params = an.in_clause(cur, 'receiverid', padded)
+    assert params == []
+    assert 'SELECT value FROM temp.' in condition
+    query = 'SELECT count(*) FROM transactions WHERE '
+    from_table = cur.execute(query + condition, params).fetchone()[0]
+    condition, params = an.in_clause(cur, 'receiverid', agentids)
+    from_params = cur.execute(query + condition, params).fetchone()[0]
+    assert from_table == from_params
+    assert from_table > 0
+
+
+def test_resource_query():
+    """Test if resource_query returns the same rows as exec_string"""
+    cur = get_sqlite_cursor()
+    agentids = an.agent_ids(cur, 'Reactor')
+    query, params = an.resource_query(cur, agentids, 'receiverid',
+                                      'time, quantity')
+    answer = cur.execute(an.exec_string(agentids, 'receiverid',
+                                        'time, quantity')).fetchall()
+    x = cur.execute(query, params).fetchall()
+    assert sorted(tuple(row) for row in x) == \
+        sorted(tuple(row) for row in answer)
+
+
+def test_create_indexes(tmp_path):
+    """Test if create_indexes adds the analysis indexes once"""
+    db_file = str(tmp_path / 'indexed.sqlite')
+    shutil.copy(test_sqlite_path, db_file)
+    cur = an.cursor(db_file)
+    assert an.create_indexes(cur) == list(an.INDEXES.keys())
+    indexes = cur.execute('SELECT name FROM sqlite_master '
+                          'WHERE type = "index"').fetchall()
+    assert sorted(x['name'] for x in indexes) == sorted(an.INDEXES.keys())
+
+
+def test_cursor_read_only(tmp_path):
+    """Test if cursor leaves the output file unchanged"""
+    db_file = str(tmp_path / 'unchanged.sqlite')
+    shutil.copy(test_sqlite_path, db_file)
+    with open(db_file, 'rb') as f:
+        before = f.read()
+    cur = an.cursor(db_file)
+    an.agent_ids(cur, 'Reactor')
+    cur.connection.close()
+    with open(db_file, 'rb') as f:
+        assert f.read() == before
+
+
 def test_timeseries():
     """Test if get_timeseries returns the right timeseries list
        Given an in_list"""
@@ -168,7 +279,7 @@ def test_timeseries():
     x = an.timeseries(in_list, duration, False)
     answer = [0, 245, 0, 0, 0, 375, 0,
               0, 0, 0, 411, 0, 0]
-    assert x == answer
+    assert np.array_equal(x, answer)
 
 
 def test_kg_to_tons_no_cum():
@@ -180,7 +291,7 @@ def test_kg_to_tons_no_cum():
     answer = [0, 245, 0, 0, 0, 375, 0,
               0, 0, 0, 411, 0, 0]
     answer = [y * 0.001 for y in answer]
-    assert x == answer
+    assert np.allclose(x, answer)
 
 
 def test_timeseries_cum():
@@ -192,7 +303,7 @@ def test_timeseries_cum():
     answer = [0, 245, 245, 245, 245, 245 + 375, 245 + 375,
               245 + 375, 245 + 375, 245 + 375, 245 + 375 + 411,
               245 + 375 + 411, 245 + 375 + 411]
-    assert x == answer
+    assert np.array_equal(x, answer)
 
 
 def test_kg_to_tons_cum():
@@ -205,7 +316,48 @@ def test_kg_to_tons_cum():
               245 + 375, 245 + 375, 245 + 375, 245 + 375 + 411,
               245 + 375 + 411, 245 + 375 + 411]
     answer = [y * 0.001 for y in answer]
-    assert x == answer
+    assert np.allclose(x, answer)
+
+
+def test_bin_timeseries():
+    """Test if bin_timeseries sums repeated timesteps, ignores
+       data outside the simulation and returns zeros when empty"""
+    in_list = [[1, 245], [1, 5], [3, 375], [12, 411], [-1, 7]]
+    monthly, cumulative = an.bin_timeseries(in_list, 5, False)
+    assert np.array_equal(monthly, [0, 250, 0, 375, 0])
+    assert np.array_equal(cumulative, [0, 250, 250, 625, 625])
+    monthly, cumulative = an.bin_timeseries([], 3, True)
+    assert np.array_equal(monthly, np.zeros(3))
+    assert np.array_equal(cumulative, np.zeros(3))
+
+
+def test_isotope_matrix():
+    """Test if isotope_matrix bins the rows of each nuclide in order
+       of first appearance and ignores data outside the simulation"""
+    rows = [(1, 2.0, 922380000), (1, 1.0, 922350000), (3, 4.0, 922380000),
+            (1, 3.0, 922380000), (7, 5.0, 922350000)]
+    nuclides, monthly = an.isotope_matrix(rows, 4, False)
+    assert nuclides == ['U238', 'U235']
+    assert np.array_equal(monthly, [[0, 5, 0, 4], [0, 1, 0, 0]])
+    nuclides, monthly = an.isotope_matrix([], 4, True)
+    assert nuclides == []
+    assert monthly.shape == (0, 4)
+
+
+def test_isotope_flux_matrix():
+    """Test if isotope_flux_matrix gives the monthly values of
+       facility_commodity_flux_isotopics"""
+    cur = get_sqlite_cursor()
+    commodities = ['reprocess_waste', 'uox_Pu']
+    nuclides, monthly = an.isotope_flux_matrix(cur, ['27'], commodities,
+                                               True)
+    exp = an.facility_commodity_flux_isotopics(cur, ['27'], commodities,
+                                               True, False)
+    assert nuclides == list(exp)
+    for nuclide, row in zip(nuclides, monthly):
+        assert np.array_equal(row, exp[nuclide])
+    assert monthly[nuclides.index('U235'), 3] == pytest.approx(2.639e-05,
+                                                               abs=1e-8)
 
 
 def test_isotope_transactions():
@@ -308,6 +460,33 @@ def test_cumulative_mass_timeseries():
     for key in cumu_mass_series:
         assert key in answer_cumu_mass.keys()
 
+
+def test_isotope_mass_matrix():
+    """Test if isotope_mass_matrix holds the series of mass_timeseries,
+       each up to the last transaction of the isotope"""
+    cur = get_sqlite_cursor()
+    nuclides, monthly, lengths = an.isotope_mass_matrix(
+        cur, 'mox_fuel_fab', 'in')
+    assert nuclides == ['U235', 'U238', 'Pu238']
+    assert list(lengths) == [6, 6, 8]
+    assert monthly.shape == (3, 8)
+    assert monthly[2, 3:] == pytest.approx([19.96, 0, 29.94, 0, 19.96])
+    masstime, times = an.mass_timeseries(cur, 'mox_fuel_fab', 'in')
+    for nuclide, mass, length in zip(nuclides, monthly, lengths):
+        assert masstime[nuclide] == list(mass[:length])
+    assert times[0] == list(range(6))
+
+
+def test_isotope_mass_matrix_no_transactions():
+    """Test if isotope_mass_matrix is empty for a facility
+       without transactions"""
+    cur = get_sqlite_cursor()
+    nuclides, monthly, lengths = an.isotope_mass_matrix(
+        cur, 'mox_reprocessing', 'out')
+    assert nuclides == []
+    assert monthly.shape == (0, 0)
+    assert an.total_isotope_used(cur, 'mox_reprocessing') == {}
+
         
 @pytest.mark.skip(reason='assertion error to be fixed later')
 def test_powerseries_reactor():
@@ -1,5 +1,8 @@
 import unittest
 import numpy as np
+import os
+import shutil
+import tempfile
 from pandas._testing import assert_frame_equal
 from pandas._testing import assert_series_equal
 import sys
@@ -155,6 +158,62 @@ class Test_static_info(unittest.TestCase):
         obs = di.get_lifetime('./', 'ANO-1')
         assert exp == obs
 
+    def test_read_fields(self):
+        '''
+        Test for the power and lifetime of the ANO-1 prototype, and for a
+        field that is not in the file
+        '''
+        obs = di.read_fields('./ANO-1.xml',
+                             dict(di.REACTOR_FIELDS, missing=('facility', 'x')))
+        assert obs == {'power_cap': '836', 'lifetime': '717',
+                       'missing': None}
+
+    def test_reactor_fields_index(self):
+        '''
+        Test that the values of the prototype files are kept in the index
+        and that a changed file is read again
+        '''
+        directory = tempfile.mkdtemp()
+        index_directory = di.index_directory
+        di.index_directory = os.path.join(directory, 'index')
+        try:
+            shutil.copy('./ANO-1.xml', directory)
+            exp = {'ANO-1.xml': {'power_cap': '836', 'lifetime': '717'}}
+            assert di.reactor_fields(directory) == exp
+            assert os.path.exists(di.index_file(directory))
+            assert sorted(os.listdir(directory)) == ['ANO-1.xml', 'index']
+            with open('./ANO-1.xml', 'r') as f:
+                content = f.read().replace('717', '720')
+            with open(os.path.join(directory, 'ANO-1.xml'), 'w') as f:
+                f.write(content + '\n')
+            assert di.get_lifetime(directory + '/', 'ANO-1') == 720
+        finally:
+            di.index_directory = index_directory
+            shutil.rmtree(directory)
+
+    def test_load_index(self):
+        '''
+        Test that the index of a directory is loaded once and loaded
+        again once it changes
+        '''
+        directory = tempfile.mkdtemp()
+        index_directory = di.index_directory
+        di.index_directory = os.path.join(directory, 'index')
+        try:
+            shutil.copy('./ANO-1.xml', directory)
+            di.reactor_fields(directory)
+            index_file = di.index_file(directory)
+            index = di.load_index(index_file)
+            assert di.load_index(index_file) is index
+            with open(index_file, 'w') as f:
+                f.write('{}')
+            assert di.load_index(index_file) == {}
+            assert di.get_lifetimes(directory + '/', ['ANO-1']) == \
+                {'ANO-1': 717}
+        finally:
+            di.index_directory = index_directory
+            shutil.rmtree(directory)
+
     def test_get_deployed_power(self):
         '''
         Test the power deployed as specific points in time,
@@ -174,6 +233,25 @@ class Test_static_info(unittest.TestCase):
         assert 0 == obs2[900]
         assert np.all(exp1 == obs1)
 
+    def test_get_deployed_power_stacked(self):
+        '''
+        Test the power deployed by multiple DeployInsts at once, with the
+        second DeployInst having twice the lifetime of each reactor
+        '''
+        extended = dict(self.deployed_reactor_dict)
+        extended['lifetime'] = [
+            2 * x for x in self.deployed_reactor_dict['lifetime']]
+        exp_t, exp1 = di.get_deployed_power(
+            self.power_dict, self.deployed_reactor_dict, 1000)
+        exp_t, exp2 = di.get_deployed_power(
+            self.power_dict, extended, 1000)
+        obs_t, obs = di.get_deployed_power(
+            self.power_dict, [self.deployed_reactor_dict, extended], 1000)
+        assert obs.shape == (2, 1000)
+        assert np.all(exp1 == obs[0])
+        assert np.all(exp2 == obs[1])
+        assert np.all(exp_t == obs_t)
+
     def test_determine_power_gap(self):
         '''
         Test agains a power demand of 2500 across the whole simulation
@@ -547,6 +625,23 @@ class Test_static_info(unittest.TestCase):
                                                {'Type2': 50})
         assert exp == obs
 
+    def test_determine_deployment_schedules(self):
+        '''
+        Tests that the schedules for multiple power gaps match the schedule
+        of each gap on its own, and that the gaps are not modified.
+        '''
+        gaps = np.array([np.repeat(440, 10), np.repeat(595, 10)])
+        exp = [
+            di.determine_deployment_schedule(
+                np.repeat(440, 10), self.reactor_prototypes, {'Type2': 50}),
+            di.determine_deployment_schedule(
+                np.repeat(595, 10), self.reactor_prototypes, {'Type2': 50})]
+        obs = di.determine_deployment_schedules(
+            gaps, self.reactor_prototypes, {'Type2': 50})
+        assert exp == obs
+        assert (gaps == np.array([np.repeat(440, 10),
+                                  np.repeat(595, 10)])).all()
+
     def test_write_lwr_deployinst(self):
         '''
         Test combination of functions to create a DeployInst of LWRs when
@@ -567,6 +662,119 @@ class Test_static_info(unittest.TestCase):
         assert obs['DeployInst']['lifetimes']['val'][100] == 960
         assert obs['DeployInst']['lifetimes']['val'][89] == 720
 
+    def test_lwr_deployinst(self):
+        '''
+        Test that the LWR DeployInst created from the parsed files is the
+        one of write_lwr_deployinst and that the parsed DeployInst is not
+        modified.
+        '''
+        args = ("../../scenarios/haleu/inputs/united_states/" +
+                "buildtimes/UNITED_STATES_OF_AMERICA/deployinst.xml",
+                "../../database/lwr_power_order.txt")
+        parsed = di.read_lwr_deployinst(*args)
+        obs = di.lwr_deployinst(50, *parsed)
+        exp = di.write_lwr_deployinst(50, *args)
+        assert obs['DeployInst']['prototypes'] == \
+            exp['DeployInst']['prototypes']
+        assert (obs['DeployInst']['lifetimes']['val'] ==
+                exp['DeployInst']['lifetimes']['val']).all()
+        assert 'lifetimes' not in parsed[0]['DeployInst']
+
+    def test_write_lwr_deployinst_cached(self):
+        '''
+        Test that a DeployInst built from the parsed files cached on disk
+        is the same as the first one, and that changing the returned
+        DeployInst does not change the cached one.
+        '''
+        directory = tempfile.mkdtemp()
+        parse_cache_directory = di.parse_cache_directory
+        di.parse_cache_directory = directory
+        di._parsed.clear()
+        try:
+            args = ("../../scenarios/haleu/inputs/united_states/" +
+                    "buildtimes/UNITED_STATES_OF_AMERICA/deployinst.xml",
+                    "../../database/lwr_power_order.txt")
+            exp = di.write_lwr_deployinst(10.0, *args)
+            exp['DeployInst']['prototypes']['val'][0] = 'changed'
+            assert len(os.listdir(directory)) == 1
+            di._parsed.clear()
+            obs = di.write_lwr_deployinst(20.0, *args)
+            assert obs['DeployInst']['prototypes']['val'][0] != 'changed'
+            assert obs['DeployInst']['lifetimes']['val'][39] == 960
+            assert obs['DeployInst']['lifetimes']['val'][89] == 960
+        finally:
+            di.parse_cache_directory = parse_cache_directory
+            shutil.rmtree(directory)
+
+    def test_cached_parse_file_changed(self):
+        '''
+        Test that a file is parsed again once its contents change.
+        '''
+        directory = tempfile.mkdtemp()
+        parse_cache_directory = di.parse_cache_directory
+        di.parse_cache_directory = directory
+        try:
+            filename = os.path.join(directory, 'order.txt')
+            with open(filename, 'w') as f:
+                f.write('a')
+            obs = di.cached_parse(lambda x: open(x).read(), [filename])
+            assert obs == 'a'
+            with open(filename, 'w') as f:
+                f.write('b')
+            obs = di.cached_parse(lambda x: open(x).read(), [filename])
+            assert obs == 'b'
+        finally:
+            di.parse_cache_directory = parse_cache_directory
+            shutil.rmtree(directory)
+
+    def test_cached_parse_function_changed(self):
+        '''
+        Test that the files are parsed again by a new version of the
+        parse function with the same name.
+        '''
+        directory = tempfile.mkdtemp()
+        parse_cache_directory = di.parse_cache_directory
+        di.parse_cache_directory = directory
+        try:
+            filename = os.path.join(directory, 'order.txt')
+            with open(filename, 'w') as f:
+                f.write('a')
+
+            def parse(x):
+                return open(x).read()
+            assert di.cached_parse(parse, [filename]) == 'a'
+            di._parsed.clear()
+
+            def parse(x):
+                return open(x).read().upper()
+            assert di.cached_parse(parse, [filename]) == 'A'
+        finally:
+            di.parse_cache_directory = parse_cache_directory
+            shutil.rmtree(directory)
+
+    def test_prune_parse_cache(self):
+        '''
+        Test that the least recently used pickles are removed once the
+        cache directory is too large.
+        '''
+        directory = tempfile.mkdtemp()
+        parse_cache_directory = di.parse_cache_directory
+        max_parse_cache_bytes = di.max_parse_cache_bytes
+        di.parse_cache_directory = directory
+        try:
+            for name in ['a', 'b', 'c']:
+                with open(os.path.join(directory, name + '.pkl'), 'wb') as f:
+                    f.write(b'x' * 10)
+                os.utime(os.path.join(directory, name + '.pkl'),
+                         (0, ord(name)))
+            di.max_parse_cache_bytes = 20
+            di.prune_parse_cache(keep=os.path.join(directory, 'a.pkl'))
+            assert sorted(os.listdir(directory)) == ['a.pkl', 'c.pkl']
+        finally:
+            di.parse_cache_directory = parse_cache_directory
+            di.max_parse_cache_bytes = max_parse_cache_bytes
+            shutil.rmtree(directory)
+
     def test_write_AR_deployinst1(self):
         '''
         Test creation of AR DeployInst for a demand of 1000 MWe starting in
@@ -0,0 +1,138 @@
+import unittest
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+from unittest import mock
+
+sys.path.insert(0, '../')
+import cyclus_runner as cr
+
+# Stands in for cyclus: copies a finished test database to the output
+# file, or fails if the input file contains 'fail'.
+STUB = '''#!{python}
+import shutil
+import sys
+input_xml = sys.argv[sys.argv.index('-i') + 1]
+output_sqlite = sys.argv[sys.argv.index('-o') + 1]
+print('running', input_xml)
+with open(input_xml) as f:
+    if 'fail' in f.read():
+        sys.exit(1)
+shutil.copy({database!r}, output_sqlite)
+'''
+
+
+class Test_cyclus_runner(unittest.TestCase):
+    def setUp(self):
+        '''
+        Creates a stub executable that copies the decommission test
+        output file in place of running Cyclus, and three input files,
+        the last of which makes the stub fail.
+        '''
+        self.directory = tempfile.mkdtemp()
+        self.executable = os.path.join(self.directory, 'cyclus')
+        with open(self.executable, 'w') as f:
+            f.write(STUB.format(
+                python=sys.executable,
+                database=os.path.abspath(
+                    'transition_metrics_decommission_test.sqlite')))
+        os.chmod(self.executable, os.stat(self.executable).st_mode |
+                 stat.S_IEXEC)
+        self.jobs = []
+        for name, content in [('a', 'ok'), ('b', 'ok'), ('c', 'fail')]:
+            input_xml = os.path.join(self.directory, name + '.xml')
+            with open(input_xml, 'w') as f:
+                f.write(content)
+            self.jobs.append((input_xml,
+                              os.path.join(self.directory, 'out',
+                                           name + '.sqlite')))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_valid_output(self):
+        assert cr.valid_output('transition_metrics_decommission_test.sqlite')
+        assert not cr.valid_output(os.path.join(self.directory, 'x.sqlite'))
+        empty = os.path.join(self.directory, 'empty.sqlite')
+        open(empty, 'w').close()
+        assert not cr.valid_output(empty)
+        assert not cr.valid_output(self.jobs[0][0])
+
+    def test_partial_file(self):
+        self.assertEqual(cr.partial_file('out/run.sqlite'),
+                         'out/run.partial.sqlite')
+
+    def test_cyclus_command(self):
+        self.assertEqual(cr.cyclus_command('in.xml', 'out.sqlite',
+                                           args=['--warn-limit', '2']),
+                         ['cyclus', '-i', 'in.xml', '-o', 'out.sqlite',
+                          '--warn-limit', '2'])
+
+    def test_run_jobs(self):
+        timings = os.path.join(self.directory, 'timings.json')
+        results = cr.run_jobs(self.jobs, 2, executable=self.executable,
+                              timings_file=timings)
+        self.assertEqual([x['status'] for x in results],
+                         ['ran', 'ran', 'failed'])
+        self.assertEqual([x['output'] for x in results],
+                         [x[1] for x in self.jobs])
+        assert cr.valid_output(self.jobs[0][1])
+        assert not os.path.exists(self.jobs[2][1])
+        assert not os.path.exists(cr.partial_file(self.jobs[2][1]))
+        with open(results[0]['log']) as f:
+            self.assertIn('running ' + self.jobs[0][0], f.read())
+        with open(timings) as f:
+            self.assertEqual(len([json.loads(x) for x in f]), 3)
+
+    def test_run_jobs_default_workers(self):
+        executor = cr.concurrent.futures.ThreadPoolExecutor
+        with mock.patch.object(cr.concurrent.futures, 'ThreadPoolExecutor',
+                               side_effect=executor) as pool:
+            results = cr.run_jobs(self.jobs[:1], executable=self.executable)
+        pool.assert_called_once_with(os.cpu_count() or 1)
+        self.assertEqual(results[0]['status'], 'ran')
+
+    def test_run_jobs_resume(self):
+        '''
+        Tests that finished jobs are skipped and that the temporary
+        output of an interrupted job is replaced
+        '''
+        cr.run_jobs(self.jobs[:1], 1, executable=self.executable)
+        partial = cr.partial_file(self.jobs[1][1])
+        with open(partial, 'w') as f:
+            f.write('interrupted')
+        results = cr.run_jobs(self.jobs[:2], 1, executable=self.executable)
+        self.assertEqual([x['status'] for x in results], ['skipped', 'ran'])
+        assert cr.valid_output(self.jobs[1][1])
+        assert not os.path.exists(partial)
+
+    def test_run_jobs_overwrite(self):
+        cr.run_jobs(self.jobs[:1], 1, executable=self.executable)
+        results = cr.run_jobs(self.jobs[:1], 1, executable=self.executable,
+                              overwrite=True)
+        self.assertEqual(results[0]['status'], 'ran')
+
+    def test_run_jobs_log_dir(self):
+        log_dir = os.path.join(self.directory, 'logs')
+        results = cr.run_jobs(self.jobs[:1], 1, executable=self.executable,
+                              log_dir=log_dir)
+        self.assertEqual(results[0]['log'], os.path.join(log_dir, 'a.log'))
+        assert os.path.exists(results[0]['log'])
+
+    def test_main_output_dir(self):
+        output_dir = os.path.join(self.directory, 'outputs')
+        failed = cr.main(2, [x[0] for x in self.jobs[:2]], output_dir,
+                         executable=self.executable)
+        self.assertEqual(failed, 0)
+        self.assertEqual(sorted(x for x in os.listdir(output_dir)
+                                if x.endswith('.sqlite')),
+                         ['a.sqlite', 'b.sqlite'])
+
+    def test_run_jobs_missing_executable(self):
+        results = cr.run_jobs(self.jobs[:1], 1, executable=os.path.join(
+            self.directory, 'missing'))
+        self.assertEqual(results[0]['status'], 'failed')
+        self.assertIsNone(results[0]['returncode'])
@@ -0,0 +1,149 @@
+import unittest
+import os
+import shutil
+import stat
+import sys
+import tempfile
+
+sys.path.insert(0, '../')
+import dakota_batch as dkb
+import output_metrics as oup
+import run_cache as rc
+
+RESPONSES = [{'name': 'enr_u', 'metric': 'enriched_u',
+              'prototypes': ['Reactor_type1', 'Reactor_type2'],
+              'commodity': 'fresh_uox', 'transition_start': 1}]
+
+
+class Response(object):
+    function = None
+
+
+class Results(object):
+    '''
+    Holds the responses of one point, like dakota.interfacing.Results
+    '''
+    def __init__(self, descriptors):
+        self.descriptors = descriptors
+        self.responses = {x: Response() for x in descriptors}
+        self.failed = False
+
+    def __getitem__(self, name):
+        return self.responses[name]
+
+    def fail(self):
+        self.failed = True
+
+
+class BatchResults(list):
+    written = False
+
+    def write(self):
+        self.written = True
+
+
+class Test_dakota_batch(unittest.TestCase):
+    def setUp(self):
+        '''
+        Creates a stub executable that copies the decommission test
+        output file in place of running Cyclus and counts its calls,
+        and an empty run cache.
+        '''
+        self.directory = tempfile.mkdtemp()
+        self.database = os.path.abspath(
+            'transition_metrics_decommission_test.sqlite')
+        self.calls = os.path.join(self.directory, 'calls')
+        self.executable = os.path.join(self.directory, 'cyclus')
+        with open(self.executable, 'w') as f:
+            f.write('#!' + sys.executable + '\n'
+                    'import shutil, sys\n'
+                    'if sys.argv[1] == "--version":\n'
+                    '    print("stub")\n'
+                    '    sys.exit()\n'
+                    'open(' + repr(self.calls) + ', "a").write("x")\n'
+                    'if "fail" in open(sys.argv[2]).read():\n'
+                    '    sys.exit(1)\n'
+                    'shutil.copy(' + repr(self.database) +
+                    ', sys.argv[sys.argv.index("-o") + 1])\n')
+        os.chmod(self.executable, os.stat(self.executable).st_mode |
+                 stat.S_IEXEC)
+        self.cache_directory = rc.cache_directory
+        rc.cache_directory = os.path.join(self.directory, 'cache')
+
+    def tearDown(self):
+        rc.cache_directory = self.cache_directory
+        shutil.rmtree(self.directory)
+
+    def prepare(self, params):
+        name = dkb.scenario_name(params, ['lwr', 'share'])
+        input_xml = os.path.join(self.directory, name + '.xml')
+        with open(input_xml, 'w') as f:
+            f.write('<simulation>' + params.get('content', name) +
+                    '</simulation>')
+        return input_xml, os.path.join(self.directory, name + '.sqlite')
+
+    def number_of_calls(self):
+        with open(self.calls) as f:
+            return len(f.read())
+
+    def test_scenario_name(self):
+        params = {'lwr': 10.0, 'mmr_share': 42.7}
+        self.assertEqual(dkb.scenario_name(params, ['lwr', 'mmr_share']),
+                         'lwr_10_mmr_share_42')
+        self.assertEqual(dkb.variable_dict(params, ['lwr', 'mmr_share']),
+                         {'lwr': '10', 'mmr_share': '42'})
+
+    def test_evaluation_concurrency(self):
+        dakota_input = os.path.join(self.directory, 'dakota.in')
+        with open(dakota_input, 'w') as f:
+            f.write('interface\n  fork\n    asynchronous\n'
+                    '      evaluation_concurrency =  36\n'
+                    '    analysis_drivers = \'python driver.py\'\n')
+        self.assertEqual(dkb.evaluation_concurrency(dakota_input), 36)
+        with open(dakota_input, 'w') as f:
+            f.write('interface\n  batch\n    size = 48\n'
+                    '#  evaluation_concurrency = 4\n')
+        self.assertIsNone(dkb.evaluation_concurrency(dakota_input))
+
+    def test_write_responses(self):
+        results = dkb.write_responses(Results(['enr_u']), self.database,
+                                      RESPONSES)
+        exp = oup.MetricsSession(self.database).evaluate(RESPONSES[0])
+        self.assertEqual(results['enr_u'].function, exp)
+
+    def test_write_responses_unknown(self):
+        with self.assertRaises(ValueError):
+            dkb.write_responses(Results(['swu']), self.database, RESPONSES)
+
+    def test_run_batch(self):
+        '''
+        Tests that points rendering the same scenario are simulated once
+        and that failed points are reported to Dakota
+        '''
+        batch_params = [{'lwr': 1, 'share': 2.2}, {'lwr': 1, 'share': 2.9},
+                        {'lwr': 3, 'share': 0, 'content': 'lwr_1_share_2'},
+                        {'lwr': 4, 'share': 0, 'content': 'fail'}]
+        batch_results = BatchResults(Results(['enr_u'])
+                                     for x in batch_params)
+        dkb.run_batch(batch_params, batch_results, self.prepare, 2,
+                      RESPONSES, remove_outputs=True,
+                      executable=self.executable)
+        exp = oup.MetricsSession(self.database).evaluate(RESPONSES[0])
+        self.assertEqual([x['enr_u'].function for x in batch_results],
+                         [exp, exp, exp, None])
+        self.assertEqual([x.failed for x in batch_results],
+                         [False, False, False, True])
+        assert batch_results.written
+        self.assertEqual(self.number_of_calls(), 3)
+        assert not os.path.exists(
+            os.path.join(self.directory, 'lwr_1_share_2.sqlite'))
+
+    def test_run_jobs_cache(self):
+        jobs = [self.prepare({'lwr': 1, 'share': 2})]
+        self.assertEqual(dkb.run_jobs(jobs, executable=self.executable),
+                         set())
+        os.remove(jobs[0][1])
+        self.assertEqual(dkb.run_jobs(jobs, executable=self.executable),
+                         set())
+        assert os.path.exists(jobs[0][1])
+        self.assertEqual(self.number_of_calls(), 1)
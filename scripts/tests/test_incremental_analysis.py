@@ -0,0 +1,108 @@
+import unittest
+import os
+import shutil
+import sqlite3
+import tempfile
+import numpy as np
+import sys
+
+sys.path.insert(0, '../')
+import incremental_analysis as ia
+
+
+class Test_incremental_analysis(unittest.TestCase):
+    def setUp(self):
+        '''
+        Copies the test output file into a temporary directory and
+        removes its transactions and power after timestep 3, as if the
+        simulation was still running
+        '''
+        self.directory = tempfile.mkdtemp()
+        self.output_file = os.path.join(self.directory, 'test.sqlite')
+        shutil.copy('test.sqlite', self.output_file)
+        self.full = ia.IncrementalStore('test.sqlite')
+        self.full.refresh()
+        self.con = sqlite3.connect(self.output_file)
+        self.transactions = self.con.execute(
+            'SELECT * FROM Transactions WHERE Time > 3').fetchall()
+        self.power = self.con.execute(
+            'SELECT * FROM TimeSeriesPower WHERE Time > 3').fetchall()
+        self.con.execute('DELETE FROM Transactions WHERE Time > 3')
+        self.con.execute('DELETE FROM TimeSeriesPower WHERE Time > 3')
+        self.con.commit()
+
+    def tearDown(self):
+        self.con.close()
+        shutil.rmtree(self.directory)
+
+    def finish_simulation(self):
+        self.con.executemany('INSERT INTO Transactions VALUES '
+                             '(?, ?, ?, ?, ?, ?, ?)', self.transactions)
+        self.con.executemany('INSERT INTO TimeSeriesPower VALUES '
+                             '(?, ?, ?, ?)', self.power)
+        self.con.commit()
+
+    def test_refresh(self):
+        '''
+        Test that the cumulative series extended with the rows written
+        after the first refresh are the same as when the whole output
+        file is read at once
+        '''
+        store = ia.IncrementalStore(self.output_file)
+        store.refresh()
+        assert store.high_water_mark['Time'] == 3
+        partial = store.commodity_flux('uox', receivers=['lwr'])
+        assert partial[-1] < self.full.commodity_flux('uox')[-1]
+        store.power_timeseries(is_cum=True)
+
+        self.finish_simulation()
+        assert store.refresh() > 0
+        assert store.high_water_mark == self.full.high_water_mark
+        for commodity in ['uox', 'uox_Pu', 'tailings']:
+            for is_cum in [True, False]:
+                assert np.array_equal(
+                    store.commodity_flux(commodity, is_cum=is_cum),
+                    self.full.commodity_flux(commodity, is_cum=is_cum))
+        assert np.array_equal(store.commodity_flux('uox', receivers=['lwr']),
+                              self.full.commodity_flux('uox',
+                                                       receivers=['lwr']))
+        assert np.array_equal(store.power_timeseries(is_cum=True),
+                              self.full.power_timeseries(is_cum=True))
+        assert store.refresh() == 0
+
+    def test_refresh_missing_resource(self):
+        '''
+        Test that a transaction whose resource is not written yet is
+        left for the next refresh
+        '''
+        store = ia.IncrementalStore(self.output_file)
+        store.refresh()
+        mark = store.high_water_mark['TransactionId']
+        resource = self.con.execute(
+            'SELECT * FROM Resources WHERE ResourceId = ?',
+            [self.transactions[0][4]]).fetchall()
+        self.con.execute('DELETE FROM Resources WHERE ResourceId = ?',
+                         [self.transactions[0][4]])
+        self.finish_simulation()
+        store.refresh()
+        assert store.high_water_mark['TransactionId'] == mark
+
+        self.con.executemany('INSERT INTO Resources VALUES (' +
+                             ', '.join('?' * len(resource[0])) + ')',
+                             resource)
+        self.con.commit()
+        store.refresh()
+        assert np.array_equal(store.commodity_flux('uox'),
+                              self.full.commodity_flux('uox'))
+
+    def test_new_simulation(self):
+        store = ia.get_store(self.output_file)
+        assert ia.get_store(self.output_file) is store
+        store.refresh()
+        self.finish_simulation()
+        self.con.execute("UPDATE Info SET SimId = x'00'")
+        self.con.commit()
+        store.refresh()
+        assert store.sim_id == b'\x00'
+        assert np.array_equal(store.commodity_flux('uox'),
+                              self.full.commodity_flux('uox'))
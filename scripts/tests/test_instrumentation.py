@@ -0,0 +1,85 @@
+import unittest
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import numpy as np
+import sys
+
+sys.path.insert(0, '../')
+import instrumentation as ins
+import create_AR_DeployInst as di
+import output_metrics as oup
+import table_cache as tc
+
+
+class Test_instrumentation(unittest.TestCase):
+    def setUp(self):
+        '''
+        Defines a power gap and reactor prototypes to deploy, and the
+        output file rows are read from
+        '''
+        self.power_gap = np.array([0, 100, 200, 150, 300])
+        self.reactor_prototypes = {'Reactor1': (50, 3),
+                                   'Reactor2': (100, 4)}
+        self.output_file = 'transition_metrics_decommission_test.sqlite'
+        self.persist = tc.persist
+        tc.persist = False
+        tc.invalidate(remove_files=False)
+
+    def tearDown(self):
+        tc.persist = self.persist
+        tc.invalidate(remove_files=False)
+
+    def test_profile_nesting(self):
+        '''
+        Test that the calls made by an instrumented function are recorded
+        as its children, and that the original functions are put back
+        '''
+        original = di.determine_deployment_schedule
+        with ins.profile([di]) as report:
+            assert di.determine_deployment_schedule is not original
+            exp = di.determine_deployment_schedule(self.power_gap.copy(),
+                                                   self.reactor_prototypes)
+        assert di.determine_deployment_schedule is original
+        assert sqlite3.connect is ins._connect
+        assert exp == original(self.power_gap.copy(),
+                               self.reactor_prototypes)
+
+        calls = {x['function']: x for x in report.records}
+        parent = calls['create_AR_DeployInst.determine_deployment_schedule']
+        child = calls['create_AR_DeployInst.determine_deployment_order']
+        assert parent['parent'] is None
+        assert child['parent'] == parent['call']
+        assert child['depth'] == parent['depth'] + 1
+        assert child['wall_time'] <= parent['wall_time']
+        assert child['peak_memory'] <= parent['peak_memory']
+        assert report.table().splitlines()[1].startswith(
+            'create_AR_DeployInst.determine_deployment_schedule')
+
+    def test_profile_rows(self):
+        exp = len(tc.read_table(self.output_file, 'AgentEntry'))
+        with ins.profile([oup], memory=False) as report:
+            oup.get_table_from_output(self.output_file, 'AgentEntry')
+        assert report.records[0]['rows'] == exp
+        assert report.records[0]['peak_memory'] is None
+
+    def test_environment(self):
+        '''
+        Test that setting TRANSITION_PROFILE writes the calls of a
+        process to a JSON lines file
+        '''
+        directory = tempfile.mkdtemp()
+        output = os.path.join(directory, 'profile.jsonl')
+        env = dict(os.environ, TRANSITION_PROFILE=output)
+        subprocess.run([sys.executable, '-c',
+                        'import create_AR_DeployInst as di; '
+                        'di.determine_deployment_order({"a": (1, 2)})'],
+                       cwd='../', env=env, check=True)
+        with open(output) as f:
+            records = [json.loads(line) for line in f]
+        shutil.rmtree(directory)
+        assert [x['function'] for x in records] == \
+            ['create_AR_DeployInst.determine_deployment_order']
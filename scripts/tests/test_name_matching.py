@@ -0,0 +1,51 @@
+import unittest
+import itertools
+import numpy as np
+import sys
+
+sys.path.insert(0, '../')
+import name_matching as nm
+from fuzzywuzzy import fuzz
+
+
+class Test_name_matching(unittest.TestCase):
+    def setUp(self):
+        '''
+        Defines sanitized PRIS and webscrape names and an edge case
+        '''
+        self.pris_names = ['ohi', 'beaver valley', 'beaver valley',
+                           'grand gulf', 'ano-1', '', 'xyz']
+        self.web_names = ['beaver valley', 'grand gulf', 'ōi',
+                          'arkansas one', 'beaver vally', '']
+        self.edge_cases = {'OHI-': 'Ōi', 'ANO-': 'Arkansas One'}
+
+    def test_ratio_bound(self):
+        '''
+        Test that the bound is never below fuzz.ratio
+        '''
+        bound = nm.ratio_bound(self.web_names, self.pris_names)
+        for (i, left), (j, right) in itertools.product(
+                enumerate(self.web_names), enumerate(self.pris_names)):
+            assert fuzz.ratio(left, right) <= bound[i, j] + 0.5
+
+    def test_ratio_above(self):
+        exp = np.array([[fuzz.ratio(left, right) > 78
+                         for right in self.pris_names]
+                        for left in self.web_names])
+        obs = nm.unique_ratio_above(self.web_names, self.pris_names, 78)
+        assert (exp == obs).all()
+
+    def test_last_match(self):
+        '''
+        Test that both copies of Beaver Valley get the last matching
+        record, that the edge cases are matched, and that empty names
+        match each other, as with fuzz.ratio
+        '''
+        exp = [2, 4, 4, 1, 3, 5, -1]
+        obs = nm.last_match(self.pris_names, self.web_names,
+                            self.edge_cases, 78)
+        assert exp == list(obs)
+
+    def test_last_match_empty(self):
+        obs = nm.last_match(self.pris_names, [], self.edge_cases, 78)
+        assert list(obs) == [-1] * 7
@@ -2,6 +2,10 @@ import unittest
 import numpy as np
 import pandas as pd
 import math
+import os
+import shutil
+import stat
+import tempfile
 from pandas._testing import assert_frame_equal
 from pandas._testing import assert_series_equal
 import sys
@@ -401,3 +405,138 @@ class Test_static_info(unittest.TestCase):
             self.output_file1, [
                 'Reactor_type1', 'Reactor_type2'], 4, self.wastes)
         assert exp == obs
+
+    def test_metrics_session_transactions(self):
+        '''
+        Test that the session transactions have the prototypes of both the
+        receiver and the sender, matching add_receiver_prototype and
+        add_sender_prototype.
+        '''
+        session = oup.MetricsSession(self.output_file1)
+        receiver = oup.add_receiver_prototype(self.output_file1)
+        sender = oup.add_sender_prototype(self.output_file1)
+        obs = session.transactions
+        assert_series_equal(obs['ReceiverPrototype'],
+                            receiver['ReceiverPrototype'])
+        assert_series_equal(obs['SenderPrototype'],
+                            sender['SenderPrototype'])
+        assert session.transactions is obs
+
+    def test_metrics_session_evaluate_all(self):
+        '''
+        Test that the response definitions give the same values as the
+        individual metric functions.
+        '''
+        responses = [
+            {'name': 'enr_u', 'metric': 'enriched_u',
+             'prototypes': ['Reactor_type1', 'Reactor_type2'],
+             'commodity': 'fresh_uox', 'transition_start': 4},
+            {'name': 'swu', 'metric': 'swu',
+             'prototypes': ['Reactor_type2'], 'commodity': 'fresh_uox',
+             'assays': self.assays, 'transition_start': 4},
+            {'name': 'feed', 'metric': 'feed',
+             'prototypes': ['Reactor_type2'], 'commodity': 'fresh_uox',
+             'assays': self.assays, 'transition_start': 4},
+            {'name': 'waste', 'metric': 'waste',
+             'prototypes': ['Reactor_type1', 'Reactor_type2'],
+             'commodity': self.wastes, 'transition_start': 4}]
+        exp = {'enr_u': oup.get_enriched_u_mass(
+                   self.output_file1, ['Reactor_type1', 'Reactor_type2'], 4),
+               'swu': oup.calculate_swu(
+                   self.output_file1, ['Reactor_type2'], 4, self.assays),
+               'feed': oup.calculate_feed(
+                   self.output_file1, ['Reactor_type2'], 4, self.assays),
+               'waste': oup.get_waste_discharged(
+                   self.output_file1, ['Reactor_type1', 'Reactor_type2'], 4,
+                   self.wastes)}
+        obs = oup.MetricsSession(self.output_file1).evaluate_all(responses)
+        assert exp == obs
+
+    def test_metrics_session_unknown_metric(self):
+        '''
+        Test that an unknown metric in a response definition raises an error.
+        '''
+        session = oup.MetricsSession(self.output_file1)
+        with self.assertRaises(ValueError):
+            session.evaluate({'name': 'x', 'metric': 'cost',
+                              'prototypes': ['Reactor_type1'],
+                              'transition_start': 4})
+
+    def test_get_streamed_prototype_transactions(self):
+        '''
+        Test that streaming the transactions in chunks gives the same
+        masses as get_multiple_prototype_transactions.
+        '''
+        prototypes = ['Reactor_type1', 'Reactor_type2', 'Reactor_type3']
+        exp = oup.get_multiple_prototype_transactions(
+            self.output_file1, prototypes, 'fresh_uox')
+        obs = oup.get_streamed_prototype_transactions(
+            self.output_file1, prototypes, 'fresh_uox', chunksize=1)
+        assert_frame_equal(exp, obs)
+
+    def test_stream_prototype_transactions(self):
+        '''
+        Test that each chunk has at most chunksize rows of summed
+        transactions sent from the prototype.
+        '''
+        chunks = list(oup.stream_prototype_transactions(
+            self.output_file1, ['Reactor_type2'], 'spent_uox',
+            receiver=False, chunksize=2))
+        assert all(len(chunk) <= 2 for chunk in chunks)
+        obs = pd.concat(chunks)
+        assert list(obs.columns) == ['Time', 'Prototype', 'Quantity']
+        assert obs['Time'].is_monotonic_increasing
+        assert obs['Time'].is_unique
+
+    def test_metrics_session_chunksize(self):
+        '''
+        Test that a streaming session gives the same metrics as a session
+        using the merged transactions.
+        '''
+        prototypes = ['Reactor_type1', 'Reactor_type2']
+        exp = oup.MetricsSession(self.output_file1)
+        obs = oup.MetricsSession(self.output_file1, chunksize=2)
+        assert exp.enriched_u_mass(prototypes, 1) == \
+            obs.enriched_u_mass(prototypes, 1)
+        assert exp.waste_discharged(prototypes, 4, self.wastes) == \
+            obs.waste_discharged(prototypes, 4, self.wastes)
+        assert obs._transactions is None
+
+    def test_run_cyclus_cache(self):
+        '''
+        Test that a second run of an identical input is served from the run
+        cache, using a stub that copies a test output in place of cyclus and
+        counts how often it is called.
+        '''
+        directory = tempfile.mkdtemp()
+        cyclus = oup.cr.CYCLUS
+        cache_directory = oup.rc.cache_directory
+        try:
+            oup.rc.cache_directory = os.path.join(directory, 'cache')
+            oup.cr.CYCLUS = os.path.join(directory, 'cyclus')
+            with open(oup.cr.CYCLUS, 'w') as f:
+                f.write('#!' + sys.executable + '\n'
+                        'import shutil, sys\n'
+                        'if sys.argv[1] == "--version":\n'
+                        '    print("stub")\n'
+                        '    sys.exit()\n'
+                        'open(' + repr(os.path.join(directory, 'calls')) +
+                        ', "a").write("x")\n'
+                        'shutil.copy(' + repr(os.path.abspath(
+                            self.output_file1)) +
+                        ', sys.argv[sys.argv.index("-o") + 1])\n')
+            os.chmod(oup.cr.CYCLUS, os.stat(oup.cr.CYCLUS).st_mode |
+                     stat.S_IEXEC)
+            for name in ['a', 'b']:
+                with open(os.path.join(directory, name + '.xml'), 'w') as f:
+                    f.write('<simulation><control/></simulation>')
+                oup.run_cyclus(os.path.join(directory, name + '.sqlite'),
+                               os.path.join(directory, name + '.xml'))
+                assert oup.cr.valid_output(
+                    os.path.join(directory, name + '.sqlite'))
+            with open(os.path.join(directory, 'calls')) as f:
+                assert f.read() == 'x'
+        finally:
+            oup.cr.CYCLUS = cyclus
+            oup.rc.cache_directory = cache_directory
+            shutil.rmtree(directory)
@@ -0,0 +1,198 @@
+import unittest
+import jinja2
+import numpy as np
+import os
+import pandas as pd
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, '../')
+import predicting_the_past_import as pp
+
+
+class Test_predicting_the_past_import(unittest.TestCase):
+    def setUp(self):
+        '''
+        Defines PRIS data of reactors in and out of the United States,
+        which are deployed or not for a simulation starting in 1970, and
+        a temporary directory for the rendered files
+        '''
+        self.start_year = 1970
+        self.pris = pd.DataFrame({
+            'Country': ['UNITED STATES OF AMERICA', 'United States of America',
+                        'FRANCE', 'UNITED STATES OF AMERICA',
+                        'UNITED STATES OF AMERICA', 'UNITED STATES OF AMERICA',
+                        'UNITED STATES OF AMERICA', 'UNITED STATES OF AMERICA',
+                        'UNITED STATES OF AMERICA'],
+            'Unit': ['Open', 'Mixed Case', 'Fessenheim', 'Small', 'Cut',
+                     'Closed', 'Closed At Start', 'Not ISO', 'No Date'],
+            'Type': ['PWR'] * 9,
+            'RUP [MWe]': [1000, 1000, 1000, 400, 401, 1000, 1000, 1000,
+                          1000],
+            'Grid Date': ['1974-12-01', '1974-12-01', '1977-04-06',
+                          '1974-12-01', '1974-12-01', '1960-08-01',
+                          '1960-08-01', 'March 5, 1972', 'unknown'],
+            'Shutdown Date': [np.nan, np.nan, np.nan, np.nan, np.nan,
+                              '1968-05-01', '1970-05-01', '2030-01-01',
+                              np.nan]})
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def select(self, region='united_states'):
+        return list(pp.select_region(self.pris, region,
+                                     self.start_year)['Unit'])
+
+    def test_select_region(self):
+        '''
+        Test that the countries of the region are selected, whatever the
+        case of their names
+        '''
+        assert self.select() == ['Open', 'Mixed Case', 'Cut', 'Not ISO']
+        assert self.select('EUROPE') == ['Fessenheim']
+        assert self.select('ALL') == ['Open', 'Mixed Case', 'Fessenheim',
+                                      'Cut', 'Not ISO']
+
+    def test_select_region_invalid_region(self):
+        with self.assertRaises(ValueError):
+            self.select('ATLANTIS')
+
+    def test_select_region_capacity(self):
+        '''
+        Test that only reactors above 400 MWe are selected
+        '''
+        obs = self.select()
+        assert 'Small' not in obs
+        assert 'Cut' in obs
+
+    def test_select_region_shutdown(self):
+        '''
+        Test that reactors shut down before or during the start year are
+        not selected, and that reactors without a shutdown date are
+        '''
+        obs = self.select()
+        assert 'Closed' not in obs
+        assert 'Closed At Start' not in obs
+        assert 'Open' in obs
+        row = pp.select_region(self.pris, 'UNITED_STATES',
+                               self.start_year).iloc[0]
+        assert row['Shutdown Date'] == ''
+        assert row['RUP [MWe]'] == '1000'
+
+    def test_select_region_start_date(self):
+        '''
+        Test that a grid date that is not in the YYYY-MM-DD format is
+        parsed by parse_date, and that a reactor whose grid date is not
+        a date is not selected
+        '''
+        pp.parse_date.cache_clear()
+        obs = self.select()
+        assert 'Not ISO' in obs
+        assert 'No Date' not in obs
+        assert pp.parse_date.cache_info().misses == 2
+        assert pp.parse_date('March 5, 1972').year == 1972
+        assert pp.parse_date.cache_info().hits == 1
+
+    def test_select_region_invalid_shutdown(self):
+        self.pris.loc[0, 'Shutdown Date'] = 'not a date'
+        with self.assertRaises(ValueError):
+            self.select()
+
+    def test_parse_dates(self):
+        obs = pp.parse_dates(pd.Series(['1974-12-01', 'March 5, 1972',
+                                        'unknown']))
+        assert obs[0] == pd.Timestamp(1974, 12, 1)
+        assert obs[1] == pd.Timestamp(1972, 3, 5)
+        assert pd.isna(obs[2])
+
+    def test_write_if_changed_unchanged(self):
+        '''
+        Test that a file holding the same content is not written again
+        and keeps its modification time
+        '''
+        path = self.write('a.xml', '<a/>')
+        os.utime(path, ns=(0, 0))
+        assert not pp.write_if_changed(path, '<a/>')
+        assert os.stat(path).st_mtime_ns == 0
+
+    def test_write_if_changed_changed(self):
+        path = self.write('a.xml', '<a/>')
+        os.utime(path, ns=(0, 0))
+        assert pp.write_if_changed(path, '<b/>')
+        assert os.stat(path).st_mtime_ns != 0
+        with open(path) as f:
+            assert f.read() == '<b/>'
+        assert pp.write_if_changed(os.path.join(self.directory, 'c.xml'),
+                                   '<c/>')
+
+    def test_render_files(self):
+        '''
+        Test that only the files whose rendered content changed are
+        written
+        '''
+        template = jinja2.Template('<{{ name }}/>')
+        files = {self.write('a.xml', '<a/>'): {'name': 'a'},
+                 self.write('b.xml', '<a/>'): {'name': 'b'},
+                 os.path.join(self.directory, 'c.xml'): {'name': 'c'}}
+        obs = pp.render_files(template, files, max_workers=2)
+        assert obs == [os.path.join(self.directory, 'b.xml'),
+                       os.path.join(self.directory, 'c.xml')]
+        for name in ['a', 'b', 'c']:
+            with open(os.path.join(self.directory, name + '.xml')) as f:
+                assert f.read() == '<' + name + '/>'
+        assert pp.render_files(template, files) == []
+
+    def test_reactor_type_parameters(self):
+        '''
+        Test the core of a type in REACTOR_TYPES and of a type that
+        is not, which gets DEFAULT_REACTOR_TYPE
+        '''
+        assert pp.reactor_type_parameters('PHWR') == (390, 8, 80000 / 390)
+        assert pp.reactor_type_parameters('BWR') == (732, 244, 138000 / 732)
+        assert pp.reactor_type_parameters('PWR') == (241, 80, 103000 / 241)
+
+    def test_write_deployment(self):
+        '''
+        Test that the reactors are grouped by country regardless of the
+        case of its name, and that unchanged files are not written again
+        '''
+        deployinst = self.write(
+            'deployinst.xml.in',
+            '{% for name, time in reactors.items() %}'
+            '{{ name }} {{ time }}\n{% endfor %}')
+        inclusions = self.write(
+            'inclusions.xml.in',
+            '{% for name in reactors %}{{ name }}\n{% endfor %}')
+        out_path = os.path.join(self.directory, 'deployment')
+        reactors = {'Fessenheim_1': ('France', 90),
+                    'Bugey_2': ('FRANCE', 50),
+                    'Ohi_1': ('JAPAN', 100)}
+        pp.write_deployment(reactors, out_path, deployinst, inclusions)
+        assert sorted(os.listdir(out_path)) == ['FRANCE', 'France', 'JAPAN',
+                                                'inclusions.xml']
+        for nation in ['France', 'FRANCE']:
+            with open(os.path.join(out_path, nation,
+                                   'deployinst.xml')) as f:
+                assert f.read() == 'Fessenheim_1 90\nBugey_2 50\n'
+        with open(os.path.join(out_path, 'JAPAN', 'deployinst.xml')) as f:
+            assert f.read() == 'Ohi_1 100\n'
+        with open(os.path.join(out_path, 'inclusions.xml')) as f:
+            assert f.read() == 'Fessenheim_1\nBugey_2\nOhi_1\n'
+
+        files = [os.path.join(out_path, nation, 'deployinst.xml')
+                 for nation in ['France', 'FRANCE', 'JAPAN']] + \
+            [os.path.join(out_path, 'inclusions.xml')]
+        for path in files:
+            os.utime(path, ns=(0, 0))
+        pp.write_deployment(reactors, out_path + '/', deployinst,
+                            inclusions)
+        assert [os.stat(path).st_mtime_ns for path in files] == \
+            [0] * len(files)
@@ -183,6 +183,64 @@ def test_num_react_to_cap():
                for i in range(len(react_to_cap_df['manual_cap'])))
 
 
+def test_column_values():
+    """
+    Test that whole numbers are returned to an integer column and other
+    values are left as floats.
+    """
+    whole = dep.column_values(np.array([1.0, 2.0]), np.dtype(int))
+    assert whole.dtype == np.dtype(int)
+    assert whole.tolist() == [1, 2]
+
+    fraction = dep.column_values(np.array([1.0, 2.5]), np.dtype(int))
+    assert fraction.dtype == np.dtype(float)
+
+    floats = dep.column_values(np.array([1.0, 2.0]), np.dtype(float))
+    assert floats.dtype == np.dtype(float)
+
+
+def test_decommission_engine():
+    """
+    Test that reactors are replaced at the end of every lifetime, including
+    the replacements themselves.
+    """
+    counts = np.array([[1., 0., 2., 0., 0., 0., 0.],
+                       [0., 3., 0., 0., 0., 0., 0.]])
+    decom = dep.decommission_engine(counts, [2, 3])
+
+    assert counts.tolist() == [[1, 0, 3, 0, 3, 0, 3],
+                               [0, 3, 0, 0, 3, 0, 0]]
+    assert decom.tolist() == [[0, 0, 1, 0, 3, 0, 3],
+                              [0, 0, 0, 0, 3, 0, 0]]
+
+
+def test_direct_decommission_columns():
+    """
+    Test that the direct decommissioning function writes the decommissioned
+    and replacement reactors to the dataframe.
+    """
+    df = pd.DataFrame({'Year': [2016, 2017, 2018, 2019, 2020],
+                       'num_ReactorBig': [1, 0, 0, 0, 0]})
+    df = dep.direct_decommission(df, {'ReactorBig': [80, 1, 2]})
+
+    assert df['num_ReactorBig'].tolist() == [1, 0, 1, 0, 1]
+    assert df['ReactorBigDecom'].tolist() == [0, 0, 1, 0, 1]
+    assert df['ReactorBigDecom'].dtype == np.dtype(int)
+
+
+def test_greedy_engine():
+    """
+    Test that the greedy engine reduces the capacity to meet over the
+    lifetime of every deployed reactor.
+    """
+    capacity = np.array([100., 100., 110., 20.])
+    counts = np.zeros((2, 4))
+    dep.greedy_engine(capacity, counts, [80, 20], [1, 0], 0)
+
+    assert counts.tolist() == [[1, 0, 1, 0], [1, 1, 1, 0]]
+    assert capacity.tolist() == [0, 0, 10, -60]
+
+
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 # # # # # # # # # # # # Deployment Functions # # # # # # # # # # #
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -0,0 +1,164 @@
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, '../')
+import run_cache as rc
+
+INPUT = '''<simulation xml:base="{base}"
+    xmlns:xi="http://www.w3.org/2001/XInclude">
+  <control><duration>10</duration></control>
+  <xi:include href="{reactor}#xpointer(/inclusions/child::*)"/>
+</simulation>
+'''
+
+
+class Test_run_cache(unittest.TestCase):
+    def setUp(self):
+        '''
+        Creates a temporary cache and two copies of an input file with
+        an XIncluded reactor file, which only differ in the names and
+        location of the files.
+        '''
+        self.directory = tempfile.mkdtemp()
+        self.cache_directory = rc.cache_directory
+        self.max_cache_bytes = rc.max_cache_bytes
+        self.hardlink = rc.hardlink
+        rc.cache_directory = os.path.join(self.directory, 'cache')
+        self.inputs = []
+        for name in ['a', 'b']:
+            os.makedirs(os.path.join(self.directory, name, 'reactors'))
+            self.write(os.path.join(name, 'reactors', name + '_lwr.xml'),
+                       '<inclusions><facility>lwr</facility></inclusions>')
+            self.inputs.append(self.write(
+                name + '.xml',
+                INPUT.format(base=name + '/',
+                             reactor='reactors/' + name + '_lwr.xml')))
+        self.database = 'transition_metrics_decommission_test.sqlite'
+
+    def tearDown(self):
+        rc.cache_directory = self.cache_directory
+        rc.max_cache_bytes = self.max_cache_bytes
+        rc.hardlink = self.hardlink
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_file_digest_same_contents(self):
+        self.assertEqual(rc.file_digest(self.inputs[0]),
+                         rc.file_digest(self.inputs[1]))
+
+    def test_file_digest_included_file_changed(self):
+        exp = rc.file_digest(self.inputs[0])
+        self.write(os.path.join('b', 'reactors', 'b_lwr.xml'),
+                   '<inclusions><facility>sfr</facility></inclusions>')
+        self.assertNotEqual(exp, rc.file_digest(self.inputs[1]))
+
+    def test_file_digest_missing_include(self):
+        os.remove(os.path.join(self.directory, 'a', 'reactors', 'a_lwr.xml'))
+        with self.assertRaises(OSError):
+            rc.file_digest(self.inputs[0])
+
+    def cyclus(self, version):
+        path = self.write('cyclus', '#!' + sys.executable + '\n'
+                          'print(' + repr(version) + ')\n')
+        os.chmod(path, 0o755)
+        os.utime(path, ns=(0, int(version.replace('.', ''))))
+        return path
+
+    def test_input_digest_same_version(self):
+        cyclus = self.cyclus('1.5.5')
+        self.assertEqual(rc.input_digest(self.inputs[0], cyclus),
+                         rc.input_digest(self.inputs[1], cyclus))
+
+    def test_input_digest_version_changed(self):
+        exp = rc.input_digest(self.inputs[0], self.cyclus('1.5.5'))
+        self.assertEqual(rc.cyclus_version(self.cyclus('1.6.0')), '1.6.0\n')
+        self.assertNotEqual(
+            exp, rc.input_digest(self.inputs[0], self.cyclus('1.6.0')))
+
+    def test_input_digest_missing_executable(self):
+        self.assertIsNone(rc.input_digest(
+            self.inputs[0], os.path.join(self.directory, 'cyclus')))
+
+    def test_store_fetch(self):
+        digest = rc.file_digest(self.inputs[0])
+        output = os.path.join(self.directory, 'out', 'a.sqlite')
+        self.assertFalse(rc.fetch(digest, output))
+        shutil.copy(self.database, os.path.join(self.directory, 'run.sqlite'))
+        self.assertTrue(rc.store(digest,
+                                 os.path.join(self.directory, 'run.sqlite')))
+        self.assertTrue(rc.fetch(rc.file_digest(self.inputs[1]), output))
+        self.assertTrue(rc.valid_entry(output))
+
+    def test_store_unfinished(self):
+        output = self.write('run.sqlite', '')
+        self.assertFalse(rc.store('0' * 64, output))
+        self.assertFalse(os.path.exists(rc.entry_file('0' * 64)))
+
+    def test_fetch_corrupted(self):
+        os.makedirs(rc.cache_directory)
+        with open(self.database, 'rb') as f:
+            content = f.read()
+        with open(rc.entry_file('0' * 64), 'wb') as f:
+            f.write(content[:len(content) // 2])
+        output = os.path.join(self.directory, 'a.sqlite')
+        self.assertFalse(rc.fetch('0' * 64, output))
+        self.assertFalse(os.path.exists(rc.entry_file('0' * 64)))
+        self.assertFalse(os.path.exists(output))
+
+    def test_evict(self):
+        for digest in ['1' * 64, '2' * 64, '3' * 64]:
+            output = os.path.join(self.directory, digest[0] + '.sqlite')
+            shutil.copy(self.database, output)
+            rc.store(digest, output)
+            os.utime(rc.entry_file(digest), (0, int(digest[0])))
+        rc.max_cache_bytes = 2 * os.path.getsize(self.database)
+        rc.evict()
+        self.assertEqual(sorted(os.listdir(rc.cache_directory)),
+                         ['2' * 64 + '.sqlite', '3' * 64 + '.sqlite'])
+
+    def test_fetch_copy(self):
+        output = os.path.join(self.directory, 'run.sqlite')
+        shutil.copy(self.database, output)
+        rc.store('0' * 64, output)
+        entry = rc.entry_file('0' * 64)
+        mtime = os.stat(entry).st_mtime_ns
+        fetched = os.path.join(self.directory, 'a.sqlite')
+        self.assertTrue(rc.fetch('0' * 64, fetched))
+        self.assertFalse(os.path.samefile(entry, output))
+        self.assertFalse(os.path.samefile(entry, fetched))
+        self.assertEqual(os.stat(entry).st_mtime_ns, mtime)
+        with open(fetched, 'ab') as f:
+            f.write(b'modified')
+        self.assertTrue(rc.valid_entry(entry))
+
+    def test_fetch_hardlink(self):
+        rc.hardlink = True
+        output = os.path.join(self.directory, 'run.sqlite')
+        shutil.copy(self.database, output)
+        rc.store('0' * 64, output)
+        mtime = os.stat(output).st_mtime_ns
+        fetched = os.path.join(self.directory, 'a.sqlite')
+        self.assertTrue(rc.fetch('0' * 64, fetched))
+        self.assertTrue(os.path.samefile(output, fetched))
+        self.assertEqual(os.stat(output).st_mtime_ns, mtime)
+
+    def test_evict_last_used(self):
+        for digest in ['1' * 64, '2' * 64]:
+            output = os.path.join(self.directory, digest[0] + '.sqlite')
+            shutil.copy(self.database, output)
+            rc.store(digest, output)
+            os.utime(rc.entry_file(digest), (0, int(digest[0])))
+        self.assertTrue(rc.fetch('1' * 64,
+                                 os.path.join(self.directory, 'a.sqlite')))
+        rc.max_cache_bytes = os.path.getsize(self.database)
+        rc.evict()
+        self.assertEqual(sorted(os.listdir(rc.cache_directory)),
+                         ['1' * 64 + '.sqlite', '1' * 64 + '.used'])
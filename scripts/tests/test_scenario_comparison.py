@@ -0,0 +1,96 @@
+import unittest
+import numpy as np
+import sys
+
+sys.path.insert(0, '../')
+import scenario_comparison as sc
+
+
+class Test_scenario_comparison(unittest.TestCase):
+    def setUp(self):
+        '''
+        Defines the output database and the commodities it holds
+        '''
+        self.general_sqlite = 'transition_metrics_'
+        self.output_file = 'transition_metrics_decommission_test.sqlite'
+        self.commods = ['power', 'fresh_uox', 'spent_uox']
+
+    def test_supply_demand_query(self):
+        exp = ('SELECT 0, time, sum(value) FROM "TimeSeriespower" '
+               'GROUP BY time UNION ALL '
+               'SELECT 1, time, sum(value) FROM "TimeSeriessupplyuox" '
+               'GROUP BY time UNION ALL '
+               'SELECT 3, time, sum(value) FROM "TimeSeriesdemanduox" '
+               'GROUP BY time')
+        assert exp == sc.supply_demand_query(['power', 'uox'])
+
+    def test_supply_demand_arrays(self):
+        supply, demand = sc.supply_demand_arrays(
+            self.output_file, self.commods, demand_eq='100 + t')
+        assert supply.shape == (3, 7)
+        assert demand.shape == (3, 7)
+        assert list(supply[0]) == [0, 1200, 120, 120, 0, 0, 0]
+        assert list(demand[0]) == [100, 101, 102, 103, 104, 105, 106]
+        assert list(demand[1]) == [0, 297000, 62700, 33000, 3300, 0, 0]
+        assert list(supply[2]) == [0, 0, 33000, 201300, 23100, 19800, 0]
+        assert (demand[2] == 1e299).all()
+
+    def test_undersupply(self):
+        supply = np.array([[1., 2., 3.], [1., 2., 3.]])
+        demand = np.array([[2., 2., 2.], [2., 2., 2.]])
+        undersupplied, diff = sc.undersupply(supply, demand, [True, False],
+                                             demand_driven=False)
+        assert undersupplied.tolist() == [[True, False, False],
+                                          [False, False, True]]
+        assert diff.tolist() == [[-1, 0, 1], [-1, 0, 1]]
+
+    def test_compare_methods(self):
+        '''
+        Test that the results are the same in parallel processes and in
+        the calling process
+        '''
+        methods = ['decommission_test', 'nodecommission_test']
+        obs = sc.compare_methods(self.general_sqlite, methods,
+                                 self.commods, demand_eq='1000',
+                                 max_workers=2)
+        exp = sc.compare_methods(self.general_sqlite, methods,
+                                 self.commods, demand_eq='1000',
+                                 max_workers=1)
+        for method in methods:
+            assert (obs[method][0] == exp[method][0]).all()
+            assert (obs[method][1] == exp[method][1]).all()
+        undersupplied, diff = obs['decommission_test']
+        assert np.flatnonzero(undersupplied[0]).tolist() == [0, 2, 3, 4, 5, 6]
+        assert not undersupplied[1].any()
+        assert undersupplied[2].all()
+
+    def test_dict_arrays(self):
+        all_dict = {'dict_demand': {0: 1., 1: 2.5, 2: 3.},
+                    'dict_supply': {2: 1., 1: 3., 0: 1.}}
+        times, supply, demand = sc.dict_arrays(all_dict)
+        assert times == [0, 1, 2]
+        assert list(supply) == [1, 3, 1]
+        assert list(demand) == [1, 2.5, 3]
+
+    def test_undersupply_stats(self):
+        undersupplied = np.array([[0, 1, 1, 0, 1, 1, 1, 0],
+                                  [0, 0, 0, 0, 0, 0, 0, 0],
+                                  [1, 1, 1, 1, 1, 1, 1, 1]], dtype=bool)
+        diff = np.arange(24.).reshape(3, 8) - 10
+        obs = sc.undersupply_stats(undersupplied, diff)
+        assert list(obs['count']) == [5, 0, 8]
+        assert list(obs['longest']) == [3, 0, 8]
+        assert list(obs['first']) == [1, -1, 0]
+        assert list(obs['last']) == [6, -1, 7]
+        assert list(obs['magnitude']) == [32, 0, 76]
+        assert list(obs['max_magnitude']) == [9, 0, 13]
+
+    def test_undersupply_stats_no_timesteps(self):
+        obs = sc.undersupply_stats(np.zeros((2, 0), dtype=bool),
+                                   np.zeros((2, 0)))
+        assert list(obs['count']) == [0, 0]
+        assert list(obs['longest']) == [0, 0]
+        assert list(obs['first']) == [-1, -1]
+        assert list(obs['last']) == [-1, -1]
+        assert list(obs['magnitude']) == [0, 0]
+        assert list(obs['max_magnitude']) == [0, 0]
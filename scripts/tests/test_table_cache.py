@@ -0,0 +1,116 @@
+import unittest
+import os
+import shutil
+import tempfile
+from pandas._testing import assert_frame_equal
+import sys
+
+sys.path.insert(0, '../')
+import table_cache as tc
+
+
+class Test_table_cache(unittest.TestCase):
+    def setUp(self):
+        '''
+        Copies the decommission test output file into a temporary
+        directory, writes the Feather files in another temporary
+        directory, and empties the in-memory cache.
+        '''
+        self.directory = tempfile.mkdtemp()
+        self.output_file = os.path.join(
+            self.directory, 'transition_metrics_decommission_test.sqlite')
+        shutil.copy('transition_metrics_decommission_test.sqlite',
+                    self.output_file)
+        tc.invalidate(remove_files=False)
+        self.max_cache_bytes = tc.max_cache_bytes
+        self.max_disk_bytes = tc.max_disk_bytes
+        self.cache_root = tc.cache_root
+        tc.cache_root = os.path.join(self.directory, 'tables')
+
+    def tearDown(self):
+        tc.invalidate(remove_files=False)
+        tc.max_cache_bytes = self.max_cache_bytes
+        tc.max_disk_bytes = self.max_disk_bytes
+        tc.cache_root = self.cache_root
+        shutil.rmtree(self.directory)
+
+    def test_get_table(self):
+        exp = tc.read_table(self.output_file, 'Transactions')
+        obs = tc.get_table(self.output_file, 'Transactions')
+        assert_frame_equal(exp, obs)
+        assert tc.get_table(self.output_file, 'Transactions') is obs
+
+    def test_get_table_resources_columns(self):
+        obs = tc.get_table(self.output_file, 'Resources')
+        self.assertEqual(list(obs.columns),
+                         ['SimId', 'ResourceId', 'ObjId', 'TimeCreated',
+                          'Quantity', 'Units'])
+
+    def test_modified_database(self):
+        obs1 = tc.get_table(self.output_file, 'AgentEntry')
+        stat = os.stat(self.output_file)
+        os.utime(self.output_file, ns=(stat.st_atime_ns,
+                                       stat.st_mtime_ns + 10 ** 9))
+        obs2 = tc.get_table(self.output_file, 'AgentEntry')
+        assert obs1 is not obs2
+        assert_frame_equal(obs1, obs2)
+
+    def test_invalidate(self):
+        tc.get_table(self.output_file, 'AgentEntry')
+        tc.get_table(self.output_file, 'Info')
+        tc.invalidate(self.output_file)
+        self.assertEqual(tc.cached_tables(), [])
+        self.assertEqual(tc._cache_bytes, 0)
+
+    def test_eviction(self):
+        path = os.path.abspath(self.output_file)
+        tc.max_cache_bytes = 1
+        tc.get_table(self.output_file, 'AgentEntry')
+        tc.get_table(self.output_file, 'Info')
+        self.assertEqual(tc.cached_tables(), [(path, 'Info')])
+
+    def test_eviction_least_recently_used(self):
+        path = os.path.abspath(self.output_file)
+        tc.get_table(self.output_file, 'AgentEntry')
+        tc.get_table(self.output_file, 'Info')
+        tc.get_table(self.output_file, 'AgentEntry')
+        self.assertEqual(tc.cached_tables(), [(path, 'Info'),
+                                              (path, 'AgentEntry')])
+        tc.max_cache_bytes = tc._cache_bytes
+        tc.get_table(self.output_file, 'AgentExit')
+        self.assertNotIn((path, 'Info'), tc.cached_tables())
+        self.assertIn((path, 'AgentExit'), tc.cached_tables())
+
+    @unittest.skipIf(tc.feather is None, 'pyarrow is not installed')
+    def test_feather_file(self):
+        exp = tc.get_table(self.output_file, 'TimeSeriesPower')
+        key = tc.database_key(self.output_file)
+        self.assertTrue(os.path.exists(
+            tc.feather_file(key, 'TimeSeriesPower')))
+        tc.invalidate(self.output_file, remove_files=False)
+        assert_frame_equal(exp, tc.load_feather(key, 'TimeSeriesPower'))
+        assert_frame_equal(exp,
+                           tc.get_table(self.output_file, 'TimeSeriesPower'))
+        tc.invalidate(self.output_file)
+        self.assertFalse(os.path.exists(
+            tc.feather_file(key, 'TimeSeriesPower')))
+
+    @unittest.skipIf(tc.feather is None, 'pyarrow is not installed')
+    def test_feather_file_outside_database_directory(self):
+        tc.get_table(self.output_file, 'AgentEntry')
+        key = tc.database_key(self.output_file)
+        path = tc.feather_file(key, 'AgentEntry')
+        self.assertEqual(os.path.dirname(os.path.dirname(path)),
+                         tc.cache_root)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['tables',
+                          'transition_metrics_decommission_test.sqlite'])
+
+    @unittest.skipIf(tc.feather is None, 'pyarrow is not installed')
+    def test_evict_files(self):
+        key = tc.database_key(self.output_file)
+        tc.max_disk_bytes = 1
+        tc.get_table(self.output_file, 'AgentEntry')
+        tc.get_table(self.output_file, 'Info')
+        self.assertFalse(os.path.exists(tc.feather_file(key, 'AgentEntry')))
+        self.assertTrue(os.path.exists(tc.feather_file(key, 'Info')))
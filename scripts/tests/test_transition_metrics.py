@@ -47,6 +47,29 @@ class Test_static_info(unittest.TestCase):
         obs = tm.get_metrics(self.output_file1)
         assert isinstance(obs, cymetric.evaluator.Evaluator)
 
+    def test_get_metrics_reused(self):
+        obs1 = tm.get_metrics(self.output_file1)
+        obs2 = tm.get_metrics(self.output_file1)
+        assert obs1 is obs2
+        assert tm.get_metrics(obs1) is obs1
+
+    def test_get_metrics_eviction(self):
+        max_evaluators = tm.max_evaluators
+        tm.max_evaluators = 1
+        try:
+            obs1 = tm.get_metrics(self.output_file1)
+            obs2 = tm.get_metrics(self.output_file2)
+            assert obs1 is not obs2
+            assert tm.get_metrics(self.output_file1) is not obs1
+        finally:
+            tm.max_evaluators = max_evaluators
+            tm.release_metrics()
+
+    def test_release_metrics(self):
+        obs = tm.get_metrics(self.output_file1)
+        tm.release_metrics(self.output_file1)
+        assert tm.get_metrics(self.output_file1) is not obs
+
     def test_get_lwr_totals1(self):
         '''
         This tests get_lwr_totals when the reactors
@@ -228,6 +251,16 @@ class Test_static_info(unittest.TestCase):
         obs = tm.get_annual_electricity(self.output_file1)
         assert_frame_equal(exp, obs)
 
+    def test_get_annual_electricity_repeated(self):
+        '''
+        Tests that calling the function again with the same Evaluator
+        does not shift the years of the cached metric
+        '''
+        evaler = tm.get_metrics(self.output_file1)
+        exp = tm.get_annual_electricity(evaler)
+        obs = tm.get_annual_electricity(evaler)
+        assert_frame_equal(exp, obs)
+
     def test_get_prototype_energy1(self):
         '''
         Tests function when the queried prototype is in the dataframe
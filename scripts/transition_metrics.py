@@ -1,34 +1,77 @@
+import collections
 import numpy as np
 import pandas as pd
 import math
 
 import dataframe_analysis as dfa
+import table_cache as tc
+import instrumentation as ins
 import cymetric as cym
 from cymetric import tools
 from cymetric import timeseries
 from cymetric import filters
 
+# number of databases whose Evaluator is kept open
+max_evaluators = 8
+
+_evaluators = collections.OrderedDict()
+
 
 def get_metrics(db_file):
     '''
-    Opens database using cymetric and evaluates metrics
+    Opens database using cymetric and evaluates metrics. One Evaluator
+    is kept per database, so metrics such as Agents or Transactions are
+    only computed once per database. The least recently used Evaluator
+    is dropped when more than max_evaluators databases are open, and a
+    database modified since it was opened gets a new Evaluator.
+
+    The DataFrames returned by the Evaluator are cached by it and
+    must be copied before they are modified.
 
     Parameters
     ----------
-    db_file: str
-        SQLite database from Cyclus
+    db_file: str or Evaluator
+        SQLite database from Cyclus, or an already open Evaluator,
+        which is returned unchanged
 
     Returns
     -------
     metrics_evaler: Evaluator object
         contains all of the metrics of the database
     '''
+    if isinstance(db_file, cym.Evaluator):
+        return db_file
+    key = tc.database_key(db_file)
+    entry = _evaluators.get(key[0])
+    if entry is not None and entry[0] == key:
+        _evaluators.move_to_end(key[0])
+        return entry[1]
 
     db = cym.dbopen(db_file)
     metrics_evaler = cym.Evaluator(db, write=False)
+    _evaluators[key[0]] = (key, metrics_evaler)
+    _evaluators.move_to_end(key[0])
+    while len(_evaluators) > max_evaluators:
+        _evaluators.popitem(last=False)
     return metrics_evaler
 
 
+def release_metrics(db_file=None):
+    '''
+    Drops the Evaluator kept for a database, or all Evaluators if
+    db_file is None
+
+    Parameters
+    ----------
+    db_file: str, optional
+        SQLite database from Cyclus
+    '''
+    if db_file is None:
+        _evaluators.clear()
+    else:
+        _evaluators.pop(tc.database_key(db_file)[0], None)
+
+
 def get_lwr_totals(db_file, non_lwr_prototypes):
     '''
     Creates DataFrame with the number of each prototype
@@ -42,7 +85,7 @@ def get_lwr_totals(db_file, non_lwr_prototypes):
 
     Parameters
     ----------
-    db_file: str
+    db_file: str or Evaluator
         SQLite database from Cyclus
     non_lwr_prototypes: list of str
         names of non LWR prototypes in the simulation
@@ -121,7 +164,7 @@ def get_prototype_totals(db_file, non_lwr_prototypes, prototypes):
 
     Parameters
     ----------
-    db_file: str
+    db_file: str or Evaluator
         name of SQLite database from Cyclus
     non_lwr_prototypes: list of str
         names of non LWR prototypes in the simulation
@@ -171,7 +214,7 @@ def add_receiver_prototype(db_file):
 
     Parameters
     ----------
-    db_file: str
+    db_file: str or Evaluator
         SQLite database from Cyclus
 
     Returns
@@ -209,7 +252,7 @@ def add_sender_prototype(db_file):
 
     Parameters
     ----------
-    db_file: str
+    db_file: str or Evaluator
         SQLite database from Cyclus
 
     Returns
@@ -244,7 +287,7 @@ def get_annual_electricity(db_file, y0=1958):
 
     Parameters
     ----------
-    db_file: str
+    db_file: str or Evaluator
         SQLite database from Cyclus
     y0: int
         year to start the time series
@@ -258,7 +301,7 @@ def get_annual_electricity(db_file, y0=1958):
         operation.
     '''
     evaler = get_metrics(db_file)
-    electricity = evaler.eval('AnnualElectricityGeneratedByAgent')
+    electricity = evaler.eval('AnnualElectricityGeneratedByAgent').copy()
     electricity['Year'] = electricity['Year'] + y0
     electricity_output = electricity.groupby(
         ['Year']).Energy.sum().reset_index()
@@ -274,7 +317,7 @@ def get_monthly_electricity(db_file, y0=1958):
 
     Parameters
     ----------
-    db_file: str
+    db_file: str or Evaluator
         SQLite database from Cyclus
 
     Returns
@@ -286,7 +329,7 @@ def get_monthly_electricity(db_file, y0=1958):
         operation.
     '''
     evaler = get_metrics(db_file)
-    electricity = evaler.eval('MonthlyElectricityGeneratedByAgent')
+    electricity = evaler.eval('MonthlyElectricityGeneratedByAgent').copy()
     electricity['Year'] = electricity['Month'] / 12 + y0
     electricity_output = electricity.groupby(
         ['Year']).Energy.sum().reset_index()
@@ -303,7 +346,7 @@ def get_prototype_energy(db_file, advanced_rx, y0=1985, yn=2104):
 
     Parameters
     ----------
-    db_file: str
+    db_file: str or Evaluator
         SQLite database from Cyclus
     advanced_rx: str
         name of advanced reactor prototype
@@ -337,7 +380,7 @@ def get_lwr_energy(db_file, advanced_rx, y0=1985, yn=2104):
 
     Parameters
     ----------
-    db_file: str
+    db_file: str or Evaluator
         SQLite database from Cyclus
     advanced_rx: list of str
         name(s) of advanced reactor prototype also present in the simulation
@@ -361,3 +404,6 @@ def get_lwr_energy(db_file, advanced_rx, y0=1985, yn=2104):
         range(y0, yn)).fillna(0).reset_index()
     lwr_energy['Energy'] = lwr_energy['Energy'] / 1000
     return lwr_energy
+
+
+ins.instrument_from_environment(__name__)
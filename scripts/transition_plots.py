@@ -4,6 +4,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 from textwrap import wrap
 import seaborn as sns
+import scenario_comparison as sc
 
 
 def format_agent_dict(output_file, simple=True):
@@ -269,12 +270,8 @@ def supplydemanddiff(all_dict):
         between supply and demand.
     """
 
-    dict_demand = all_dict['dict_demand']
-    dict_supply = all_dict['dict_supply']
-    diff_dict = {}
-    for key in dict_demand:
-        diff_dict[key] = dict_supply[key] - dict_demand[key]
-    return diff_dict
+    times, supply, demand = sc.dict_arrays(all_dict)
+    return dict(zip(times, supply - demand))
 
 
 def get_undersupply_timesteps(
@@ -325,19 +322,13 @@ def get_undersupply_timesteps(
         else:
             all_dict = tester.supply_demand_dict_nondriving(
                 output_file, commod, False, calc=False)
-    diff_dict = supplydemanddiff(all_dict)
-    dict_dots = {}
-    diff_dict_drop = {}
-    for key in diff_dict:
-        if demand_driving:
-            if diff_dict[key] < 0:
-                dict_dots[key] = 1
-                diff_dict_drop[key] = diff_dict[key]
-
-        else:
-            if diff_dict[key] > 0:
-                dict_dots[key] = 1
-                diff_dict_drop[key] = diff_dict[key]
+    times, supply, demand = sc.dict_arrays(all_dict)
+    undersupplied, diff = sc.undersupply(supply[None], demand[None],
+                                         demand_driven=demand_driving)
+    steps = np.flatnonzero(undersupplied[0])
+    times = [times[step] for step in steps]
+    dict_dots = dict.fromkeys(times, 1)
+    diff_dict_drop = dict(zip(times, diff[0, steps]))
     return dict_dots, diff_dict_drop
 
 
@@ -395,48 +386,41 @@ def plot_all_undersupply(
     NUM_COLORS = 10
     cm = plt.get_cmap("tab10")
     colors = [cm(1.0 * i / NUM_COLORS) for i in range(NUM_COLORS)]
+    results = sc.compare_methods(general_sqlite, methods, commods,
+                                 demand_eq=demand_eq,
+                                 demand_driven=demand_driven)
     for y in range(len(methods)):
-        output_file = general_sqlite + methods[y] + '.sqlite'
+        undersupplied, diff = results[methods[y]]
         for x in range(len(commods)):
-            if commods[x] == 'power':
-                dots, diff = get_undersupply_timesteps(
-                    output_file, commods[x], demand_eq=demand_eq,
-                    driving_commod=True)
-            elif demand_driven:
-                dots, diff = get_undersupply_timesteps(output_file, commods[x])
-            else:
-                dots, diff = get_undersupply_timesteps(
-                    output_file, commods[x], demand_driving=False)
-            for key in dots:
-                dots[key] *= (x + 0.1 + 0.1 * y)
-            a = list(diff.values())
-            a = [abs(x) for x in a]
-            size = [abs(round(elem / max(a) * 300)) for elem in a]
+            steps = np.flatnonzero(undersupplied[x])
+            dots = np.full(len(steps), x + 0.1 + 0.1 * y)
+            a = np.abs(diff[x, steps])
+            size = np.abs(np.round(a / a.max() * 300)) if len(a) else a
             if x == 0:
                 ax.scatter(
-                    dots.keys(),
-                    dots.values(),
+                    steps,
+                    dots,
                     color=colors[y],
                     s=size,
                     label=methods[y],
                     marker='x')
                 ax1.scatter(
-                    dots.keys(),
-                    dots.values(),
+                    steps,
+                    dots,
                     color=colors[y],
                     s=size,
                     label=methods[y],
                     marker='x')
             else:
                 ax.scatter(
-                    dots.keys(),
-                    dots.values(),
+                    steps,
+                    dots,
                     color=colors[y],
                     s=size,
                     marker='x')
                 ax1.scatter(
-                    dots.keys(),
-                    dots.values(),
+                    steps,
+                    dots,
                     color=colors[y],
                     s=size,
                     marker='x')
@@ -495,25 +479,18 @@ def histogram_formatting(
         where the keys are commodities and the values are arrays representing
         histogram bin values.
     """
+    results = sc.compare_methods(general_sqlite, methods, commods,
+                                 demand_eq=demand_eq,
+                                 demand_driven=demand_driven)
+    bins = list(np.arange(0, 1450, 50))
     everything = {}
-    for y in methods:
-        everything[y] = {}
-    for y in range(len(methods)):
-        output_file = general_sqlite + methods[y] + '.sqlite'
+    for method in methods:
+        undersupplied = results[method][0]
+        everything[method] = {}
         for x in range(len(commods)):
-            if commods[x] == 'power':
-                dots, diff = get_undersupply_timesteps(
-                    output_file, commods[x], demand_eq=demand_eq,
-                    driving_commod=True)
-            elif demand_driven:
-                dots, diff = get_undersupply_timesteps(output_file, commods[x])
-            else:
-                dots, diff = get_undersupply_timesteps(
-                    output_file, commods[x], demand_driving=False)
             binvals, binsize = np.histogram(
-                list(
-                    dots.keys()), bins=list(np.arange(0, 1450, 50)))
-            everything[methods[y]][commods[x]] = binvals
+                np.flatnonzero(undersupplied[x]), bins=bins)
+            everything[method][commods[x]] = binvals
     return everything
 
 